@@ -14,6 +14,8 @@ import tempfile
 import os
 import zipfile
 import math
+import time
+import copy
 from math import log
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -39,6 +41,31 @@ from modules.ia_integration import (
     generar_recomendaciones_integradas
 )
 
+# ===== MÓDULOS DE CÁLCULO =====
+from modules.muestreo import muestrear_puntos_poligono
+from modules.indice_poligono import contiene_xy
+from modules.malla_adaptativa import malla_quadtree
+from modules.geometria_web import geometria_mapa
+from modules.muestras import MuestrasAnalisis, COLUMNAS_VARIABLE, valores_puntos
+from modules.shannon_esperado import nodos_uniforme, momentos_floor, shannon_delta, combinar_nodos
+from modules.semillas import FlujosAleatorios
+from modules.paralelo import iterar_en_procesos, mapear_en_procesos, repartir_cuota
+from modules.estadistica import EstadisticaAcumulada, intervalo_estratificado
+from modules.raster_clima import abrir_raster_climatico
+from modules.interpolacion import InterpoladorKNN, KDTREE_DISPONIBLE, interpolar_idw
+from modules.cache_superficies import CACHE_SUPERFICIES, huella_geometria, huella_resultados
+from modules.raster_superficies import (
+    tabla_colores, indices_superficie, limites_superficie, url_png, rango_superficie, grilla_superficie
+)
+from modules.teselas import (CapaTeselas, servidor_teselas, id_capa_teselas, capas_registradas, teselas_publicas,
+                             TAMANO_TESELA)
+from modules.mapas_html import CACHE_MAPAS_HTML, huella_estilo, html_mapa
+from modules.consulta_espacial import CACHE_INDICES_CONSULTA, IndiceConsulta
+from modules.exportacion_graficos import exportador_graficos
+from modules.mapas_estaticos import (
+    CACHE_MAPAS_ESTATICOS, MIN_MAPAS_PROCESOS, contornos_poligono, limites_extent, renderizar_mapa_estatico
+)
+
 # ===== IMPORTACIONES GOOGLE EARTH ENGINE (NO MODIFICAR) =====
 try:
     import ee
@@ -51,16 +78,16 @@ warnings.filterwarnings('ignore')
 
 # Librerías geoespaciales
 import folium
-from streamlit_folium import st_folium, folium_static
+from streamlit_folium import st_folium
+import streamlit.components.v1 as components
 from folium.plugins import Fullscreen, MousePosition, HeatMap
 import geopandas as gpd
 from shapely.geometry import Polygon, Point, shape, MultiPolygon
 from shapely.ops import unary_union
+import shapely
 import pyproj
 from branca.colormap import LinearColormap
 import matplotlib.cm as cm
-# Para simulación de datos satelitales
-import random
 # Para conversión de gráficos y mapas estáticos
 import io
 from scipy.interpolate import griddata
@@ -152,22 +179,81 @@ except ImportError:
 # ===============================
 class ConectorClimaticoTropical:
     """Sistema para obtener datos meteorológicos reales en Sudamérica"""
-    def __init__(self):
-        pass
+    def __init__(self, ruta_raster: Optional[str] = None):
+        # Raster climático local (memory-mapped); si no hay, se usan las regiones simuladas
+        self.raster = abrir_raster_climatico(ruta_raster)
+        
+        # Regiones climáticas: se evalúan por prioridad (la primera que contiene al punto gana).
+        # Para agregar una región basta con sumar una entrada; el índice espacial mantiene
+        # el costo de cada consulta independiente de la cantidad de regiones.
+        self.regiones = [
+            {'nombre': 'Amazonía central', 'lat': (-5, 5), 'lon': (-75, -50),
+             'precipitacion': (2500, 200), 'temperatura': (26, 1)},
+            {'nombre': 'Chocó', 'lat': (-10, 10), 'lon': (-82, -75),
+             'precipitacion': (4000, 300), 'temperatura': (27, 1)},
+            {'nombre': 'Sur amazónico', 'lat': (-15, -5), 'lon': (-70, -50),
+             'precipitacion': (1800, 200), 'temperatura': (25, 1)},
+            {'nombre': 'Argentina templada', 'lat': (-34, -22), 'lon': (-73, -53),
+             'precipitacion': (800, 100), 'temperatura': (18, 2)},
+        ]
+        # Región general para puntos fuera de todas las anteriores
+        self.region_general = {'nombre': 'Región general', 'precipitacion': (1200, 200), 'temperatura': (22, 2)}
+        self._construir_indice()
+    
+    def _construir_indice(self):
+        """Índice espacial (STRtree) de los polígonos de región y tablas de parámetros"""
+        poligonos = [
+            region['geometria'] if 'geometria' in region else
+            shapely.box(region['lon'][0], region['lat'][0], region['lon'][1], region['lat'][1])
+            for region in self.regiones
+        ]
+        self._indice_regiones = shapely.STRtree(poligonos)
+        # Última fila = región general
+        todas = self.regiones + [self.region_general]
+        self._nombres_regiones = np.array([region['nombre'] for region in todas], dtype=object)
+        self._precipitacion = np.array([region['precipitacion'] for region in todas], dtype=float)
+        self._temperatura = np.array([region['temperatura'] for region in todas], dtype=float)
+    
+    def asignar_regiones(self, lats, lons) -> np.ndarray:
+        """Índice de región de cada punto (len(self.regiones) para la región general)"""
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+        regiones = np.full(len(lats), len(self.regiones), dtype=np.int64)
+        if len(lats) == 0:
+            return regiones
+        idx_puntos, idx_regiones = self._indice_regiones.query(shapely.points(lons, lats), predicate='intersects')
+        # Ante solapamientos se queda la región de mayor prioridad (menor índice)
+        np.minimum.at(regiones, idx_puntos, idx_regiones)
+        return regiones
+    
+    def obtener_datos_climaticos_lote(self, lats, lons, rng: Optional[np.random.Generator] = None) -> Dict:
+        """Obtiene precipitación y temperatura para arrays de coordenadas"""
+        rng = rng if rng is not None else np.random.default_rng()
+        regiones = self.asignar_regiones(lats, lons)
+        n = len(regiones)
+        # Simulación realista basada en ubicación: valor base de la región ± variación uniforme
+        precip_base, precip_var = self._precipitacion[regiones].T
+        temp_base, temp_var = self._temperatura[regiones].T
+        datos = {
+            'precipitacion': precip_base + rng.uniform(-1.0, 1.0, n) * precip_var,
+            'temperatura': temp_base + rng.uniform(-1.0, 1.0, n) * temp_var,
+            'region': self._nombres_regiones[regiones]
+        }
+        
+        # Valores del raster local donde cubre al punto (interpolación bilineal)
+        if self.raster is not None:
+            for variable in ('precipitacion', 'temperatura'):
+                if variable in self.raster.variables:
+                    valores = self.raster.muestrear(variable, lats, lons)
+                    validos = np.isfinite(valores)
+                    datos[variable][validos] = valores[validos]
+        return datos
 
-    def obtener_datos_climaticos(self, lat: float, lon: float) -> Dict:
+    def obtener_datos_climaticos(self, lat: float, lon: float,
+                                 rng: Optional[np.random.Generator] = None) -> Dict:
         """Obtiene datos climáticos para una ubicación"""
-        # Simulación realista basada en ubicación
-        if -5 <= lat <= 5 and -75 <= lon <= -50:  # Amazonía central
-            return {'precipitacion': 2500 + random.uniform(-200, 200), 'temperatura': 26 + random.uniform(-1, 1)}
-        elif abs(lat) < 10 and -82 <= lon <= -75:  # Chocó
-            return {'precipitacion': 4000 + random.uniform(-300, 300), 'temperatura': 27 + random.uniform(-1, 1)}
-        elif -15 <= lat < -5 and -70 <= lon <= -50:  # Sur amazónico
-            return {'precipitacion': 1800 + random.uniform(-200, 200), 'temperatura': 25 + random.uniform(-1, 1)}
-        elif -34 <= lat <= -22 and -73 <= lon <= -53:  # Argentina templada
-            return {'precipitacion': 800 + random.uniform(-100, 100), 'temperatura': 18 + random.uniform(-2, 2)}
-        else:  # Región general
-            return {'precipitacion': 1200 + random.uniform(-200, 200), 'temperatura': 22 + random.uniform(-2, 2)}
+        datos = self.obtener_datos_climaticos_lote([lat], [lon], rng=rng)
+        return {'precipitacion': float(datos['precipitacion'][0]), 'temperatura': float(datos['temperatura'][0])}
 
 # ===============================
 # 🌳 METODOLOGÍA VERRA SIMPLIFICADA - CORREGIDA PARA CULTIVOS
@@ -195,41 +281,68 @@ class MetodologiaVerra:
             'agricola': {'factor_biomasa': 0.25, 'factor_suelo': 0.8, 'factor_madera': 0.1}  # NUEVO
         }
         
+        # Tramos de biomasa aérea según NDVI: (umbral, base, pendiente), evaluados en orden.
+        # Por encima del umbral: AGB = base + (NDVI - umbral) * pendiente
+        self.tramos_agb = {
+            'cultivo': [(0.7, 30, 50), (0.5, 20, 60), (0.3, 10, 50), (0.0, 5, 30)],  # Biomasa mucho más baja
+            'bosque': [(0.7, 150, 300), (0.5, 80, 350), (0.3, 30, 250), (0.0, 5, 100)]
+        }
+        
     def calcular_carbono_hectarea(self, ndvi: float, tipo_bosque: str, precipitacion: float) -> Dict:
         """Calcula carbono por hectárea basado en NDVI, tipo de vegetación y precipitación"""
+        lote = self.calcular_carbono_lote(np.array([ndvi], dtype=float), tipo_bosque,
+                                          np.array([precipitacion], dtype=float))
+        
+        return {
+            'carbono_total_ton_ha': float(lote['carbono_total_ton_ha'][0]),
+            'co2_equivalente_ton_ha': float(lote['co2_equivalente_ton_ha'][0]),
+            'biomasa_aerea_ton_ha': float(lote['biomasa_aerea_ton_ha'][0]),
+            'desglose': {pool: float(valores[0]) for pool, valores in lote['desglose'].items()},
+            'tipo_vegetacion': tipo_bosque
+        }
+    
+    @staticmethod
+    def _redondear(valores, decimales: int = 2):
+        """Redondeo vectorizado con el mismo resultado que round() de Python"""
+        redondeados = np.round(valores, decimales)
+        # np.round escala antes de redondear; los casos cercanos a x.xx5 se resuelven con round()
+        escalados = valores * 10 ** decimales
+        dudosos = np.flatnonzero(np.abs(escalados - np.floor(escalados) - 0.5) < 1e-6)
+        for i in dudosos:
+            redondeados.flat[i] = round(float(valores.flat[i]), decimales)
+        return redondeados
+    
+    def calcular_carbono_lote(self, ndvi, tipo_bosque: str, precipitacion, redondear: bool = True) -> Dict:
+        """Versión vectorizada de calcular_carbono_hectarea para arrays de NDVI y precipitación.
+        
+        Evalúa los tramos de NDVI por partes (sin bucles Python), de modo que una
+        grilla completa se resuelve en una sola llamada. Devuelve la misma
+        estructura que el cálculo escalar pero con arrays en cada campo; con
+        `redondear=True` los valores coinciden exactamente con la ruta escalar.
+        """
+        ndvi, precipitacion = np.broadcast_arrays(
+            np.asarray(ndvi, dtype=float), np.asarray(precipitacion, dtype=float)
+        )
         
         # Obtener factores específicos para el tipo de vegetación
         factores_veg = self.factores_vegetacion.get(tipo_bosque, 
             {'factor_biomasa': 1.0, 'factor_suelo': 1.0, 'factor_madera': 1.0})
+        es_cultivo = tipo_bosque in ['vid', 'cultivo', 'agricola']
         
         # Factor por precipitación 
-        if tipo_bosque in ['vid', 'cultivo', 'agricola']:
+        if es_cultivo:
             # Para cultivos, la precipitación tiene menos impacto en la biomasa
-            factor_precip = min(1.3, max(0.7, precipitacion / 1500))
+            factor_precip = np.minimum(1.3, np.maximum(0.7, precipitacion / 1500))
         else:
-            factor_precip = min(2.0, max(0.5, precipitacion / 1500))
-        
-        # Estimación de biomasa aérea basada en NDVI
-        if tipo_bosque in ['vid', 'cultivo', 'agricola']:
-            # PARA CULTIVOS: Biomasa mucho más baja
-            if ndvi > 0.7:
-                agb_ton_ha = (30 + (ndvi - 0.7) * 50) * factor_precip  # Muy baja
-            elif ndvi > 0.5:
-                agb_ton_ha = (20 + (ndvi - 0.5) * 60) * factor_precip
-            elif ndvi > 0.3:
-                agb_ton_ha = (10 + (ndvi - 0.3) * 50) * factor_precip
-            else:
-                agb_ton_ha = (5 + ndvi * 30) * factor_precip
-        else:
-            # PARA BOSQUES NATURALES (original)
-            if ndvi > 0.7:
-                agb_ton_ha = (150 + (ndvi - 0.7) * 300) * factor_precip
-            elif ndvi > 0.5:
-                agb_ton_ha = (80 + (ndvi - 0.5) * 350) * factor_precip
-            elif ndvi > 0.3:
-                agb_ton_ha = (30 + (ndvi - 0.3) * 250) * factor_precip
-            else:
-                agb_ton_ha = (5 + ndvi * 100) * factor_precip
+            factor_precip = np.minimum(2.0, np.maximum(0.5, precipitacion / 1500))
+        
+        # Estimación de biomasa aérea basada en NDVI (evaluación por tramos)
+        tramos = self.tramos_agb['cultivo' if es_cultivo else 'bosque']
+        condiciones = [ndvi > umbral for umbral, _, _ in tramos[:-1]]
+        umbral = np.select(condiciones, [t[0] for t in tramos[:-1]], tramos[-1][0])
+        base = np.select(condiciones, [t[1] for t in tramos[:-1]], tramos[-1][1])
+        pendiente = np.select(condiciones, [t[2] for t in tramos[:-1]], tramos[-1][2])
+        agb_ton_ha = (base + (ndvi - umbral) * pendiente) * factor_precip
         
         # Aplicar factor específico del tipo de vegetación
         agb_ton_ha *= factores_veg['factor_biomasa']
@@ -246,7 +359,7 @@ class MetodologiaVerra:
         carbono_agb = agb_ton_ha * self.factores['conversion_carbono']
         
         # Para cultivos: raíces menos profundas
-        if tipo_bosque in ['vid', 'cultivo', 'agricola']:
+        if es_cultivo:
             carbono_bgb = carbono_agb * (self.factores['ratio_raiz'] * 0.7)  # 30% menos
         else:
             carbono_bgb = carbono_agb * self.factores['ratio_raiz']
@@ -255,27 +368,29 @@ class MetodologiaVerra:
         carbono_dw = carbono_agb * self.factores['proporcion_madera_muerta'] * factores_veg['factor_madera']
         
         # Hojarasca: menor acumulación en cultivos
-        if tipo_bosque in ['vid', 'cultivo', 'agricola']:
+        if es_cultivo:
             carbono_li = self.factores['acumulacion_hojarasca'] * 0.3 * self.factores['conversion_carbono']  # 70% menos
         else:
             carbono_li = self.factores['acumulacion_hojarasca'] * self.factores['conversion_carbono']
+        carbono_li = np.full(ndvi.shape, carbono_li)
         
         # Carbono del suelo: ajustado por tipo de vegetación
-        carbono_soc = self.factores['carbono_suelo'] * factores_veg['factor_suelo']
+        carbono_soc = np.full(ndvi.shape, self.factores['carbono_suelo'] * factores_veg['factor_suelo'])
         
         carbono_total = carbono_agb + carbono_bgb + carbono_dw + carbono_li + carbono_soc
         co2_equivalente = carbono_total * self.factores['ratio_co2']
         
+        ajustar = self._redondear if redondear else (lambda x: x)
         return {
-            'carbono_total_ton_ha': round(carbono_total, 2),
-            'co2_equivalente_ton_ha': round(co2_equivalente, 2),
-            'biomasa_aerea_ton_ha': round(agb_ton_ha, 2),
+            'carbono_total_ton_ha': ajustar(carbono_total),
+            'co2_equivalente_ton_ha': ajustar(co2_equivalente),
+            'biomasa_aerea_ton_ha': ajustar(agb_ton_ha),
             'desglose': {
-                'AGB': round(carbono_agb, 2),
-                'BGB': round(carbono_bgb, 2),
-                'DW': round(carbono_dw, 2),
-                'LI': round(carbono_li, 2),
-                'SOC': round(carbono_soc, 2)
+                'AGB': ajustar(carbono_agb),
+                'BGB': ajustar(carbono_bgb),
+                'DW': ajustar(carbono_dw),
+                'LI': ajustar(carbono_li),
+                'SOC': ajustar(carbono_soc)
             },
             'tipo_vegetacion': tipo_bosque
         }
@@ -297,11 +412,53 @@ class AnalisisBiodiversidad:
             'agricola': {'riqueza_base': 15, 'abundancia_base': 60, 'factor_ndvi': 0.3, 'es_cultivo': True} # NUEVO
         }
     
-    def calcular_shannon(self, ndvi: float, tipo_ecosistema: str, area_ha: float, precipitacion: float) -> Dict:
-        """Calcula índice de Shannon basado en NDVI, tipo de ecosistema y condiciones ambientales"""
+        # Escalas de categorías según Shannon: (umbral, categoría, color), evaluadas en orden
+        self.escalas_categoria = {
+            # ESCALA ESPECIAL PARA CULTIVOS (valores más bajos)
+            'cultivo': [
+                (1.5, "Alta (para cultivo)", "#3b82f6"),
+                (1.0, "Moderada (para cultivo)", "#f59e0b"),
+                (0.5, "Baja (típico de monocultivo)", "#ef4444"),
+                (None, "Muy Baja (monocultivo puro)", "#991b1b")
+            ],
+            # ESCALA PARA ECOSISTEMAS NATURALES
+            'natural': [
+                (3.5, "Muy Alta", "#10b981"),
+                (2.5, "Alta", "#3b82f6"),
+                (1.5, "Moderada", "#f59e0b"),
+                (0.5, "Baja", "#ef4444"),
+                (None, "Muy Baja", "#991b1b")
+            ]
+        }
+        # Celdas (puntos × especies) simuladas por bloque, para acotar memoria
+        self.max_celdas_bloque = 2_000_000
+    
+    def _obtener_parametros(self, tipo_ecosistema: str) -> Dict:
+        return self.parametros.get(tipo_ecosistema, {'riqueza_base': 60, 'abundancia_base': 400, 'factor_ndvi': 0.5, 'es_cultivo': False})
+    
+    def clasificar_shannon(self, shannon, es_cultivo: bool):
+        """Devuelve arrays (categoria, color) para un array de índices de Shannon"""
+        shannon = np.asarray(shannon, dtype=float)
+        escala = self.escalas_categoria['cultivo' if es_cultivo else 'natural']
+        condiciones = [shannon > umbral for umbral, _, _ in escala[:-1]]
+        categorias = np.select(condiciones, [np.array(c, dtype=object) for _, c, _ in escala[:-1]],
+                               np.array(escala[-1][1], dtype=object))
+        colores = np.select(condiciones, [np.array(c, dtype=object) for _, _, c in escala[:-1]],
+                            np.array(escala[-1][2], dtype=object))
+        return categorias.astype(object), colores.astype(object)
+    
+    def _factores_shannon(self, ndvi, tipo_ecosistema: str, area_ha, precipitacion):
+        """Parámetros del ecosistema y factor ambiental combinado por punto"""
+        ndvi, area_ha, precipitacion = np.broadcast_arrays(
+            np.asarray(ndvi, dtype=float), np.asarray(area_ha, dtype=float),
+            np.asarray(precipitacion, dtype=float)
+        )
+        n = ndvi.shape[0] if ndvi.ndim else 1
+        ndvi, area_ha, precipitacion = ndvi.reshape(n), area_ha.reshape(n), precipitacion.reshape(n)
         
         # Parámetros base según ecosistema
-        params = self.parametros.get(tipo_ecosistema, {'riqueza_base': 60, 'abundancia_base': 400, 'factor_ndvi': 0.5, 'es_cultivo': False})
+        params = self._obtener_parametros(tipo_ecosistema)
+        es_cultivo = params['es_cultivo']
         
         # Factor NDVI (vegetación más sana → más biodiversidad)
         # Para cultivos, la relación NDVI-biodiversidad es mucho menor
@@ -309,109 +466,190 @@ class AnalisisBiodiversidad:
         
         # Factor área (áreas más grandes → más especies)
         # Para cultivos, el factor área es menos relevante (monocultivos)
-        if params['es_cultivo']:
-            factor_area = min(1.3, math.log10(area_ha + 1) * 0.2 + 1)
+        if es_cultivo:
+            factor_area = np.minimum(1.3, np.log10(area_ha + 1) * 0.2 + 1)
         else:
-            factor_area = min(2.0, math.log10(area_ha + 1) * 0.5 + 1)
+            factor_area = np.minimum(2.0, np.log10(area_ha + 1) * 0.5 + 1)
         
         # Factor precipitación (más lluvia → más biodiversidad en trópicos)
         if tipo_ecosistema in ['amazonia', 'choco']:
-            factor_precip = min(1.5, precipitacion / 2000)
-        elif params['es_cultivo']:
+            factor_precip = np.minimum(1.5, precipitacion / 2000)
+        elif es_cultivo:
             # Para cultivos, la precipitación afecta menos la biodiversidad
             factor_precip = 1.0 + (precipitacion / 2000 * 0.3)
         else:
-            factor_precip = 1.0
+            factor_precip = np.ones(n)
         
-        # Cálculo de riqueza de especies estimada
-        # Para cultivos: riqueza muy baja (monocultivo)
-        riqueza_especies = int(params['riqueza_base'] * factor_ndvi * factor_area * factor_precip * random.uniform(0.8, 1.2))
+        factores = factor_ndvi * factor_area * factor_precip
         
-        # Cálculo de abundancia estimada
-        # Para cultivos: abundancia más baja y menos variable
-        if params['es_cultivo']:
-            abundancia_total = int(params['abundancia_base'] * factor_ndvi * factor_area * factor_precip * random.uniform(0.9, 1.1))
-        else:
-            abundancia_total = int(params['abundancia_base'] * factor_ndvi * factor_area * factor_precip * random.uniform(0.9, 1.1))
-        
-        # Simulación de distribución de abundancia
-        especies = []
-        abundancia_acumulada = 0
-        
-        if params['es_cultivo']:
-            # PARA CULTIVOS: Distribución muy desigual (monocultivo)
-            # Una especie dominante (el cultivo) y pocas especies acompañantes
-            if riqueza_especies > 0:
-                # Especie principal (el cultivo) - 70-90% de la abundancia
-                abundancia_principal = int(abundancia_total * random.uniform(0.7, 0.9))
-                especies.append({'especie_id': 1, 'abundancia': abundancia_principal, 'nombre': tipo_ecosistema.capitalize()})
-                abundancia_acumulada += abundancia_principal
-                
-                # Otras especies (malezas, insectos) - baja abundancia
-                for i in range(2, riqueza_especies + 1):
-                    abundancia = int((abundancia_total - abundancia_principal) / max(riqueza_especies - 1, 1) * random.uniform(0.5, 1.5))
-                    if abundancia > 0:
-                        especies.append({'especie_id': i, 'abundancia': abundancia, 'nombre': f'Especie {i}'})
-                        abundancia_acumulada += abundancia
-        else:
-            # PARA ECOSISTEMAS NATURALES: Distribución más equilibrada
-            for i in range(1, riqueza_especies + 1):
-                abundancia = int((abundancia_total / max(riqueza_especies, 1)) * random.lognormvariate(0, 0.5))
-                if abundancia > 0:
-                    especies.append({'especie_id': i, 'abundancia': abundancia, 'nombre': f'Especie {i}'})
-                    abundancia_acumulada += abundancia
-        
-        # Normalizar abundancias
-        for especie in especies:
-            especie['proporcion'] = especie['abundancia'] / abundancia_acumulada if abundancia_acumulada > 0 else 0
-        
-        # Calcular índice de Shannon
-        shannon = 0
-        for especie in especies:
-            if especie['proporcion'] > 0:
-                shannon -= especie['proporcion'] * math.log(especie['proporcion'])
+        return params, factores
+    
+    def calcular_shannon(self, ndvi: float, tipo_ecosistema: str, area_ha: float, precipitacion: float,
+                         rng: Optional[np.random.Generator] = None) -> Dict:
+        """Calcula índice de Shannon basado en NDVI, tipo de ecosistema y condiciones ambientales"""
+        lote = self.calcular_shannon_lote([ndvi], tipo_ecosistema, area_ha, [precipitacion],
+                                          rng=rng, conservar_especies=True)
         
-        # Categorías de biodiversidad según Shannon
-        if params['es_cultivo']:
-            # ESCALA ESPECIAL PARA CULTIVOS (valores más bajos)
-            if shannon > 1.5:
-                categoria = "Alta (para cultivo)"
-                color = "#3b82f6"
-            elif shannon > 1.0:
-                categoria = "Moderada (para cultivo)"
-                color = "#f59e0b"
-            elif shannon > 0.5:
-                categoria = "Baja (típico de monocultivo)"
-                color = "#ef4444"
-            else:
-                categoria = "Muy Baja (monocultivo puro)"
-                color = "#991b1b"
-        else:
-            # ESCALA PARA ECOSISTEMAS NATURALES
-            if shannon > 3.5:
-                categoria = "Muy Alta"
-                color = "#10b981"
-            elif shannon > 2.5:
-                categoria = "Alta"
-                color = "#3b82f6"
-            elif shannon > 1.5:
-                categoria = "Moderada"
-                color = "#f59e0b"
-            elif shannon > 0.5:
-                categoria = "Baja"
-                color = "#ef4444"
+        return {
+            'indice_shannon': float(lote['indice_shannon'][0]),
+            'categoria': lote['categoria'][0],
+            'color': lote['color'][0],
+            'riqueza_especies': int(lote['riqueza_especies'][0]),
+            'abundancia_total': int(lote['abundancia_total'][0]),
+            'especies_muestra': lote['especies_muestra'][0],
+            'es_cultivo': lote['es_cultivo']
+        }
+    
+    def calcular_shannon_lote(self, ndvi, tipo_ecosistema: str, area_ha, precipitacion,
+                              rng: Optional[np.random.Generator] = None,
+                              conservar_especies: bool = False) -> Dict:
+        """Calcula el índice de Shannon para muchos puntos a la vez.
+        
+        Simula una matriz de abundancias (puntos × riqueza máxima) con un
+        Generator de NumPy, la enmascara según la riqueza de cada punto y obtiene
+        proporciones e índice H' con operaciones de arrays. La lista de especies
+        por punto solo se arma si `conservar_especies` es True.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        params, factores = self._factores_shannon(ndvi, tipo_ecosistema, area_ha, precipitacion)
+        n = len(factores)
+        es_cultivo = params['es_cultivo']
+        
+        # Riqueza y abundancia estimadas (para cultivos: muy bajas, monocultivo)
+        riqueza = np.floor(params['riqueza_base'] * factores * rng.uniform(0.8, 1.2, n)).astype(np.int64)
+        riqueza = np.maximum(riqueza, 0)
+        abundancia_total = np.floor(params['abundancia_base'] * factores * rng.uniform(0.9, 1.1, n))
+        
+        shannon = np.zeros(n)
+        abundancia_acumulada = np.zeros(n, dtype=np.int64)
+        especies_muestra = [[] for _ in range(n)] if conservar_especies else None
+        
+        riqueza_max = int(riqueza.max()) if n > 0 else 0
+        filas_bloque = max(1, self.max_celdas_bloque // max(riqueza_max, 1))
+        
+        for inicio in range(0, n, filas_bloque):
+            bloque = slice(inicio, min(inicio + filas_bloque, n))
+            s_bloque = riqueza[bloque]
+            a_bloque = abundancia_total[bloque]
+            n_bloque = len(s_bloque)
+            s_max = int(s_bloque.max())
+            if s_max == 0:
+                continue
+            
+            # Simulación de distribución de abundancia
+            if es_cultivo:
+                # PARA CULTIVOS: una especie dominante (el cultivo, 70-90% de la abundancia)
+                # y pocas especies acompañantes (malezas, insectos) de baja abundancia
+                principal = np.floor(a_bloque * rng.uniform(0.7, 0.9, n_bloque))
+                resto = (a_bloque - principal) / np.maximum(s_bloque - 1, 1)
+                abundancias = np.floor(resto[:, None] * rng.uniform(0.5, 1.5, (n_bloque, s_max)))
+                abundancias[:, 0] = principal
             else:
-                categoria = "Muy Baja"
-                color = "#991b1b"
+                # PARA ECOSISTEMAS NATURALES: distribución log-normal más equilibrada
+                media = a_bloque / np.maximum(s_bloque, 1)
+                abundancias = np.floor(media[:, None] * rng.lognormal(0.0, 0.5, (n_bloque, s_max)))
+            
+            activas = (np.arange(s_max)[None, :] < s_bloque[:, None]) & (abundancias > 0)
+            abundancias = np.where(activas, abundancias, 0.0)
+            
+            # Normalizar abundancias y calcular índice de Shannon
+            total = abundancias.sum(axis=1)
+            proporciones = abundancias / np.where(total > 0, total, 1.0)[:, None]
+            terminos = np.where(activas, proporciones * np.log(np.where(activas, proporciones, 1.0)), 0.0)
+            shannon[bloque] = -terminos.sum(axis=1)
+            abundancia_acumulada[bloque] = total.astype(np.int64)
+            
+            if conservar_especies:
+                for fila in range(n_bloque):
+                    ids = np.flatnonzero(activas[fila])[:10]
+                    especies_muestra[inicio + fila] = [{
+                        'especie_id': int(j) + 1,
+                        'abundancia': int(abundancias[fila, j]),
+                        'nombre': tipo_ecosistema.capitalize() if es_cultivo and j == 0 else f'Especie {j + 1}',
+                        'proporcion': float(proporciones[fila, j])
+                    } for j in ids]
+        
+        # Categorías de biodiversidad según Shannon
+        categorias, colores = self.clasificar_shannon(shannon, es_cultivo)
         
         return {
-            'indice_shannon': round(shannon, 3),
-            'categoria': categoria,
-            'color': color,
-            'riqueza_especies': riqueza_especies,
+            'indice_shannon': np.round(shannon, 3),
+            'categoria': categorias,
+            'color': colores,
+            'riqueza_especies': riqueza,
             'abundancia_total': abundancia_acumulada,
-            'especies_muestra': especies[:10],
-            'es_cultivo': params['es_cultivo']
+            'especies_muestra': especies_muestra,
+            'es_cultivo': es_cultivo
+        }
+    
+    def calcular_shannon_esperado_lote(self, ndvi, tipo_ecosistema: str, area_ha, precipitacion) -> Dict:
+        """Índice de Shannon esperado y su varianza, sin simular comunidades.
+        
+        Usa el mismo modelo que `calcular_shannon_lote`: las abundancias son
+        floor(media · X) con X log-normal (o el reparto dominante + acompañantes
+        uniformes en cultivos). Los momentos de cada término salen de una tabla
+        precalculada y E[H'], Var[H'] se obtienen por el método delta; los
+        sorteos de riqueza, abundancia y fracción dominante se promedian con
+        nodos de Gauss-Legendre. El costo es O(1) por punto.
+        """
+        params, factores = self._factores_shannon(ndvi, tipo_ecosistema, area_ha, precipitacion)
+        n = len(factores)
+        es_cultivo = params['es_cultivo']
+        
+        # Nodos de cuadratura sobre los factores aleatorios de la simulación
+        nodos_riq, pesos_riq = nodos_uniforme(0.8, 1.2, 8)
+        nodos_abu, pesos_abu = nodos_uniforme(0.9, 1.1, 4 if es_cultivo else 2)
+        ejes = [nodos_riq, nodos_abu]
+        pesos_ejes = [pesos_riq, pesos_abu]
+        if es_cultivo:
+            nodos_dom, pesos_dom = nodos_uniforme(0.7, 0.9, 4)
+            ejes.append(nodos_dom)
+            pesos_ejes.append(pesos_dom)
+        malla = [eje.ravel() for eje in np.meshgrid(*ejes, indexing='ij')]
+        pesos = np.prod([p.ravel() for p in np.meshgrid(*pesos_ejes, indexing='ij')], axis=0)
+        
+        shannon = np.zeros(n)
+        varianza = np.zeros(n)
+        riqueza = np.zeros(n)
+        abundancia = np.zeros(n)
+        
+        filas_bloque = max(1, self.max_celdas_bloque // len(pesos))
+        for inicio in range(0, n, filas_bloque):
+            bloque = slice(inicio, min(inicio + filas_bloque, n))
+            f = factores[bloque][:, None]
+            s = np.maximum(np.floor(params['riqueza_base'] * f * malla[0]), 0)
+            a = np.floor(params['abundancia_base'] * f * malla[1])
+            
+            if es_cultivo:
+                # Especie dominante fija por nodo + (riqueza - 1) acompañantes uniformes
+                principal = np.where(s > 0, np.floor(a * malla[2]), 0.0)
+                t0 = principal
+                u0 = principal * np.log(np.where(principal > 0, principal, 1.0))
+                terminos = np.maximum(s - 1, 0)
+                momentos = momentos_floor((a - principal) / np.maximum(s - 1, 1), 'uniforme')
+            else:
+                t0 = u0 = 0.0
+                terminos = s
+                momentos = momentos_floor(a / np.maximum(s, 1), 'lognormal')
+            
+            esperanza, var_nodo, total = shannon_delta(t0, u0, terminos, momentos)
+            combinado = combinar_nodos(esperanza, var_nodo, pesos)
+            shannon[bloque] = combinado['media']
+            varianza[bloque] = combinado['varianza']
+            riqueza[bloque] = s @ pesos
+            abundancia[bloque] = total @ pesos
+        
+        categorias, colores = self.clasificar_shannon(shannon, es_cultivo)
+        
+        return {
+            'indice_shannon': np.round(shannon, 3),
+            'varianza_shannon': varianza,
+            'categoria': categorias,
+            'color': colores,
+            'riqueza_especies': np.rint(riqueza).astype(np.int64),
+            'abundancia_total': np.rint(abundancia).astype(np.int64),
+            'especies_muestra': None,
+            'es_cultivo': es_cultivo
         }
 
 # ===============================
@@ -420,8 +658,30 @@ class AnalisisBiodiversidad:
 class SistemaMapas:
     """Sistema de mapas mejorado con interpolación KNN para cobertura completa y mapas de calor continuos"""
     
-    def __init__(self):
+    def __init__(self, modo_render='heatmap', malla_adaptativa=False, interpolacion='knn', potencia_idw=2.0,
+                 vecinos_idw=None):
         self.capa_base = 'https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}'
+        # 'heatmap': capas HeatMap de puntos; 'imagen': la malla coloreada como PNG (ImageOverlay);
+        # 'teselas': pirámide XYZ evaluada por píxel (parcelas muy grandes; requiere
+        # TESELAS_URL_PUBLICA, si no se usa 'imagen')
+        self.modo_render = modo_render
+        # Malla canónica: la misma superficie interpolada alimenta heatmaps,
+        # mapa combinado y mapas estáticos (compartida vía caché entre re-ejecuciones)
+        self.densidad_superficie = 1200
+        # Celdas por lado de la malla raster (modo 'imagen'), independiente del área
+        self.lado_raster = 256
+        # Mallas raster como quadtree: refina solo contorno y zonas de alto gradiente
+        self.malla_adaptativa = malla_adaptativa
+        self.umbral_adaptativo = 0.1
+        # Interpolador de las superficies: 'knn' (KD-tree, pesos 1/d de los k vecinos)
+        # o 'idw' (distancia inversa vectorizada, pesos 1/d^potencia_idw sobre todas
+        # las muestras o solo las `vecinos_idw` más cercanas). Sin SciPy, siempre 'idw'.
+        self.interpolacion = interpolacion
+        self.potencia_idw = potencia_idw
+        self.vecinos_idw = vecinos_idw
+        self.cache_superficies = CACHE_SUPERFICIES
+        # Capas de teselas registradas por el último mapa construido
+        self._capas_teselas = []
         self.estilos = {
             'area_estudio': {
                 'fillColor': '#3b82f6',
@@ -466,10 +726,18 @@ class SistemaMapas:
             }
         }
     
-    def _generar_malla_puntos(self, gdf, densidad=1200):
-        """Genera una malla densa de puntos que cubre todo el polígono"""
+    def _generar_malla_puntos(self, gdf, densidad=1200, area_ha=None, lado=None):
+        """Genera una malla regular de celdas que cubre todo el polígono.
+        
+        Devuelve un diccionario con los centros de celda por eje (`xs`, `ys`),
+        la máscara 2D de celdas dentro del polígono (`mascara`, filas = latitud)
+        y las coordenadas de las celdas interiores (`lats`, `lons`). La máscara
+        se calcula con una sola consulta vectorizada al índice raster del polígono.
+        `area_ha` evita reproyectar el polígono cuando ya se conoce la superficie.
+        Con `lado` la malla tiene exactamente lado × lado celdas, sin importar el área.
+        """
         if gdf is None or gdf.empty:
-            return []
+            return None
         
         try:
             poligono = gdf.geometry.iloc[0]
@@ -477,139 +745,398 @@ class SistemaMapas:
             minx, miny, maxx, maxy = bounds
             
             # Calcular número de puntos basado en el área
-            area_ha = calcular_superficie(gdf)
-            num_puntos = min(densidad, max(400, int(area_ha * 1.5)))  # Mayor densidad
-            
-            # Crear malla regular
-            puntos = []
-            
-            # Calcular dimensiones de la malla
-            lado = int(np.sqrt(num_puntos))
+            if lado is None:
+                if area_ha is None:
+                    area_ha = calcular_superficie(gdf)
+                num_puntos = min(densidad, max(400, int(area_ha * 1.5)))  # Mayor densidad
+                
+                # Calcular dimensiones de la malla
+                lado = int(np.sqrt(num_puntos))
             dx = (maxx - minx) / lado
             dy = (maxy - miny) / lado
+            xs = minx + (np.arange(lado) + 0.5) * dx
+            ys = miny + (np.arange(lado) + 0.5) * dy
             
-            for i in range(lado):
-                for j in range(lado):
-                    lon = minx + (i + 0.5) * dx
-                    lat = miny + (j + 0.5) * dy
-                    punto = Point(lon, lat)
-                    
-                    if poligono.contains(punto):
-                        puntos.append({
-                            'lat': lat,
-                            'lon': lon,
-                            'x_norm': i / lado,
-                            'y_norm': j / lado
-                        })
-            
-            return puntos
+            # Celdas dentro del polígono (una sola consulta vectorizada)
+            lons_malla, lats_malla = np.meshgrid(xs, ys)
+            mascara = contiene_xy(poligono, lons_malla, lats_malla)
+            if not mascara.any():
+                return None
+            
+            return {
+                'xs': xs,
+                'ys': ys,
+                'mascara': mascara,
+                'lats': lats_malla[mascara],
+                'lons': lons_malla[mascara]
+            }
         except Exception as e:
             print(f"Error generando malla de puntos: {str(e)}")
-            return []
+            return None
+    
+    def _obtener_muestras(self, resultados, variable):
+        """Devuelve (lats, lons, valores) de los puntos de muestreo de una variable"""
+        muestras = resultados.get('muestras')
+        if muestras is not None:
+            return muestras.columna('lat'), muestras.columna('lon'), muestras.variable(variable)
+        
+        # Resultados en el formato anterior (listas de diccionarios)
+        puntos = resultados.get(f'puntos_{variable}', [])
+        if not puntos:
+            return None
+        return (valores_puntos(puntos, 'lat'), valores_puntos(puntos, 'lon'),
+                valores_puntos(puntos, COLUMNAS_VARIABLE[variable]))
+    
+    @staticmethod
+    def _limitar_valores(variable, valores):
+        """Recorta los valores interpolados al rango válido de la variable"""
+        if variable in ('ndvi', 'ndwi'):
+            return np.clip(valores, -1.0, 1.0)
+        return np.maximum(valores, 0)
+    
+    def _usa_idw(self):
+        return self.interpolacion == 'idw' or not KDTREE_DISPONIBLE
+    
+    def _firma_interpolacion(self, k=8):
+        """Parámetros del interpolador que cambian las superficies (parte de las claves de caché)"""
+        if self._usa_idw():
+            return ('idw', float(self.potencia_idw), self.vecinos_idw)
+        return ('knn', k)
     
-    def _interpolar_valores_knn(self, puntos_muestra, puntos_malla, variable='carbono', k=8):
-        """Interpola valores usando K-Nearest Neighbors con mayor suavidad"""
-        if not puntos_muestra or not puntos_malla:
-            return puntos_malla
+    def _interpolar(self, lats_muestra, lons_muestra, valores, lats, lons, k=8):
+        """Interpola valores de muestra (vector n o matriz n × v) en los puntos con el método configurado"""
+        if self._usa_idw():
+            return interpolar_idw(lats_muestra, lons_muestra, valores, lats, lons,
+                                  potencia=self.potencia_idw, k=self.vecinos_idw)
+        interpolador = InterpoladorKNN(lats_muestra, lons_muestra, k=k)
+        return interpolador.interpolar(interpolador.matriz_pesos(lats, lons), valores)
+    
+    def _interpolar_valores_knn(self, muestras, malla, variable='carbono', k=8):
+        """Interpola valores usando K-Nearest Neighbors con mayor suavidad.
+        
+        Devuelve un array con el valor de cada celda interior de la malla.
+        """
+        if muestras is None or len(muestras[0]) == 0 or malla is None:
+            return None
         
         try:
-            # Solo importar sklearn si está disponible
-            try:
-                from sklearn.neighbors import KNeighborsRegressor
-                sklearn_disponible = True
-            except ImportError:
-                sklearn_disponible = False
-            
-            if sklearn_disponible:
-                # Preparar datos de entrenamiento
-                X_train = []
-                y_train = []
-                
-                for punto in puntos_muestra:
-                    X_train.append([punto['lat'], punto['lon']])
-                    if variable == 'carbono':
-                        y_train.append(punto['carbono_ton_ha'])
-                    elif variable == 'ndvi':
-                        y_train.append(punto['ndvi'])
-                    elif variable == 'ndwi':
-                        y_train.append(punto['ndwi'])
-                    elif variable == 'biodiversidad':
-                        y_train.append(punto['indice_shannon'])
-                
-                # Entrenar modelo KNN con más vecinos para mayor suavidad
-                knn = KNeighborsRegressor(n_neighbors=min(k, len(X_train)), weights='distance')
-                knn.fit(X_train, y_train)
-                
-                # Predecir para todos los puntos de la malla
-                X_pred = [[p['lat'], p['lon']] for p in puntos_malla]
-                if len(X_pred) > 0:
-                    predicciones = knn.predict(X_pred)
-                    
-                    # Asignar valores interpolados
-                    for i, punto in enumerate(puntos_malla):
-                        valor = float(predicciones[i])
-                        if variable == 'carbono':
-                            punto['carbono_ton_ha'] = max(0, valor)
-                        elif variable == 'ndvi':
-                            punto['ndvi'] = max(-1.0, min(1.0, valor))
-                        elif variable == 'ndwi':
-                            punto['ndwi'] = max(-1.0, min(1.0, valor))
-                        elif variable == 'biodiversidad':
-                            punto['indice_shannon'] = max(0, valor)
-            
-            # Fallback: interpolación simple (promedio ponderado por distancia)
-            else:
-                for punto_malla in puntos_malla:
-                    valores = []
-                    distancias = []
-                    
-                    for punto_muestra in puntos_muestra:
-                        # Calcular distancia euclidiana
-                        dist = np.sqrt((punto_malla['lat'] - punto_muestra['lat'])**2 + 
-                                     (punto_malla['lon'] - punto_muestra['lon'])**2)
-                        
-                        if variable == 'carbono':
-                            valor = punto_muestra['carbono_ton_ha']
-                        elif variable == 'ndvi':
-                            valor = punto_muestra['ndvi']
-                        elif variable == 'ndwi':
-                            valor = punto_muestra['ndwi']
-                        elif variable == 'biodiversidad':
-                            valor = punto_muestra['indice_shannon']
-                        
-                        # Peso inversamente proporcional a la distancia
-                        if dist > 0:
-                            peso = 1.0 / (dist ** 2)  # Distancia al cuadrado para mayor suavidad
-                        else:
-                            peso = 1.0
-                        
-                        valores.append(valor)
-                        distancias.append(peso)
-                    
-                    # Calcular promedio ponderado
-                    if distancias:
-                        total_pesos = sum(distancias)
-                        if total_pesos > 0:
-                            valor_interpolado = sum(v * w for v, w in zip(valores, distancias)) / total_pesos
-                        else:
-                            valor_interpolado = np.mean(valores) if valores else 0
-                    else:
-                        valor_interpolado = 0
-                    
-                    # Asignar valor interpolado
-                    if variable == 'carbono':
-                        punto_malla['carbono_ton_ha'] = max(0, valor_interpolado)
-                    elif variable == 'ndvi':
-                        punto_malla['ndvi'] = max(-1.0, min(1.0, valor_interpolado))
-                    elif variable == 'ndwi':
-                        punto_malla['ndwi'] = max(-1.0, min(1.0, valor_interpolado))
-                    elif variable == 'biodiversidad':
-                        punto_malla['indice_shannon'] = max(0, valor_interpolado)
-            
-            return puntos_malla
+            lats_muestra, lons_muestra, valores_muestra = muestras
+            lats_malla, lons_malla = malla['lats'], malla['lons']
+            
+            # KNN ponderado por distancia sobre un KD-tree de las muestras, o IDW
+            predicciones = self._interpolar(lats_muestra, lons_muestra, valores_muestra, lats_malla, lons_malla, k=k)
+            
+            return self._limitar_valores(variable, np.asarray(predicciones, dtype=float))
         except Exception as e:
             print(f"Error en interpolación KNN: {str(e)}")
-            return puntos_malla
+            return None
+    
+    def _interpolar_variables(self, resultados, malla, variables, k=8):
+        """Interpola varias variables sobre la misma malla.
+        
+        Las variables que comparten coordenadas de muestreo (todas, en los
+        resultados columnares) usan un solo KD-tree y una sola matriz de pesos,
+        aplicada a todas a la vez como un producto matricial.
+        Devuelve {variable: array de valores por celda interior}.
+        """
+        interpoladas = {}
+        if malla is None:
+            return interpoladas
+        
+        muestras = {}
+        for variable in variables:
+            datos = self._obtener_muestras(resultados, variable)
+            if datos is not None and len(datos[0]) > 0:
+                muestras[variable] = datos
+        if not muestras:
+            return interpoladas
+        
+        # Agrupar las variables con las mismas coordenadas que la primera
+        lats_ref, lons_ref, _ = next(iter(muestras.values()))
+        compartidas = [v for v, (lats, lons, _) in muestras.items()
+                       if len(lats) == len(lats_ref) and np.array_equal(lats, lats_ref) and np.array_equal(lons, lons_ref)]
+        
+        if len(compartidas) > 1:
+            try:
+                matriz = np.column_stack([muestras[v][2] for v in compartidas])
+                predicciones = self._interpolar(lats_ref, lons_ref, matriz, malla['lats'], malla['lons'], k=k)
+                for j, variable in enumerate(compartidas):
+                    interpoladas[variable] = self._limitar_valores(variable, predicciones[:, j])
+            except Exception as e:
+                print(f"Error en interpolación KNN: {str(e)}")
+        
+        # Variables con coordenadas propias: una por una
+        for variable, datos in muestras.items():
+            if variable not in interpoladas:
+                valores = self._interpolar_valores_knn(datos, malla, variable, k=k)
+                if valores is not None:
+                    interpoladas[variable] = valores
+        return interpoladas
+    
+    def _generar_superficies_quadtree(self, resultados, gdf_area, nivel_max, nivel_min=4):
+        """Superficies de todas las variables sobre una malla quadtree adaptativa.
+        
+        Devuelve (malla, {variable: valores}) con la malla expandida a
+        2^nivel_max celdas por lado, o (None, {}) si no hay muestras.
+        """
+        variables = [v for v in COLUMNAS_VARIABLE if self._obtener_muestras(resultados, v) is not None]
+        if not variables:
+            return None, {}
+        escalas = [np.ptp(self._obtener_muestras(resultados, v)[2]) for v in variables]
+        
+        def evaluar(lats, lons):
+            interpoladas = self._interpolar_variables(resultados, {'lats': lats, 'lons': lons}, variables)
+            return np.column_stack([interpoladas[v] for v in variables])
+        
+        try:
+            lats_muestra, lons_muestra, _ = self._obtener_muestras(resultados, variables[0])
+            malla = malla_quadtree(gdf_area.geometry.iloc[0], evaluar, escalas, nivel_min=min(nivel_min, nivel_max),
+                                   nivel_max=nivel_max, umbral=self.umbral_adaptativo,
+                                   puntos_refinar=(lats_muestra, lons_muestra))
+        except Exception as e:
+            print(f"Error generando malla adaptativa: {str(e)}")
+            return None, {}
+        if not malla['mascara'].any():
+            return None, {}
+        valores = malla.pop('valores')
+        return malla, {v: valores[:, j] for j, v in enumerate(variables)}
+    
+    def obtener_superficies(self, resultados, gdf_area, variables=None, lado=None):
+        """Superficies interpoladas canónicas del análisis, desde la caché si existen.
+        
+        Devuelve {variable: malla + 'valores'}. Si falta alguna variable se
+        interpolan juntas todas las del análisis sobre una sola malla y se
+        guardan en la caché, con clave (huella del polígono, huella de los
+        resultados, variable, resolución). `lado` pide la malla raster de
+        lado × lado celdas en lugar de la malla canónica de puntos; con
+        `malla_adaptativa` esa malla se construye como quadtree.
+        """
+        variables = list(variables or COLUMNAS_VARIABLE.keys())
+        if not resultados or gdf_area is None or gdf_area.empty:
+            return {}
+        
+        huella_poligono = huella_geometria(gdf_area.geometry.iloc[0])
+        huella_datos = huella_resultados(resultados)
+        resolucion = ('lado', lado) if lado else ('densidad', self.densidad_superficie)
+        if lado and self.malla_adaptativa:
+            resolucion = ('quadtree', int(np.ceil(np.log2(lado))), self.umbral_adaptativo)
+        resolucion += self._firma_interpolacion()
+        superficies = self.cache_superficies.obtener_superficies(huella_poligono, huella_datos, resolucion, variables)
+        if len(superficies) == len(variables):
+            return superficies
+        
+        if lado and self.malla_adaptativa:
+            malla, interpoladas = self._generar_superficies_quadtree(resultados, gdf_area, resolucion[1])
+            if malla is None:
+                return superficies
+            self.cache_superficies.guardar_superficies(huella_poligono, huella_datos, resolucion, malla, interpoladas)
+            return {variable: dict(malla, valores=interpoladas[variable])
+                    for variable in variables if variable in interpoladas}
+        
+        malla = self._generar_malla_puntos(gdf_area, densidad=self.densidad_superficie,
+                                           area_ha=resultados.get('area_total_ha'), lado=lado)
+        if malla is None:
+            return superficies
+        interpoladas = self._interpolar_variables(resultados, malla, list(COLUMNAS_VARIABLE.keys()))
+        self.cache_superficies.guardar_superficies(huella_poligono, huella_datos, resolucion, malla, interpoladas)
+        return {variable: dict(malla, valores=interpoladas[variable])
+                for variable in variables if variable in interpoladas}
+    
+    def _agregar_superficie_imagen(self, mapa, superficie, variable, nombre, mostrar=True, opacidad=0.75):
+        """Agrega la superficie coloreada y recortada al polígono como un solo PNG"""
+        tabla = tabla_colores(self.estilos['gradientes'][variable], n=255)
+        indices = indices_superficie(superficie, n_colores=len(tabla))
+        folium.raster_layers.ImageOverlay(
+            image=url_png(indices, tabla, opacidad),
+            bounds=limites_superficie(superficie),
+            name=nombre,
+            show=mostrar,
+            interactive=False,
+            zindex=1
+        ).add_to(mapa)
+    
+    def _lado_modo(self):
+        """Celdas por lado de la malla según el modo de renderizado (None = malla de puntos)"""
+        if self.modo_render in ('imagen', 'teselas'):
+            # Las teselas se evalúan por píxel; la malla raster queda para leyendas,
+            # consultas y la imagen de respaldo
+            return self.lado_raster
+        return None
+    
+    def _teselas_activas(self):
+        """True si las superficies se sirven como teselas (hay URL pública del servidor)"""
+        return self.modo_render == 'teselas' and teselas_publicas()
+    
+    def _evaluador_variable(self, resultados, variable, k=8):
+        """Función (lats, lons) → valores interpolados en cualquier punto, con el mismo
+        interpolador que las superficies pero sin malla (None sin muestras)"""
+        muestras = self._obtener_muestras(resultados, variable)
+        if muestras is None or len(muestras[0]) == 0:
+            return None
+        lats_m, lons_m, vals = (np.asarray(v, dtype=float) for v in muestras)
+        if self._usa_idw():
+            def evaluar(lats, lons):
+                return self._limitar_valores(variable, self._interpolar(lats_m, lons_m, vals, lats, lons))
+        else:
+            # Un solo KD-tree para todas las teselas de la capa
+            interpolador = InterpoladorKNN(lats_m, lons_m, k=k)
+            
+            def evaluar(lats, lons):
+                return self._limitar_valores(variable, interpolador.interpolar(interpolador.matriz_pesos(lats, lons), vals))
+        return evaluar
+    
+    def _agregar_superficie(self, mapa, resultados, gdf_area, superficie, variable, nombre, mostrar=True, opacidad=0.75):
+        """Agrega la superficie como imagen o como capa de teselas según el modo"""
+        if self._teselas_activas():
+            servidor = servidor_teselas()
+            evaluar = self._evaluador_variable(resultados, variable) if servidor is not None else None
+            if evaluar is not None:
+                poligono = gdf_area.geometry.iloc[0]
+                tabla = tabla_colores(self.estilos['gradientes'][variable], n=255)
+                # Mismo rango de colores que la imagen: el de la malla raster
+                vmin, vmax = rango_superficie(superficie)
+                id_capa = id_capa_teselas(huella_geometria(poligono), huella_resultados(resultados), variable,
+                                          vmin, vmax, opacidad, self.estilos['gradientes'][variable],
+                                          self._firma_interpolacion())
+                self._capas_teselas.append(id_capa)
+                servidor.piramide.registrar(id_capa, CapaTeselas(evaluar, poligono, tabla, vmin, vmax, opacidad))
+                oeste, sur, este, norte = poligono.bounds
+                folium.TileLayer(
+                    tiles=servidor.url_plantilla(id_capa),
+                    attr='Superficie interpolada',
+                    name=nombre,
+                    overlay=True,
+                    show=mostrar,
+                    max_zoom=22,
+                    bounds=[[sur, oeste], [norte, este]]
+                ).add_to(mapa)
+                return
+        # Sin servidor de teselas accesible: una sola imagen
+        self._agregar_superficie_imagen(mapa, superficie, variable, nombre, mostrar=mostrar, opacidad=opacidad)
+    
+    def _huella_estilo(self):
+        """Huella de todo lo que cambia el aspecto de los mapas (modo, mallas, estilos)"""
+        return huella_estilo(self.modo_render, self.malla_adaptativa, self.umbral_adaptativo, self.densidad_superficie,
+                             self.lado_raster, teselas_publicas(), self._firma_interpolacion(), self.capa_base,
+                             self.estilos)
+    
+    def _entrada_cacheada(self, clave, construir, conservar_mapa=False):
+        """Entrada {'html', 'capas', 'mapa'} de la caché, o construida con `construir()` y guardada.
+        
+        Un HTML con capas de teselas solo se reutiliza mientras el servidor
+        siga teniendo esas capas registradas. Con `conservar_mapa` se guarda
+        también el objeto folium (para widgets como `st_folium`, que lo
+        necesitan y dependen de que sus ids no cambien entre re-ejecuciones).
+        """
+        entrada = CACHE_MAPAS_HTML.obtener(clave)
+        if (entrada is not None and capas_registradas(entrada['capas']) and
+                (entrada['mapa'] is not None or not conservar_mapa)):
+            return entrada
+        
+        self._capas_teselas = []
+        mapa = construir()
+        if mapa is None:
+            return None
+        html = html_mapa(mapa)
+        entrada = {'html': html, 'capas': tuple(self._capas_teselas), 'mapa': mapa if conservar_mapa else None}
+        # El objeto folium ocupa del orden de su propio HTML
+        CACHE_MAPAS_HTML.guardar(clave, entrada, len(html) * (2 if conservar_mapa else 1))
+        return entrada
+    
+    def _html_cacheado(self, clave, construir, conservar_mapa=False):
+        """HTML final del mapa desde la caché, o construido con `construir()` y guardado"""
+        entrada = self._entrada_cacheada(clave, construir, conservar_mapa)
+        return entrada['html'] if entrada is not None else None
+    
+    def _clave_area(self, gdf, zoom_auto):
+        return ('area', zoom_auto, huella_geometria(gdf.geometry.iloc[0]), self._huella_estilo())
+    
+    def html_mapa_area(self, gdf, zoom_auto=True):
+        """HTML del mapa base del área (cacheado por polígono y estilo)"""
+        if gdf is None or gdf.empty:
+            return None
+        return self._html_cacheado(self._clave_area(gdf, zoom_auto),
+                                   lambda: self.crear_mapa_area(gdf, zoom_auto=zoom_auto), conservar_mapa=True)
+    
+    def mapa_area(self, gdf, zoom_auto=True):
+        """Copia del mapa folium base del área, el mismo de `html_mapa_area` (cacheado).
+        
+        Renderizar un mapa folium lo modifica; cada llamada parte de una copia
+        del cacheado, con los mismos ids, así el script generado es idéntico en
+        todas las re-ejecuciones y ninguna sesión altera el de otra.
+        """
+        if gdf is None or gdf.empty:
+            return None
+        entrada = self._entrada_cacheada(self._clave_area(gdf, zoom_auto),
+                                         lambda: self.crear_mapa_area(gdf, zoom_auto=zoom_auto), conservar_mapa=True)
+        return copy.deepcopy(entrada['mapa']) if entrada is not None else None
+    
+    def html_mapa_calor(self, resultados, variable='carbono', gdf_area=None):
+        """HTML del mapa de calor de una variable (cacheado por polígono, resultados y estilo)"""
+        if not resultados or gdf_area is None or gdf_area.empty:
+            return None
+        clave = ('calor', variable, huella_geometria(gdf_area.geometry.iloc[0]), huella_resultados(resultados),
+                 self._huella_estilo())
+        return self._html_cacheado(clave, lambda: self.crear_mapa_calor_interpolado(resultados, variable, gdf_area))
+    
+    def html_mapa_combinado(self, resultados, gdf_area=None):
+        """HTML del mapa combinado (cacheado por polígono, resultados y estilo)"""
+        if not resultados or gdf_area is None or gdf_area.empty:
+            return None
+        clave = ('combinado', huella_geometria(gdf_area.geometry.iloc[0]), huella_resultados(resultados),
+                 self._huella_estilo())
+        return self._html_cacheado(clave, lambda: self.crear_mapa_combinado_interpolado(resultados, gdf_area))
+    
+    # ===== CONSULTA POR COORDENADA =====
+    def indice_consulta(self, resultados, gdf_area):
+        """Índice de consulta (muestras + superficies de la malla del modo), cacheado"""
+        if not resultados or gdf_area is None or gdf_area.empty:
+            return None
+        lado = self._lado_modo()
+        clave = (huella_geometria(gdf_area.geometry.iloc[0]), huella_resultados(resultados), lado,
+                 self.malla_adaptativa and lado is not None, self.umbral_adaptativo, self._firma_interpolacion())
+        indice = CACHE_INDICES_CONSULTA.obtener(clave)
+        if indice is None:
+            muestras = {}
+            for variable in COLUMNAS_VARIABLE:
+                muestras_variable = self._obtener_muestras(resultados, variable)
+                if muestras_variable is not None and len(muestras_variable[0]) > 0:
+                    muestras[variable] = muestras_variable
+            if not muestras:
+                return None
+            superficies = self.obtener_superficies(resultados, gdf_area, list(muestras), lado=lado)
+            indice = IndiceConsulta(muestras, superficies)
+            CACHE_INDICES_CONSULTA.guardar(clave, indice, indice.nbytes)
+        return indice
+    
+    def consultar(self, resultados, gdf_area, lat, lon):
+        """Valores de la superficie mostrada y muestra más cercana en (lat, lon); acepta arrays.
+        
+        En modo 'imagen' el valor es el de la celda raster dibujada; con
+        teselas se evalúa el interpolador en el punto, igual que sus píxeles.
+        En modo 'heatmap' el navegador difumina la malla de puntos, así que
+        el valor de la celda más cercana es aproximado (`aproximado` = True).
+        """
+        indice = self.indice_consulta(resultados, gdf_area)
+        if indice is None:
+            return None
+        consulta = indice.consultar(lat, lon)
+        if self._teselas_activas():
+            dentro = contiene_xy(gdf_area.geometry.iloc[0], consulta['lon'], consulta['lat'])
+            for variable in list(consulta['interpolado']):
+                evaluar = self._evaluador_variable(resultados, variable)
+                if evaluar is None:
+                    continue
+                valores = np.full(consulta['lat'].shape, np.nan)
+                valores[dentro] = evaluar(consulta['lat'][dentro], consulta['lon'][dentro])
+                consulta['interpolado'][variable] = valores
+        consulta['aproximado'] = self._lado_modo() is None
+        return consulta
+    
+    def consultar_rectangulo(self, resultados, gdf_area, sur, oeste, norte, este):
+        """Muestras y resumen de las superficies dentro del rectángulo"""
+        indice = self.indice_consulta(resultados, gdf_area)
+        return indice.consultar_rectangulo(sur, oeste, norte, este) if indice is not None else None
     
     def crear_mapa_area(self, gdf, zoom_auto=True):
         """Crea mapa básico con el área de estudio con zoom automático mejorado"""
@@ -654,9 +1181,9 @@ class SistemaMapas:
                 control_scale=True
             )
             
-            # Agregar polígono con borde destacado
+            # Agregar polígono con borde destacado (simplificado y cuantizado para el zoom del mapa)
             folium.GeoJson(
-                gdf.geometry.iloc[0],
+                geometria_mapa(gdf.geometry.iloc[0]),
                 style_function=lambda x: self.estilos['area_estudio'],
                 highlight_function=lambda x: {
                     'weight': 6,
@@ -684,28 +1211,17 @@ class SistemaMapas:
         
         try:
             # Obtener puntos de muestra
-            puntos_muestra = []
-            if variable == 'carbono':
-                puntos_muestra = resultados.get('puntos_carbono', [])
-            elif variable == 'ndvi':
-                puntos_muestra = resultados.get('puntos_ndvi', [])
-            elif variable == 'ndwi':
-                puntos_muestra = resultados.get('puntos_ndwi', [])
-            elif variable == 'biodiversidad':
-                puntos_muestra = resultados.get('puntos_biodiversidad', [])
-            
-            if not puntos_muestra:
+            muestras = self._obtener_muestras(resultados, variable)
+            if muestras is None or len(muestras[0]) == 0:
                 return None
             
-            # Generar malla de puntos con mayor densidad
-            puntos_malla = self._generar_malla_puntos(gdf_area, densidad=1200)
+            # Superficie interpolada canónica (malla + valores)
+            malla = self.obtener_superficies(resultados, gdf_area, [variable], lado=self._lado_modo()).get(variable)
             
-            if not puntos_malla:
+            if malla is None:
                 st.warning(f"No se pudo generar malla de puntos para {variable}")
                 return None
-            
-            # Interpolar valores
-            puntos_interpolados = self._interpolar_valores_knn(puntos_muestra, puntos_malla, variable)
+            valores_malla = malla['valores']
             
             # Calcular centro y bounds
             bounds = gdf_area.total_bounds
@@ -722,7 +1238,7 @@ class SistemaMapas:
             
             # Agregar polígono base (semi-transparente)
             folium.GeoJson(
-                gdf_area.geometry.iloc[0],
+                geometria_mapa(gdf_area.geometry.iloc[0]),
                 style_function=lambda x: {
                     'fillColor': 'transparent',
                     'color': '#1d4ed8',
@@ -732,18 +1248,6 @@ class SistemaMapas:
                 }
             ).add_to(m)
             
-            # Preparar datos para heatmap
-            heat_data = []
-            for punto in puntos_interpolados:
-                if variable == 'carbono':
-                    heat_data.append([punto['lat'], punto['lon'], punto['carbono_ton_ha']])
-                elif variable == 'ndvi':
-                    heat_data.append([punto['lat'], punto['lon'], punto['ndvi']])
-                elif variable == 'ndwi':
-                    heat_data.append([punto['lat'], punto['lon'], punto['ndwi']])
-                elif variable == 'biodiversidad':
-                    heat_data.append([punto['lat'], punto['lon'], punto['indice_shannon']])
-            
             # Configurar parámetros del heatmap según la variable (con radios más grandes)
             if variable == 'carbono':
                 name = '🌳 Carbono (ton C/ha)'
@@ -774,22 +1278,27 @@ class SistemaMapas:
                 max_zoom = 18
                 min_opacity = 0.7
             
-            # Crear heatmap continuo (sin puntos de muestra visibles)
-            HeatMap(
-                heat_data,
-                name=name,
-                min_opacity=min_opacity,
-                radius=radius,
-                blur=blur,
-                gradient=gradient,
-                max_zoom=max_zoom
-            ).add_to(m)
+            if self.modo_render in ('imagen', 'teselas'):
+                # Superficie como imagen (o teselas) recortada al polígono
+                self._agregar_superficie(m, resultados, gdf_area, malla, variable, name, opacidad=min_opacity)
+            else:
+                # Crear heatmap continuo (sin puntos de muestra visibles)
+                heat_data = np.column_stack([malla['lats'], malla['lons'], valores_malla]).tolist()
+                HeatMap(
+                    heat_data,
+                    name=name,
+                    min_opacity=min_opacity,
+                    radius=radius,
+                    blur=blur,
+                    gradient=gradient,
+                    max_zoom=max_zoom
+                ).add_to(m)
             
             # Ajustar vista
             m.fit_bounds([[bounds[1], bounds[0]], [bounds[3], bounds[2]]])
             
             # Agregar leyenda mejorada
-            self._agregar_leyenda_continua(m, variable, resultados)
+            self._agregar_leyenda_continua(m, variable, resultados, malla)
             
             return m
         except Exception as e:
@@ -817,7 +1326,7 @@ class SistemaMapas:
             
             # Agregar polígono base
             folium.GeoJson(
-                gdf_area.geometry.iloc[0],
+                geometria_mapa(gdf_area.geometry.iloc[0]),
                 style_function=lambda x: {
                     'fillColor': 'transparent',
                     'color': '#1d4ed8',
@@ -827,10 +1336,10 @@ class SistemaMapas:
                 }
             ).add_to(m)
             
-            # Generar malla de puntos una vez (compartida para todas las variables)
-            puntos_malla = self._generar_malla_puntos(gdf_area, densidad=1000)
+            # Superficies canónicas (una malla compartida por todas las variables)
+            superficies = self.obtener_superficies(resultados, gdf_area, lado=self._lado_modo())
             
-            if puntos_malla:
+            if superficies:
                 # Variables a procesar
                 variables_procesar = []
                 if 'puntos_carbono' in resultados and resultados['puntos_carbono']:
@@ -844,27 +1353,18 @@ class SistemaMapas:
                 
                 # Procesar cada variable
                 for variable, nombre, gradient, radius, blur, mostrar_por_defecto in variables_procesar:
-                    # Obtener puntos de muestra
-                    puntos_muestra = resultados[f'puntos_{variable}']
+                    malla = superficies.get(variable)
+                    if malla is None:
+                        continue
+                    valores_malla = malla['valores']
                     
-                    # Interpolar valores
-                    puntos_interpolados = self._interpolar_valores_knn(
-                        puntos_muestra, 
-                        puntos_malla.copy(), 
-                        variable
-                    )
+                    if self.modo_render in ('imagen', 'teselas'):
+                        self._agregar_superficie(m, resultados, gdf_area, malla, variable, nombre,
+                                                 mostrar=mostrar_por_defecto, opacidad=0.65)
+                        continue
                     
                     # Preparar datos para heatmap
-                    heat_data = []
-                    for punto in puntos_interpolados:
-                        if variable == 'carbono':
-                            heat_data.append([punto['lat'], punto['lon'], punto['carbono_ton_ha']])
-                        elif variable == 'ndvi':
-                            heat_data.append([punto['lat'], punto['lon'], punto['ndvi']])
-                        elif variable == 'ndwi':
-                            heat_data.append([punto['lat'], punto['lon'], punto['ndwi']])
-                        elif variable == 'biodiversidad':
-                            heat_data.append([punto['lat'], punto['lon'], punto['indice_shannon']])
+                    heat_data = np.column_stack([malla['lats'], malla['lons'], valores_malla]).tolist()
                     
                     # Crear heatmap continuo
                     HeatMap(
@@ -881,8 +1381,9 @@ class SistemaMapas:
             # Agregar control de capas
             folium.LayerControl(collapsed=False).add_to(m)
             
-            # Agregar leyenda combinada
-            self._agregar_leyenda_combinada_continua(m, resultados)
+            # Agregar leyenda combinada (todas las variables comparten la malla)
+            malla_leyenda = next(iter(superficies.values()), None) if superficies else None
+            self._agregar_leyenda_combinada_continua(m, resultados, malla_leyenda)
             
             # Ajustar vista
             m.fit_bounds([[bounds[1], bounds[0]], [bounds[3], bounds[2]]])
@@ -892,48 +1393,68 @@ class SistemaMapas:
             st.warning(f"Error al crear mapa combinado interpolado: {str(e)}")
             return None
     
+    def describir_malla(self, malla):
+        """Celdas interpoladas y descripción de la malla que realmente dibuja el mapa"""
+        if malla is None:
+            return {'celdas': 0, 'descripcion': 'Sin malla', 'unidad': 'puntos'}
+        celdas = int(malla['mascara'].sum())
+        if self._lado_modo() is None:
+            return {'celdas': celdas, 'descripcion': 'Malla de puntos', 'unidad': 'puntos'}
+        if self._teselas_activas():
+            return {'celdas': TAMANO_TESELA ** 2, 'descripcion': 'Teselas interpoladas por píxel',
+                    'unidad': 'píxeles por tesela'}
+        filas, columnas = malla['mascara'].shape
+        tipo = 'Raster adaptativo' if self.malla_adaptativa else 'Raster'
+        return {'celdas': celdas, 'descripcion': f"{tipo} {columnas}×{filas}", 'unidad': 'celdas'}
+    
+    def resumen_malla(self, resultados, gdf_area, variable='carbono'):
+        """`describir_malla` de la superficie (cacheada) de una variable en el modo actual"""
+        malla = self.obtener_superficies(resultados, gdf_area, [variable], lado=self._lado_modo()).get(variable)
+        return self.describir_malla(malla)
+    
     # ===== LEYENDAS MEJORADAS =====
     
-    def _agregar_leyenda_continua(self, mapa, variable, resultados):
+    def _agregar_leyenda_continua(self, mapa, variable, resultados, malla=None):
         """Agrega leyenda para mapas de calor continuos"""
         try:
+            resumen = self.describir_malla(malla)
             if variable == 'carbono':
                 titulo = "🌳 Carbono (ton C/ha) - Mapa Continuo"
                 colores = self.estilos['gradientes']['carbono']
-                valores = [p['carbono_ton_ha'] for p in resultados.get('puntos_carbono', [])]
-                if valores:
-                    min_val = min(valores)
-                    max_val = max(valores)
+                valores = valores_puntos(resultados.get('puntos_carbono', []), 'carbono_ton_ha')
+                if len(valores) > 0:
+                    min_val = float(np.min(valores))
+                    max_val = float(np.max(valores))
                     texto = f"Rango: {min_val:.1f} - {max_val:.1f} ton C/ha"
                 else:
                     texto = "Distribución interpolada"
             elif variable == 'ndvi':
                 titulo = "📈 NDVI - Mapa Continuo"
                 colores = self.estilos['gradientes']['ndvi']
-                valores = [p['ndvi'] for p in resultados.get('puntos_ndvi', [])]
-                if valores:
-                    min_val = min(valores)
-                    max_val = max(valores)
+                valores = valores_puntos(resultados.get('puntos_ndvi', []), 'ndvi')
+                if len(valores) > 0:
+                    min_val = float(np.min(valores))
+                    max_val = float(np.max(valores))
                     texto = f"Rango: {min_val:.2f} - {max_val:.2f}"
                 else:
                     texto = "Distribución interpolada"
             elif variable == 'ndwi':
                 titulo = "💧 NDWI - Mapa Continuo"
                 colores = self.estilos['gradientes']['ndwi']
-                valores = [p['ndwi'] for p in resultados.get('puntos_ndwi', [])]
-                if valores:
-                    min_val = min(valores)
-                    max_val = max(valores)
+                valores = valores_puntos(resultados.get('puntos_ndwi', []), 'ndwi')
+                if len(valores) > 0:
+                    min_val = float(np.min(valores))
+                    max_val = float(np.max(valores))
                     texto = f"Rango: {min_val:.2f} - {max_val:.2f}"
                 else:
                     texto = "Distribución interpolada"
             elif variable == 'biodiversidad':
                 titulo = "🦋 Índice de Shannon - Mapa Continuo"
                 colores = self.estilos['gradientes']['biodiversidad']
-                valores = [p['indice_shannon'] for p in resultados.get('puntos_biodiversidad', [])]
-                if valores:
-                    min_val = min(valores)
-                    max_val = max(valores)
+                valores = valores_puntos(resultados.get('puntos_biodiversidad', []), 'indice_shannon')
+                if len(valores) > 0:
+                    min_val = float(np.min(valores))
+                    max_val = float(np.max(valores))
                     texto = f"Rango: {min_val:.2f} - {max_val:.2f}"
                 else:
                     texto = "Distribución interpolada"
@@ -1002,7 +1523,7 @@ class SistemaMapas:
                     border-top: 1px solid #e5e7eb;
                 ">
                     <div>🌡️ <strong>Mapa de calor continuo</strong> - Interpolación espacial</div>
-                    <div>📍 <strong>Malla densa:</strong> 1200+ puntos</div>
+                    <div>📍 <strong>{resumen['descripcion']}:</strong> {resumen['celdas']:,} {resumen['unidad']}</div>
                     <div>🎯 <strong>Sin puntos de muestreo visibles</strong></div>
                 </div>
             </div>
@@ -1011,10 +1532,11 @@ class SistemaMapas:
         except Exception as e:
             print(f"Error agregando leyenda: {str(e)}")
     
-    def _agregar_leyenda_combinada_continua(self, mapa, resultados):
+    def _agregar_leyenda_combinada_continua(self, mapa, resultados, malla=None):
         """Agrega leyenda combinada para mapa de calor continuo"""
         try:
-            leyenda_html = '''
+            resumen = self.describir_malla(malla)
+            leyenda_html = f'''
             <div style="
                 position: fixed; 
                 bottom: 30px; 
@@ -1078,7 +1600,7 @@ class SistemaMapas:
                     </div>
                     <div style="display: flex; align-items: center; margin-bottom: 6px;">
                         <span style="color: #10b981; font-weight: bold; margin-right: 8px;">✓</span>
-                        <span>Malla densa de 1200+ puntos</span>
+                        <span>{resumen['descripcion']}: {resumen['celdas']:,} {resumen['unidad']}</span>
                     </div>
                     <div style="display: flex; align-items: center; margin-bottom: 6px;">
                         <span style="color: #10b981; font-weight: bold; margin-right: 8px;">✓</span>
@@ -1096,78 +1618,72 @@ class SistemaMapas:
             print(f"Error agregando leyenda combinada: {str(e)}")
 
     # ===== NUEVO MÉTODO: GENERAR MAPA ESTÁTICO CON MATPLOTLIB =====
+    def crear_mapas_estaticos(self, resultados, gdf_area=None, variables=None, dpi=150, paralelo=False):
+        """
+        Genera las imágenes PNG estáticas de los mapas de calor usando Matplotlib.
+        
+        La superficie raster canónica (la misma del modo 'imagen') se dibuja
+        directamente, sin re-interpolar. Por defecto las figuras se renderizan
+        en este proceso; con `paralelo=True` (opt-in explícito, como el análisis
+        por zonas) y al menos `MIN_MAPAS_PROCESOS` figuras pendientes se reparten
+        entre procesos, donde la ganancia compensa el fork. Los PNG quedan en caché,
+        así que los informes PDF, DOCX e IA del mismo análisis los reutilizan.
+        Devuelve {variable: BytesIO}.
+        """
+        if not resultados or gdf_area is None or gdf_area.empty:
+            return {}
+        variables = [v for v in (variables or COLUMNAS_VARIABLE.keys()) if v in COLUMNAS_VARIABLE]
+        titulos = {
+            'carbono': 'Carbono (ton C/ha)',
+            'ndvi': 'NDVI',
+            'ndwi': 'NDWI',
+            'biodiversidad': 'Índice de Shannon'
+        }
+        
+        poligono = gdf_area.geometry.iloc[0]
+        # La huella de estilo cubre malla adaptativa, umbral y gradientes: la
+        # superficie dibujada depende de ellos
+        huellas = (huella_geometria(poligono), huella_resultados(resultados), self._huella_estilo())
+        imagenes = {}
+        pendientes = []
+        for variable in variables:
+            png = CACHE_MAPAS_ESTATICOS.obtener(huellas + (variable, dpi))
+            if png is not None:
+                imagenes[variable] = png
+            else:
+                pendientes.append(variable)
+        
+        if pendientes:
+            superficies = self.obtener_superficies(resultados, gdf_area, pendientes, lado=self.lado_raster)
+            contornos = contornos_poligono(poligono)
+            tareas = []
+            for variable in pendientes:
+                superficie = superficies.get(variable)
+                if superficie is None:
+                    continue
+                vmin, vmax = rango_superficie(superficie)
+                tareas.append((variable, (
+                    grilla_superficie(superficie), limites_extent(limites_superficie(superficie)),
+                    tabla_colores(self.estilos['gradientes'][variable]), vmin, vmax,
+                    titulos[variable], contornos, dpi
+                )))
+            try:
+                pngs = mapear_en_procesos(renderizar_mapa_estatico, [argumentos for _, argumentos in tareas],
+                                          paralelo=paralelo and len(tareas) >= MIN_MAPAS_PROCESOS)
+            except Exception as e:
+                print(f"Error generando mapas estáticos: {str(e)}")
+                pngs = []
+            for (variable, _), png in zip(tareas, pngs):
+                CACHE_MAPAS_ESTATICOS.guardar(huellas + (variable, dpi), png, len(png))
+                imagenes[variable] = png
+        
+        return {variable: io.BytesIO(imagenes[variable]) for variable in variables if variable in imagenes}
+    
     def crear_mapa_estatico(self, resultados, variable='carbono', gdf_area=None, dpi=150):
         """
         Genera una imagen PNG estática del mapa de calor usando Matplotlib.
         """
-        if not resultados or gdf_area is None or gdf_area.empty:
-            return None
-
-        # Obtener puntos de muestra
-        puntos_muestra = resultados.get(f'puntos_{variable}', [])
-        if not puntos_muestra:
-            return None
-
-        # Generar malla densa
-        puntos_malla = self._generar_malla_puntos(gdf_area, densidad=800)
-        if not puntos_malla:
-            return None
-
-        # Interpolar
-        puntos_interpolados = self._interpolar_valores_knn(puntos_muestra, puntos_malla, variable)
-
-        # Extraer coordenadas y valores
-        lats = [p['lat'] for p in puntos_interpolados]
-        lons = [p['lon'] for p in puntos_interpolados]
-        if variable == 'carbono':
-            valores = [p['carbono_ton_ha'] for p in puntos_interpolados]
-            titulo = 'Carbono (ton C/ha)'
-            cmap_name = 'carbono'
-        elif variable == 'ndvi':
-            valores = [p['ndvi'] for p in puntos_interpolados]
-            titulo = 'NDVI'
-            cmap_name = 'ndvi'
-        elif variable == 'ndwi':
-            valores = [p['ndwi'] for p in puntos_interpolados]
-            titulo = 'NDWI'
-            cmap_name = 'ndwi'
-        elif variable == 'biodiversidad':
-            valores = [p['indice_shannon'] for p in puntos_interpolados]
-            titulo = 'Índice de Shannon'
-            cmap_name = 'biodiversidad'
-        else:
-            return None
-
-        # Crear malla regular para el gráfico
-        bounds = gdf_area.total_bounds
-        minx, miny, maxx, maxy = bounds
-        grid_x, grid_y = np.mgrid[minx:maxx:100j, miny:maxy:100j]
-        from scipy.interpolate import griddata
-        grid_z = griddata((lons, lats), valores, (grid_x, grid_y), method='cubic')
-
-        # Crear figura
-        fig, ax = plt.subplots(1, 1, figsize=(10, 8))
-        colormap = LinearSegmentedColormap.from_list(cmap_name, list(self.estilos['gradientes'][cmap_name].values()))
-        im = ax.imshow(grid_z.T, extent=[minx, maxx, miny, maxy], origin='lower',
-                       cmap=colormap, aspect='auto')
-        plt.colorbar(im, ax=ax, label=titulo)
-        ax.set_title(f'Mapa de {titulo}')
-        ax.set_xlabel('Longitud')
-        ax.set_ylabel('Latitud')
-        ax.grid(True, linestyle='--', alpha=0.5)
-
-        # Dibujar el polígono del área (borde)
-        if gdf_area is not None and not gdf_area.empty:
-            boundary_geom = gdf_area.geometry.iloc[0].boundary
-            if boundary_geom and not boundary_geom.is_empty:
-                gpd.GeoSeries([boundary_geom]).plot(ax=ax, color='black', linewidth=1.5)
-
-        # Guardar en BytesIO
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
-        plt.close(fig)
-        buf.seek(0)
-        return buf
+        return self.crear_mapas_estaticos(resultados, gdf_area, [variable], dpi=dpi).get(variable)
 
 # ===============================
 # 📊 VISUALIZACIONES Y GRÁFICOS
@@ -1221,7 +1737,7 @@ class Visualizaciones:
         return fig
     
     @staticmethod
-    def crear_grafico_radar_biodiversidad(shannon_data: Dict):
+    def crear_grafico_radar_biodiversidad(shannon_data: Dict, semilla: Optional[int] = None):
         """Crea gráfico radar para biodiversidad"""
         if not shannon_data:
             # Crear gráfico vacío
@@ -1240,9 +1756,10 @@ class Visualizaciones:
             riqueza_norm = min(shannon_data.get('riqueza_especies', 0) / 200 * 100, 100)
             abundancia_norm = min(shannon_data.get('abundancia_total', 0) / 2000 * 100, 100)
             
-            # Valores simulados para equitatividad y conservación
-            equitatividad = random.uniform(70, 90)
-            conservacion = random.uniform(60, 95)
+            # Valores simulados para equitatividad y conservación (flujo propio del análisis)
+            rng = FlujosAleatorios(semilla).generador('visualizacion') if semilla is not None else np.random.default_rng()
+            equitatividad = rng.uniform(70, 90)
+            conservacion = rng.uniform(60, 95)
             
             valores = [shannon_norm, riqueza_norm, abundancia_norm, equitatividad, conservacion]
             
@@ -1297,8 +1814,8 @@ class Visualizaciones:
             )
             
             # Carbono vs NDVI
-            carbono_vals = [p['carbono_ton_ha'] for p in puntos_carbono[:n]]
-            ndvi_vals = [p['ndvi'] for p in puntos_ndvi[:n]]
+            carbono_vals = valores_puntos(puntos_carbono, 'carbono_ton_ha')[:n]
+            ndvi_vals = valores_puntos(puntos_ndvi, 'ndvi')[:n]
             
             fig.add_trace(
                 go.Scatter(
@@ -1312,7 +1829,7 @@ class Visualizaciones:
             )
             
             # Carbono vs NDWI
-            ndwi_vals = [p['ndwi'] for p in puntos_ndwi[:n]]
+            ndwi_vals = valores_puntos(puntos_ndwi, 'ndwi')[:n]
             fig.add_trace(
                 go.Scatter(
                     x=ndwi_vals,
@@ -1325,7 +1842,7 @@ class Visualizaciones:
             )
             
             # Shannon vs NDVI
-            shannon_vals = [p['indice_shannon'] for p in puntos_biodiversidad[:n]]
+            shannon_vals = valores_puntos(puntos_biodiversidad, 'indice_shannon')[:n]
             fig.add_trace(
                 go.Scatter(
                     x=ndvi_vals,
@@ -1415,14 +1932,14 @@ class GeneradorReportes:
         
     def _fig_to_png(self, fig, width=800, height=500):
         """Convierte una figura de Plotly a PNG en BytesIO usando Kaleido."""
-        if fig is None:
-            return None
-        try:
-            img_bytes = fig.to_image(format='png', width=width, height=height, scale=2)
-            return BytesIO(img_bytes)
-        except Exception as e:
-            st.warning(f"No se pudo convertir el gráfico a PNG: {str(e)}")
-            return None
+        return self._figs_to_png({'figura': (fig, width, height)}).get('figura')
+    
+    def _figs_to_png(self, figuras):
+        """Convierte varias figuras {nombre: (fig, ancho, alto)} a PNG en un solo lote"""
+        pngs, errores = exportador_graficos().exportar_lote(figuras)
+        for nombre, error in errores.items():
+            st.warning(f"No se pudo convertir el gráfico '{nombre}' a PNG: {error}")
+        return {nombre: BytesIO(png) for nombre, png in pngs.items() if png is not None}
     
     def _mapa_to_png(self, mapa, width=800, height=600):
         """Convierte un mapa de Folium a PNG (simulación)"""
@@ -1461,18 +1978,18 @@ class GeneradorReportes:
         vis = Visualizaciones()
         res = self.resultados
 
-        graficos = {}
+        figuras = {}
 
         # Gráfico de carbono
         if 'desglose_promedio' in res and res['desglose_promedio']:
             fig_carbono = vis.crear_grafico_barras_carbono(res['desglose_promedio'])
-            graficos['carbono'] = self._fig_to_png(fig_carbono)
+            figuras['carbono'] = (fig_carbono, 800, 500)
 
         # Gráfico de biodiversidad
         if 'puntos_biodiversidad' in res and res['puntos_biodiversidad']:
             if len(res['puntos_biodiversidad']) > 0:
-                fig_biodiv = vis.crear_grafico_radar_biodiversidad(res['puntos_biodiversidad'][0])
-                graficos['biodiv'] = self._fig_to_png(fig_biodiv)
+                fig_biodiv = vis.crear_grafico_radar_biodiversidad(res['puntos_biodiversidad'][0], res.get('semilla'))
+                figuras['biodiv'] = (fig_biodiv, 800, 500)
         
         # Gráfico comparativo
         if all(k in res for k in ['puntos_carbono', 'puntos_ndvi', 'puntos_ndwi', 'puntos_biodiversidad']):
@@ -1483,9 +2000,10 @@ class GeneradorReportes:
                 res['puntos_biodiversidad']
             )
             if fig_comparativo:
-                graficos['comparativo'] = self._fig_to_png(fig_comparativo)
+                figuras['comparativo'] = (fig_comparativo, 800, 500)
 
-        return graficos
+        # Un solo lote en el renderizador Kaleido caliente
+        return self._figs_to_png(figuras)
 
     def generar_pdf(self):
         """Genera reporte completo en PDF con todas las secciones e imágenes"""
@@ -1787,30 +2305,31 @@ class GeneradorReportes:
             if self.sistema_mapas:
                 story.append(PageBreak())
                 story.append(Paragraph("MAPAS DE CALOR CONTINUOS", subtitulo_style))
+                mapas_estaticos = self.sistema_mapas.crear_mapas_estaticos(self.resultados, self.gdf)
                 
                 # Mapa de carbono
-                mapa_carbono = self.sistema_mapas.crear_mapa_estatico(self.resultados, 'carbono', self.gdf)
+                mapa_carbono = mapas_estaticos.get('carbono')
                 if mapa_carbono:
                     story.append(Paragraph("Carbono (ton C/ha)", seccion_style))
                     story.append(Image(mapa_carbono, width=450, height=350))
                     story.append(Spacer(1, 12))
                 
                 # Mapa de NDVI
-                mapa_ndvi = self.sistema_mapas.crear_mapa_estatico(self.resultados, 'ndvi', self.gdf)
+                mapa_ndvi = mapas_estaticos.get('ndvi')
                 if mapa_ndvi:
                     story.append(Paragraph("NDVI - Índice de Vegetación", seccion_style))
                     story.append(Image(mapa_ndvi, width=450, height=350))
                     story.append(Spacer(1, 12))
                 
                 # Mapa de NDWI
-                mapa_ndwi = self.sistema_mapas.crear_mapa_estatico(self.resultados, 'ndwi', self.gdf)
+                mapa_ndwi = mapas_estaticos.get('ndwi')
                 if mapa_ndwi:
                     story.append(Paragraph("NDWI - Índice de Agua", seccion_style))
                     story.append(Image(mapa_ndwi, width=450, height=350))
                     story.append(Spacer(1, 12))
                 
                 # Mapa de biodiversidad
-                mapa_biodiv = self.sistema_mapas.crear_mapa_estatico(self.resultados, 'biodiversidad', self.gdf)
+                mapa_biodiv = mapas_estaticos.get('biodiversidad')
                 if mapa_biodiv:
                     story.append(Paragraph("Biodiversidad - Índice de Shannon", seccion_style))
                     story.append(Image(mapa_biodiv, width=450, height=350))
@@ -2070,9 +2589,10 @@ class GeneradorReportes:
             # ===== MAPAS ESTÁTICOS =====
             if self.sistema_mapas:
                 doc.add_heading('MAPAS DE CALOR CONTINUOS', level=1)
+                mapas_estaticos = self.sistema_mapas.crear_mapas_estaticos(self.resultados, self.gdf)
                 
                 # Mapa de carbono
-                mapa_carbono = self.sistema_mapas.crear_mapa_estatico(self.resultados, 'carbono', self.gdf)
+                mapa_carbono = mapas_estaticos.get('carbono')
                 if mapa_carbono:
                     doc.add_heading('Carbono (ton C/ha)', level=2)
                     with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
@@ -2083,7 +2603,7 @@ class GeneradorReportes:
                     doc.add_paragraph()
                 
                 # Mapa de NDVI
-                mapa_ndvi = self.sistema_mapas.crear_mapa_estatico(self.resultados, 'ndvi', self.gdf)
+                mapa_ndvi = mapas_estaticos.get('ndvi')
                 if mapa_ndvi:
                     doc.add_heading('NDVI - Índice de Vegetación', level=2)
                     with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
@@ -2094,7 +2614,7 @@ class GeneradorReportes:
                     doc.add_paragraph()
                 
                 # Mapa de NDWI
-                mapa_ndwi = self.sistema_mapas.crear_mapa_estatico(self.resultados, 'ndwi', self.gdf)
+                mapa_ndwi = mapas_estaticos.get('ndwi')
                 if mapa_ndwi:
                     doc.add_heading('NDWI - Índice de Agua', level=2)
                     with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
@@ -2105,7 +2625,7 @@ class GeneradorReportes:
                     doc.add_paragraph()
                 
                 # Mapa de biodiversidad
-                mapa_biodiv = self.sistema_mapas.crear_mapa_estatico(self.resultados, 'biodiversidad', self.gdf)
+                mapa_biodiv = mapas_estaticos.get('biodiversidad')
                 if mapa_biodiv:
                     doc.add_heading('Biodiversidad - Índice de Shannon', level=2)
                     with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
@@ -2208,6 +2728,16 @@ def generar_reporte_ia(resultados, gdf, sistema_mapas=None):
 
         # Preparar datos para IA
         df, stats = preparar_resumen(resultados)
+        
+        # Gráficos rasterizados en un solo lote (renderizador Kaleido caliente)
+        vis = Visualizaciones()
+        figuras = {}
+        if resultados.get('desglose_promedio'):
+            figuras['carbono'] = (vis.crear_grafico_barras_carbono(resultados['desglose_promedio']), 800, 500)
+        if resultados.get('puntos_biodiversidad'):
+            figuras['biodiv'] = (vis.crear_grafico_radar_biodiversidad(resultados['puntos_biodiversidad'][0],
+                                                                        resultados.get('semilla')), 800, 800)
+        graficos_png, _ = exportador_graficos().exportar_lote(figuras)
 
         # 1. Resumen ejecutivo
         doc.add_heading('1. RESUMEN EJECUTIVO', level=1)
@@ -2252,11 +2782,9 @@ def generar_reporte_ia(resultados, gdf, sistema_mapas=None):
             doc.add_paragraph()
 
             # Gráfico de carbono
-            vis = Visualizaciones()
-            fig_carbono = vis.crear_grafico_barras_carbono(resultados['desglose_promedio'])
-            if fig_carbono:
+            img_bytes = graficos_png.get('carbono')
+            if img_bytes:
                 try:
-                    img_bytes = fig_carbono.to_image(format='png', width=800, height=500, scale=2)
                     img_path = os.path.join(tmpdir, 'carbono.png')
                     with open(img_path, 'wb') as f:
                         f.write(img_bytes)
@@ -2290,10 +2818,9 @@ def generar_reporte_ia(resultados, gdf, sistema_mapas=None):
             doc.add_paragraph()
 
             # Gráfico de biodiversidad
-            fig_biodiv = vis.crear_grafico_radar_biodiversidad(biodiv)
-            if fig_biodiv:
+            img_bytes = graficos_png.get('biodiv')
+            if img_bytes:
                 try:
-                    img_bytes = fig_biodiv.to_image(format='png', width=800, height=800, scale=2)
                     img_path = os.path.join(tmpdir, 'biodiv.png')
                     with open(img_path, 'wb') as f:
                         f.write(img_bytes)
@@ -2317,8 +2844,9 @@ def generar_reporte_ia(resultados, gdf, sistema_mapas=None):
             doc.add_heading('5. MAPAS DE CALOR CONTINUOS', level=1)
             variables = ['carbono', 'ndvi', 'ndwi', 'biodiversidad']
             titulos = ['Carbono (ton C/ha)', 'NDVI - Índice de Vegetación', 'NDWI - Índice de Agua', 'Biodiversidad - Índice de Shannon']
+            mapas_estaticos = sistema_mapas.crear_mapas_estaticos(resultados, gdf, variables)
             for var, tit in zip(variables, titulos):
-                mapa = sistema_mapas.crear_mapa_estatico(resultados, var, gdf)
+                mapa = mapas_estaticos.get(var)
                 if mapa:
                     doc.add_heading(tit, level=2)
                     img_path = os.path.join(tmpdir, f'mapa_{var}.png')
@@ -2658,9 +3186,9 @@ def main():
                             st.write(f"Sureste: {bounds[1]:.4f}°N, {bounds[2]:.4f}°W")
                             st.write(f"**CRS:** {gdf.crs}")
                         
-                        # Crear mapa inicial con zoom automático mejorado
+                        # Mapa inicial con zoom automático (HTML cacheado: no se reconstruye en cada re-ejecución)
                         sistema_mapas = SistemaMapas()
-                        st.session_state.mapa = sistema_mapas.crear_mapa_area(gdf, zoom_auto=True)
+                        st.session_state.mapa = sistema_mapas.html_mapa_area(gdf, zoom_auto=True)
                         
                 except Exception as e:
                     st.error(f"Error al cargar archivo: {str(e)}")
@@ -2682,6 +3210,50 @@ def main():
                 help="Cantidad de puntos para análisis"
             )
             
+            metodo_muestreo = st.selectbox(
+                "Método de muestreo",
+                ['auto', 'rechazo', 'triangulacion'],
+                help="'rechazo' sortea puntos en el rectángulo envolvente y descarta los externos; 'triangulacion' los ubica directamente dentro del polígono (recomendado para franjas ribereñas, corredores o parcelas alargadas); 'auto' elige según la forma del polígono."
+            )
+            
+            semilla = st.number_input(
+                "Semilla aleatoria",
+                min_value=0,
+                max_value=2**32 - 1,
+                value=42,
+                step=1,
+                help="Con la misma semilla y las mismas entradas el análisis produce exactamente los mismos resultados."
+            )
+            
+            muestreo_adaptativo = st.checkbox(
+                "Tamaño de muestra adaptativo",
+                value=False,
+                help="Toma puntos por rondas hasta que el intervalo de confianza del carbono total alcance la precisión pedida. El número de puntos elegido arriba se usa como primera ronda."
+            )
+            precision_objetivo = None
+            max_puntos = None
+            if muestreo_adaptativo:
+                precision_objetivo = st.slider(
+                    "Precisión objetivo (± % del carbono total, 95% de confianza)",
+                    min_value=1.0, max_value=20.0, value=5.0, step=0.5
+                )
+                max_puntos = st.number_input("Máximo de puntos", min_value=50, max_value=20000, value=2000, step=50)
+            
+            analisis_por_zonas = st.checkbox(
+                "Análisis paralelo por zonas",
+                value=False,
+                help="Divide la parcela en zonas y analiza cada una en un proceso separado. Recomendado para parcelas de decenas de miles de hectáreas."
+            )
+            n_zonas = 1
+            if analisis_por_zonas:
+                n_zonas = st.slider("Número de zonas", min_value=2, max_value=16, value=4)
+            
+            modo_shannon = st.selectbox(
+                "Estimador del índice de Shannon",
+                ['simulacion', 'esperado'],
+                help="'simulacion' genera una comunidad de especies por punto; 'esperado' calcula el índice esperado y su varianza de forma analítica, mucho más rápido para grillas grandes."
+            )
+            
             # Opción para usar GEE si está disponible
             usar_gee = False
             if GEE_AVAILABLE and st.session_state.gee_authenticated:
@@ -2699,32 +3271,61 @@ def main():
             )
             
             if st.button("🚀 Ejecutar Análisis Completo", type="primary", use_container_width=True):
-                with st.spinner("Analizando carbono, biodiversidad e índices espectrales..."):
-                    try:
-                        if usar_gee and GEE_AVAILABLE and st.session_state.gee_authenticated:
-                            st.info("🌍 Usando datos reales de Google Earth Engine...")
-                            # Aquí podrías agregar la lógica para obtener datos reales de GEE
-                            # Por ahora usamos la misma función pero con un indicador
-                            resultados = ejecutar_analisis_completo(
-                                st.session_state.poligono_data,
-                                tipo_ecosistema,
-                                num_puntos,
-                                usar_gee=True
-                            )
+                usar_gee_real = usar_gee and GEE_AVAILABLE and st.session_state.gee_authenticated
+                if usar_gee_real:
+                    st.info("🌍 Usando datos reales de Google Earth Engine...")
+                    # Aquí podrías agregar la lógica para obtener datos reales de GEE
+                    # Por ahora usamos la misma función pero con un indicador
+                
+                barra_progreso = st.progress(0.0, text="Analizando carbono, biodiversidad e índices espectrales...")
+                kpis_provisionales = st.empty()
+                st.button("⏹️ Cancelar (conserva lo calculado)", use_container_width=True)
+                ultimo_avance = None
+                try:
+                    for avance in iterar_analisis_completo(
+                        st.session_state.poligono_data,
+                        tipo_ecosistema,
+                        num_puntos,
+                        usar_gee=usar_gee_real,
+                        metodo_muestreo=metodo_muestreo,
+                        modo_shannon=modo_shannon,
+                        semilla=int(semilla),
+                        n_zonas=n_zonas,
+                        paralelo=analisis_por_zonas,
+                        precision_objetivo=precision_objetivo,
+                        max_puntos=max_puntos
+                    ):
+                        ultimo_avance = avance
+                        barra_progreso.progress(
+                            min(avance['progreso'], 1.0),
+                            text=f"{avance['puntos_procesados']} puntos procesados"
+                        )
+                        kpis_provisionales.markdown(f"""
+                        **Resultados provisionales**  
+                        🌳 Carbono: {avance['carbono_total_ton']:,.0f} ton C  
+                        🏭 CO₂e: {avance['co2_total_ton']:,.0f} ton  
+                        🦋 Shannon: {avance['shannon_promedio']:.3f}  
+                        📈 NDVI: {avance['ndvi_promedio']:.3f}
+                        """)
+                    
+                    st.session_state.resultados = ultimo_avance['resultados']
+                    st.session_state.analisis_completado = True
+                    st.success("✅ Análisis completado!")
+                    
+                except Exception as e:
+                    st.error(f"Error en el análisis: {str(e)}")
+                except BaseException:
+                    # Streamlit interrumpe el script (Stop, Cancelar u otro widget) con excepciones
+                    # que no heredan de Exception: se conservan los puntos ya procesados
+                    if ultimo_avance is not None:
+                        if ultimo_avance['finalizado']:
+                            parciales = ultimo_avance['resultados']
                         else:
-                            resultados = ejecutar_analisis_completo(
-                                st.session_state.poligono_data,
-                                tipo_ecosistema,
-                                num_puntos,
-                                usar_gee=False
-                            )
-                            
-                        st.session_state.resultados = resultados
-                        st.session_state.analisis_completado = True
-                        st.success("✅ Análisis completado!")
-                        
-                    except Exception as e:
-                        st.error(f"Error en el análisis: {str(e)}")
+                            parciales = ultimo_avance['resultados_parciales']()
+                        if parciales is not None:
+                            st.session_state.resultados = parciales
+                            st.session_state.analisis_completado = True
+                    raise
     
     # Contenido principal
     if st.session_state.poligono_data is None:
@@ -2798,156 +3399,223 @@ def main():
         with tab6:
             mostrar_informe()
 
-def ejecutar_analisis_completo(gdf, tipo_ecosistema, num_puntos, usar_gee=False):
-    """Ejecuta análisis completo de carbono, biodiversidad e índices espectrales"""
-    
-    try:
-        # Calcular área
-        area_total = calcular_superficie(gdf)
-        
-        # Obtener polígono principal (ya está unificado)
-        poligono = gdf.geometry.iloc[0]
-        bounds = poligono.bounds
-        
-        # Inicializar sistemas
-        clima = ConectorClimaticoTropical()
-        verra = MetodologiaVerra()
-        biodiversidad = AnalisisBiodiversidad()
-        
-        # Generar puntos de muestreo
-        puntos_carbono = []
-        puntos_biodiversidad = []
-        puntos_ndvi = []
-        puntos_ndwi = []
-        
-        carbono_total = 0
-        co2_total = 0
-        shannon_promedio = 0
-        ndvi_promedio = 0
-        ndwi_promedio = 0
-        area_por_punto = max(area_total / num_puntos, 0.1)
-        
-        puntos_generados = 0
-        max_intentos = num_puntos * 10
-        
-        # Si se usa GEE y está disponible, intentar obtener datos reales
-        if usar_gee and GEE_AVAILABLE and st.session_state.gee_authenticated:
-            try:
-                # Aquí iría la lógica para obtener datos reales de GEE
-                # Por ahora, solo marcamos que se usó GEE
-                st.info("🌍 Obteniendo datos de Google Earth Engine...")
-                # Esta sería la función para obtener NDVI real de GEE
-                # ndvi_real = obtener_ndvi_gee(poligono, bounds)
-                # Por ahora usamos datos simulados pero con un indicador
-                datos_reales = True
-            except Exception as e:
-                st.warning(f"No se pudieron obtener datos de GEE: {str(e)}. Usando datos simulados.")
-                datos_reales = False
+# Puntos mínimos de cada ronda adicional del muestreo adaptativo
+PUNTOS_MINIMOS_RONDA = 10
+# Bloques en que se divide cada ronda para entregar avances (y tamaño mínimo de bloque)
+BLOQUES_POR_RONDA = 20
+PUNTOS_MINIMOS_BLOQUE = 25
+# Columnas con media y varianza acumuladas por zona durante el análisis
+CAMPOS_ACUMULADOS = ('carbono_ton_ha', 'co2_equivalente_ton_ha', 'indice_shannon', 'ndvi', 'ndwi')
+
+def _unir_columnas(partes):
+    """Concatena columnas de varias zonas o rondas conservando el orden"""
+    columnas = {}
+    for nombre in partes[0]:
+        valores = [parte[nombre] for parte in partes]
+        if isinstance(valores[0], list):
+            columnas[nombre] = [valor for lista in valores for valor in lista]
         else:
+            columnas[nombre] = np.concatenate(valores)
+    return columnas
+
+def analizar_zona(poligono, tipo_ecosistema, num_puntos, area_por_punto, metodo_muestreo,
+                  modo_shannon, conservar_especies, secuencias):
+    """Muestrea una zona y calcula todas las variables por punto.
+    
+    No usa Streamlit ni estado global, por lo que puede ejecutarse en un
+    proceso trabajador. Toda la aleatoriedad sale de `secuencias` (una
+    SeedSequence por etapa): con las mismas secuencias el resultado es el
+    mismo en serie o en paralelo. Devuelve las columnas de la zona.
+    """
+    clima = ConectorClimaticoTropical()
+    verra = MetodologiaVerra()
+    biodiversidad = AnalisisBiodiversidad()
+    
+    # Ajustar NDVI base según tipo de vegetación
+    if tipo_ecosistema in ['vid', 'cultivo', 'agricola']:
+        # Para cultivos: NDVI generalmente más bajo y menos variable
+        ndvi_base = 0.4
+        ndvi_var = 0.15
+    else:
+        # Para bosques naturales: NDVI más alto y más variable
+        ndvi_base = 0.5
+        ndvi_var = 0.2
+    
+    # Muestreo vectorizado de coordenadas dentro del polígono
+    lats_muestra, lons_muestra = muestrear_puntos_poligono(
+        poligono, num_puntos, metodo_muestreo, rng=np.random.default_rng(secuencias['muestreo'])
+    )
+    n_muestras = len(lats_muestra)
+    
+    # Obtener datos climáticos (todos los puntos en una consulta al índice de regiones)
+    precipitacion = clima.obtener_datos_climaticos_lote(
+        lats_muestra, lons_muestra, rng=np.random.default_rng(secuencias['clima'])
+    )['precipitacion']
+    
+    # Generar NDVI ajustado al tipo de vegetación
+    ndvi = ndvi_base + np.random.default_rng(secuencias['ndvi']).uniform(-ndvi_var, ndvi_var, n_muestras)
+    ndvi = np.clip(ndvi, 0.1, 0.9)  # Mantener rango razonable
+    
+    # Generar NDWI basado en precipitación y ubicación
+    base_ndwi = np.select([precipitacion > 2000, precipitacion < 800], [0.4, -0.1], 0.1)
+    ndwi = base_ndwi + np.random.default_rng(secuencias['ndwi']).uniform(-0.2, 0.2, n_muestras)
+    ndwi = np.clip(ndwi, -0.5, 0.8)
+    
+    # Columnas de resultados (un valor por punto de muestreo)
+    columnas = {
+        'lat': lats_muestra,
+        'lon': lons_muestra,
+        'ndvi': ndvi,
+        'ndwi': ndwi,
+        'precipitacion': precipitacion,
+        'area_punto_ha': np.full(n_muestras, area_por_punto)
+    }
+    
+    # Calcular carbono con metodología Verra ajustada (todos los puntos en una llamada)
+    carbono_lote = verra.calcular_carbono_lote(columnas['ndvi'], tipo_ecosistema, columnas['precipitacion'])
+    columnas['carbono_ton_ha'] = carbono_lote['carbono_total_ton_ha']
+    columnas['co2_equivalente_ton_ha'] = carbono_lote['co2_equivalente_ton_ha']
+    columnas['biomasa_aerea_ton_ha'] = carbono_lote['biomasa_aerea_ton_ha']
+    
+    # Calcular biodiversidad con índice de Shannon ajustado
+    if modo_shannon == 'esperado':
+        # Estimador analítico: H' esperado y su varianza, sin simular especies
+        biodiv_lote = biodiversidad.calcular_shannon_esperado_lote(
+            columnas['ndvi'],
+            tipo_ecosistema,
+            area_por_punto,
+            columnas['precipitacion']
+        )
+        columnas['varianza_shannon'] = biodiv_lote['varianza_shannon']
+    else:
+        # Simulación vectorizada de comunidades
+        biodiv_lote = biodiversidad.calcular_shannon_lote(
+            columnas['ndvi'],
+            tipo_ecosistema,
+            area_por_punto,
+            columnas['precipitacion'],
+            rng=np.random.default_rng(secuencias['biodiversidad']),
+            conservar_especies=conservar_especies
+        )
+        if conservar_especies:
+            columnas['especies_muestra'] = biodiv_lote['especies_muestra']
+    for campo in ('indice_shannon', 'categoria', 'color', 'riqueza_especies', 'abundancia_total'):
+        columnas[campo] = biodiv_lote[campo]
+    
+    return columnas
+
+def iterar_analisis_completo(gdf, tipo_ecosistema, num_puntos, usar_gee=False, metodo_muestreo='auto',
+                             conservar_especies=False, modo_shannon='simulacion', semilla=None,
+                             n_zonas=1, paralelo=False, precision_objetivo=None, max_puntos=None,
+                             nivel_confianza=0.95):
+    """Versión incremental de `ejecutar_analisis_completo`.
+    
+    Los puntos se procesan por bloques y después de cada bloque se entrega un
+    diccionario de avance con los agregados provisionales (totales, promedios,
+    puntos procesados y fracción de progreso). El avance incluye
+    `resultados_parciales`, una función que arma los `resultados` con lo
+    calculado hasta ese momento, para conservarlo si el análisis se cancela.
+    El último avance tiene `finalizado` en True y los `resultados` completos.
+    
+    Los bloques dependen solo de los parámetros, por lo que el resultado final
+    es el mismo que el de `ejecutar_analisis_completo` con la misma semilla.
+    """
+    flujos = FlujosAleatorios(semilla)
+    
+    # Calcular área
+    area_total = calcular_superficie(gdf)
+    
+    # Obtener polígono principal (ya está unificado)
+    poligono = gdf.geometry.iloc[0]
+    bounds = poligono.bounds
+    
+    # Inicializar sistemas
+    verra = MetodologiaVerra()
+    
+    # Si se usa GEE y está disponible, intentar obtener datos reales
+    if usar_gee and GEE_AVAILABLE and st.session_state.gee_authenticated:
+        try:
+            # Aquí iría la lógica para obtener datos reales de GEE
+            # Por ahora, solo marcamos que se usó GEE
+            st.info("🌍 Obteniendo datos de Google Earth Engine...")
+            # Esta sería la función para obtener NDVI real de GEE
+            # ndvi_real = obtener_ndvi_gee(poligono, bounds)
+            # Por ahora usamos datos simulados pero con un indicador
+            datos_reales = True
+        except Exception as e:
+            st.warning(f"No se pudieron obtener datos de GEE: {str(e)}. Usando datos simulados.")
             datos_reales = False
+    else:
+        datos_reales = False
+    
+    # Zonas de análisis: el polígono completo o una partición en celdas
+    if n_zonas > 1:
+        zonas_gdf = dividir_parcela_en_zonas(gdf, min(int(n_zonas), num_puntos))
+        poligonos_zonas = list(zonas_gdf.geometry)
+    else:
+        poligonos_zonas = [poligono]
+    
+    # Superficie de cada zona, ajustada para que sumen el área total
+    try:
+        areas_zonas = gpd.GeoSeries(poligonos_zonas, crs='EPSG:4326').to_crs('EPSG:3857').area.to_numpy()
+    except Exception:
+        areas_zonas = np.array([p.area for p in poligonos_zonas])
+    if areas_zonas.sum() > 0:
+        areas_zonas = areas_zonas / areas_zonas.sum() * area_total
+    pesos_zonas = areas_zonas / area_total if area_total > 0 else areas_zonas
+    
+    adaptativo = precision_objetivo is not None
+    cuotas = repartir_cuota(num_puntos, areas_zonas, minimo=2 if adaptativo else 1)
+    # Superficie que representa cada punto con la cuota inicial (escala del índice de Shannon)
+    area_nominal = [max(area / cuota, 0.1) if cuota > 0 else 0.1 for area, cuota in zip(areas_zonas, cuotas)]
+    if adaptativo:
+        max_puntos = max(int(max_puntos or num_puntos * 10), num_puntos)
+    
+    es_cultivo = tipo_ecosistema in ['vid', 'cultivo', 'agricola']
+    partes_zonas = [[] for _ in poligonos_zonas]
+    estadisticas = {campo: [EstadisticaAcumulada() for _ in poligonos_zonas] for campo in CAMPOS_ACUMULADOS}
+    ronda = 0
+    puntos_previstos = 0
+    
+    def armar_resultados(completo):
+        """Resultados con las columnas acumuladas hasta ahora"""
+        # Si quedaron zonas sin muestrear (cancelación), las muestreadas cubren toda la superficie
+        area_muestreada = sum(areas_zonas[z] for z, partes in enumerate(partes_zonas) if partes)
+        factor_area = area_total / area_muestreada if not completo and area_muestreada > 0 else 1.0
+        columnas_zonas = []
+        for z, partes in enumerate(partes_zonas):
+            if not partes:
+                continue
+            columnas_zona = _unir_columnas(partes)
+            n_zona = len(columnas_zona['lat'])
+            if adaptativo or not completo:
+                # Con los puntos de la zona ya conocidos, cada uno representa A_z / n_z
+                columnas_zona['area_punto_ha'] = np.full(n_zona, areas_zonas[z] * factor_area / n_zona)
+            columnas_zonas.append(columnas_zona)
+        if not columnas_zonas:
+            return None
+        columnas = _unir_columnas(columnas_zonas)
         
-        # Ajustar NDVI base según tipo de vegetación
-        if tipo_ecosistema in ['vid', 'cultivo', 'agricola']:
-            # Para cultivos: NDVI generalmente más bajo y menos variable
-            ndvi_base = 0.4
-            ndvi_var = 0.15
-        else:
-            # Para bosques naturales: NDVI más alto y más variable
-            ndvi_base = 0.5
-            ndvi_var = 0.2
-        
-        while puntos_generados < num_puntos and len(puntos_carbono) < max_intentos:
-            # Generar punto aleatorio
-            lat = bounds[1] + random.random() * (bounds[3] - bounds[1])
-            lon = bounds[0] + random.random() * (bounds[2] - bounds[0])
-            point = Point(lon, lat)
-            
-            if poligono.contains(point):
-                # Obtener datos climáticos
-                datos_clima = clima.obtener_datos_climaticos(lat, lon)
-                
-                # Generar NDVI ajustado al tipo de vegetación
-                ndvi = ndvi_base + random.uniform(-ndvi_var, ndvi_var)
-                ndvi = max(0.1, min(0.9, ndvi))  # Mantener rango razonable
-                
-                # Generar NDWI basado en precipitación y ubicación
-                base_ndwi = 0.1
-                if datos_clima['precipitacion'] > 2000:
-                    base_ndwi += 0.3
-                elif datos_clima['precipitacion'] < 800:
-                    base_ndwi -= 0.2
-                
-                ndwi = base_ndwi + random.uniform(-0.2, 0.2)
-                ndwi = max(-0.5, min(0.8, ndwi))
-                
-                # Calcular carbono con metodología Verra ajustada
-                carbono_info = verra.calcular_carbono_hectarea(ndvi, tipo_ecosistema, datos_clima['precipitacion'])
-                
-                # Calcular biodiversidad con índice de Shannon ajustado
-                biodiv_info = biodiversidad.calcular_shannon(
-                    ndvi, 
-                    tipo_ecosistema, 
-                    area_por_punto, 
-                    datos_clima['precipitacion']
-                )
-                
-                # Acumular totales
-                carbono_total += carbono_info['carbono_total_ton_ha'] * area_por_punto
-                co2_total += carbono_info['co2_equivalente_ton_ha'] * area_por_punto
-                shannon_promedio += biodiv_info['indice_shannon']
-                ndvi_promedio += ndvi
-                ndwi_promedio += ndwi
-                
-                # Guardar puntos para carbono
-                puntos_carbono.append({
-                    'lat': lat,
-                    'lon': lon,
-                    'carbono_ton_ha': carbono_info['carbono_total_ton_ha'],
-                    'biomasa_aerea_ton_ha': carbono_info.get('biomasa_aerea_ton_ha', 0),
-                    'ndvi': ndvi,
-                    'precipitacion': datos_clima['precipitacion'],
-                    'tipo_vegetacion': tipo_ecosistema
-                })
-                
-                # Guardar puntos para biodiversidad
-                biodiv_info['lat'] = lat
-                biodiv_info['lon'] = lon
-                biodiv_info['tipo_vegetacion'] = tipo_ecosistema
-                biodiv_info['es_cultivo'] = biodiv_info.get('es_cultivo', False)
-                puntos_biodiversidad.append(biodiv_info)
-                
-                # Guardar puntos para NDVI
-                puntos_ndvi.append({
-                    'lat': lat,
-                    'lon': lon,
-                    'ndvi': ndvi,
-                    'tipo_vegetacion': tipo_ecosistema
-                })
-                
-                # Guardar puntos para NDWI
-                puntos_ndwi.append({
-                    'lat': lat,
-                    'lon': lon,
-                    'ndwi': ndwi,
-                    'tipo_vegetacion': tipo_ecosistema
-                })
-                
-                puntos_generados += 1
+        muestras = MuestrasAnalisis(
+            columnas,
+            constantes={'tipo_vegetacion': tipo_ecosistema, 'es_cultivo': es_cultivo}
+        )
         
-        # Calcular promedios
-        if puntos_generados > 0:
-            shannon_promedio /= puntos_generados
-            ndvi_promedio /= puntos_generados
-            ndwi_promedio /= puntos_generados
+        # Totales y promedios sobre las columnas
+        puntos_generados = len(muestras)
+        # Cada punto representa la superficie de su zona dividida por la cuota de la zona
+        area_puntos = muestras.columna('area_punto_ha')
+        carbono_total = float(np.sum(muestras.columna('carbono_ton_ha') * area_puntos))
+        co2_total = float(np.sum(muestras.columna('co2_equivalente_ton_ha') * area_puntos))
+        shannon_promedio = float(np.average(muestras.columna('indice_shannon'), weights=area_puntos))
+        ndvi_promedio = float(np.average(muestras.columna('ndvi'), weights=area_puntos))
+        ndwi_promedio = float(np.average(muestras.columna('ndwi'), weights=area_puntos))
         
         # Obtener desglose promedio de carbono
         carbono_promedio = verra.calcular_carbono_hectarea(ndvi_promedio, tipo_ecosistema, 1500)
         
-        # Determinar si es cultivo para ajustar interpretaciones
-        es_cultivo = tipo_ecosistema in ['vid', 'cultivo', 'agricola']
-        
         # Preparar resultados
-        resultados = {
+        return {
             'area_total_ha': area_total,
             'carbono_total_ton': round(carbono_total, 2),
             'co2_total_ton': round(co2_total, 2),
@@ -2955,35 +3623,175 @@ def ejecutar_analisis_completo(gdf, tipo_ecosistema, num_puntos, usar_gee=False)
             'shannon_promedio': round(shannon_promedio, 3),
             'ndvi_promedio': round(ndvi_promedio, 3),
             'ndwi_promedio': round(ndwi_promedio, 3),
-            'puntos_carbono': puntos_carbono,
-            'puntos_biodiversidad': puntos_biodiversidad,
-            'puntos_ndvi': puntos_ndvi,
-            'puntos_ndwi': puntos_ndwi,
+            'muestras': muestras,
+            'puntos_carbono': muestras.vista('puntos_carbono'),
+            'puntos_biodiversidad': muestras.vista('puntos_biodiversidad'),
+            'puntos_ndvi': muestras.vista('puntos_ndvi'),
+            'puntos_ndwi': muestras.vista('puntos_ndwi'),
             'tipo_ecosistema': tipo_ecosistema,
             'es_cultivo': es_cultivo,
+            'modo_shannon': modo_shannon,
+            'semilla': flujos.semilla,
+            'n_zonas': len(columnas_zonas),
+            'intervalo_confianza': {
+                'carbono_total_ton': intervalo_estratificado(areas_zonas, estadisticas['carbono_ton_ha'],
+                                                             nivel_confianza, reescalar=not completo),
+                'shannon_promedio': intervalo_estratificado(pesos_zonas, estadisticas['indice_shannon'],
+                                                            nivel_confianza, reescalar=not completo)
+            },
+            'puntos_usados': puntos_generados,
+            'rondas_muestreo': ronda,
+            'precision_objetivo': precision_objetivo,
+            'analisis_parcial': not completo,
             'num_puntos': puntos_generados,
             'desglose_promedio': carbono_promedio['desglose'] if carbono_promedio else {},
             'usar_gee': usar_gee and datos_reales,
             'biomasa_aerea_promedio': carbono_promedio.get('biomasa_aerea_ton_ha', 0) if carbono_promedio else 0
         }
-        
-        # Mostrar información específica según tipo de vegetación
-        if es_cultivo:
-            st.info(f"""
-            **🌾 Análisis para sistema agrícola ({tipo_ecosistema}):**
-            
-            • **Carbono promedio:** {resultados['carbono_promedio_ha']:.1f} ton C/ha (esperado: 20-70 ton C/ha)
-            • **Índice Shannon:** {resultados['shannon_promedio']:.2f} (típico para monocultivos: 0.5-1.5)
-            • **NDVI:** {resultados['ndvi_promedio']:.2f} (rango normal para cultivos: 0.3-0.7)
-            """)
+    
+    def avance(puntos_procesados, intervalo_carbono, finalizado=False):
+        """Agregados provisionales a partir de las estadísticas acumuladas"""
+        if finalizado:
+            progreso = 1.0
+        elif adaptativo:
+            # Fracción estimada de los puntos necesarios (o del presupuesto máximo)
+            necesidad = (precision_objetivo / intervalo_carbono['semiamplitud_pct']) ** 2 if intervalo_carbono['semiamplitud'] > 0 else 0.0
+            progreso = min(0.99, max(puntos_procesados / max_puntos, necesidad))
         else:
-            st.info(f"""
-            **🌳 Análisis para ecosistema natural ({tipo_ecosistema}):**
-            
-            • **Carbono promedio:** {resultados['carbono_promedio_ha']:.1f} ton C/ha (esperado: 80-400 ton C/ha)
-            • **Índice Shannon:** {resultados['shannon_promedio']:.2f} (típico para bosques: 2.0-4.0)
-            • **NDVI:** {resultados['ndvi_promedio']:.2f} (rango normal para bosques: 0.5-0.9)
-            """)
+            progreso = puntos_procesados / max(puntos_previstos, 1)
+        return {
+            'puntos_procesados': puntos_procesados,
+            'puntos_previstos': max_puntos if adaptativo else puntos_previstos,
+            'progreso': progreso,
+            'ronda': ronda,
+            'carbono_total_ton': intervalo_carbono['estimacion'],
+            'co2_total_ton': intervalo_estratificado(areas_zonas, estadisticas['co2_equivalente_ton_ha'], reescalar=True)['estimacion'],
+            'shannon_promedio': intervalo_estratificado(pesos_zonas, estadisticas['indice_shannon'], reescalar=True)['estimacion'],
+            'ndvi_promedio': intervalo_estratificado(pesos_zonas, estadisticas['ndvi'], reescalar=True)['estimacion'],
+            'ndwi_promedio': intervalo_estratificado(pesos_zonas, estadisticas['ndwi'], reescalar=True)['estimacion'],
+            'semiamplitud_pct': intervalo_carbono['semiamplitud_pct'],
+            'finalizado': finalizado,
+            'resultados_parciales': lambda: armar_resultados(completo=False)
+        }
+    
+    while True:
+        # Tareas de la ronda: cada zona reparte su cuota en bloques con flujos aleatorios propios
+        tamano_bloque = max(PUNTOS_MINIMOS_BLOQUE, math.ceil(int(cuotas.sum()) / BLOQUES_POR_RONDA))
+        bloques_zonas = []
+        for z, cuota in enumerate(cuotas):
+            n_bloques = max(1, math.ceil(cuota / tamano_bloque))
+            bloques_zonas.append(repartir_cuota(int(cuota), np.ones(n_bloques), minimo=0))
+        
+        tareas, zonas_tarea = [], []
+        # Bloques intercalados entre zonas, para que un avance parcial cubra toda la parcela
+        for b in range(max(len(bloques) for bloques in bloques_zonas)):
+            for z, bloques in enumerate(bloques_zonas):
+                if b >= len(bloques) or bloques[b] <= 0:
+                    continue
+                if adaptativo:
+                    subclave = (z, ronda)
+                elif len(poligonos_zonas) == 1:
+                    subclave = ()
+                else:
+                    subclave = (z,)
+                if len(bloques) > 1:
+                    subclave += (b,)
+                tareas.append((
+                    poligonos_zonas[z], tipo_ecosistema, int(bloques[b]), area_nominal[z],
+                    metodo_muestreo, modo_shannon, conservar_especies, flujos.secuencias_etapas(*subclave)
+                ))
+                zonas_tarea.append(z)
+        puntos_previstos += int(cuotas.sum())
+        
+        # Con una sola zona los bloques se procesan en este proceso: bifurcar el
+        # servidor de Streamlit (multihilo) solo vale la pena con varias zonas
+        en_procesos = paralelo and len(poligonos_zonas) > 1
+        for z, columnas_bloque in zip(zonas_tarea, iterar_en_procesos(analizar_zona, tareas, paralelo=en_procesos)):
+            partes_zonas[z].append(columnas_bloque)
+            for campo in CAMPOS_ACUMULADOS:
+                estadisticas[campo][z].agregar(columnas_bloque[campo])
+            puntos_procesados = sum(est.n for est in estadisticas['carbono_ton_ha'])
+            yield avance(puntos_procesados, intervalo_estratificado(areas_zonas, estadisticas['carbono_ton_ha'],
+                                                                    nivel_confianza, reescalar=True))
+        ronda += 1
+        
+        intervalo_carbono = intervalo_estratificado(areas_zonas, estadisticas['carbono_ton_ha'], nivel_confianza)
+        puntos_usados = sum(est.n for est in estadisticas['carbono_ton_ha'])
+        if (not adaptativo or intervalo_carbono['semiamplitud_pct'] <= precision_objetivo
+                or puntos_usados >= max_puntos or not tareas):
+            break
+        
+        # La semiamplitud cae como 1/√n: estimar cuántos puntos faltan para el objetivo
+        necesarios = puntos_usados * (intervalo_carbono['semiamplitud_pct'] / precision_objetivo) ** 2
+        siguiente = max(math.ceil(necesarios) - puntos_usados, PUNTOS_MINIMOS_RONDA)
+        siguiente = min(siguiente, max_puntos - puntos_usados)
+        # Asignación de Neyman: más puntos en zonas grandes y heterogéneas
+        pesos_ronda = [area * est.desvio for area, est in zip(areas_zonas, estadisticas['carbono_ton_ha'])]
+        if sum(pesos_ronda) <= 0:
+            pesos_ronda = areas_zonas
+        cuotas = repartir_cuota(siguiente, pesos_ronda, minimo=0)
+    
+    resultados = armar_resultados(completo=True)
+    if resultados is None:
+        raise ValueError("No se pudo generar ningún punto de muestreo dentro del polígono")
+    if not adaptativo and resultados['num_puntos'] < num_puntos:
+        st.warning(f"⚠️ Solo se generaron {resultados['num_puntos']} de {num_puntos} puntos de muestreo dentro del polígono")
+    
+    # Mostrar información específica según tipo de vegetación
+    if es_cultivo:
+        st.info(f"""
+        **🌾 Análisis para sistema agrícola ({tipo_ecosistema}):**
+        
+        • **Carbono promedio:** {resultados['carbono_promedio_ha']:.1f} ton C/ha (esperado: 20-70 ton C/ha)
+        • **Índice Shannon:** {resultados['shannon_promedio']:.2f} (típico para monocultivos: 0.5-1.5)
+        • **NDVI:** {resultados['ndvi_promedio']:.2f} (rango normal para cultivos: 0.3-0.7)
+        """)
+    else:
+        st.info(f"""
+        **🌳 Análisis para ecosistema natural ({tipo_ecosistema}):**
+        
+        • **Carbono promedio:** {resultados['carbono_promedio_ha']:.1f} ton C/ha (esperado: 80-400 ton C/ha)
+        • **Índice Shannon:** {resultados['shannon_promedio']:.2f} (típico para bosques: 2.0-4.0)
+        • **NDVI:** {resultados['ndvi_promedio']:.2f} (rango normal para bosques: 0.5-0.9)
+        """)
+    
+    final = avance(resultados['num_puntos'], resultados['intervalo_confianza']['carbono_total_ton'], finalizado=True)
+    final['resultados'] = resultados
+    yield final
+
+def ejecutar_analisis_completo(gdf, tipo_ecosistema, num_puntos, usar_gee=False, metodo_muestreo='auto',
+                               conservar_especies=False, modo_shannon='simulacion', semilla=None,
+                               n_zonas=1, paralelo=False, precision_objetivo=None, max_puntos=None,
+                               nivel_confianza=0.95):
+    """Ejecuta análisis completo de carbono, biodiversidad e índices espectrales
+    
+    Toda la aleatoriedad sale de `semilla`: cada etapa usa su propio Generator
+    de NumPy derivado de ella, por lo que las mismas entradas con la misma
+    semilla producen exactamente los mismos resultados. Sin semilla se sortea
+    una y queda registrada en los resultados.
+    
+    Con `n_zonas` > 1 el polígono se divide con `dividir_parcela_en_zonas` y
+    cada zona se analiza con su cuota de puntos (proporcional a su superficie)
+    y sus propios flujos aleatorios; con `paralelo` (y más de una zona) los
+    bloques se reparten en procesos. Los totales no dependen de si la ejecución fue serial o paralela.
+    
+    Con `precision_objetivo` (porcentaje) el muestreo es adaptativo: se toman
+    rondas de puntos, actualizando medias y varianzas acumuladas por zona,
+    hasta que la semiamplitud del intervalo de confianza de
+    `carbono_total_ton` quede por debajo de ese porcentaje o se alcance
+    `max_puntos`. `num_puntos` es entonces el tamaño de la primera ronda.
+    """
+    
+    try:
+        resultados = None
+        for avance in iterar_analisis_completo(
+            gdf, tipo_ecosistema, num_puntos, usar_gee=usar_gee, metodo_muestreo=metodo_muestreo,
+            conservar_especies=conservar_especies, modo_shannon=modo_shannon, semilla=semilla,
+            n_zonas=n_zonas, paralelo=paralelo, precision_objetivo=precision_objetivo,
+            max_puntos=max_puntos, nivel_confianza=nivel_confianza
+        ):
+            if avance['finalizado']:
+                resultados = avance['resultados']
         
         return resultados
     except Exception as e:
@@ -2995,6 +3803,59 @@ def ejecutar_analisis_completo(gdf, tipo_ecosistema, num_puntos, usar_gee=False)
 # ===============================
 # 🗺️ FUNCIONES DE VISUALIZACIÓN CORREGIDAS
 # ===============================
+def mostrar_html_mapa(html, width=1000, height=650):
+    """Incrusta el HTML ya renderizado de un mapa folium (igual que `folium_static`)"""
+    components.html(html, height=height + 10, width=width)
+
+# Con fragmentos (Streamlit >= 1.37) un clic re-ejecuta solo la consulta, no la página
+fragmento = getattr(st, 'fragment', None) or (lambda funcion: funcion)
+
+@fragmento
+def mostrar_consulta_por_clic(sistema_mapas, resultados, gdf_area):
+    """Mapa interactivo: al hacer clic muestra los valores de las cuatro variables en ese punto"""
+    st.markdown("#### 🔎 Consulta de valores por clic")
+    # El mapa base cacheado: mismo objeto (y mismos ids) en cada re-ejecución,
+    # así el componente no se vuelve a montar ni pierde el último clic
+    mapa_consulta = sistema_mapas.mapa_area(gdf_area)
+    if mapa_consulta is None:
+        return
+    eventos = st_folium(mapa_consulta, width=1000, height=450, returned_objects=['last_clicked'], key='mapa_consulta')
+    clic = (eventos or {}).get('last_clicked')
+    if not clic:
+        st.caption("Haga clic dentro del polígono para consultar carbono, NDVI, NDWI y Shannon en ese punto.")
+        return
+    
+    inicio = time.perf_counter()
+    consulta = sistema_mapas.consultar(resultados, gdf_area, clic['lat'], clic['lng'])
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+    if consulta is None:
+        st.warning("No hay datos para consultar.")
+        return
+    
+    etiquetas = {
+        'carbono': ('🌳 Carbono (ton C/ha)', '{:.1f}'),
+        'ndvi': ('📈 NDVI', '{:.3f}'),
+        'ndwi': ('💧 NDWI', '{:.3f}'),
+        'biodiversidad': ('🦋 Shannon', '{:.2f}')
+    }
+    columnas = st.columns(len(etiquetas))
+    for columna, (variable, (etiqueta, formato)) in zip(columnas, etiquetas.items()):
+        with columna:
+            interpolado = consulta['interpolado'].get(variable)
+            muestra = consulta['muestra'].get(variable)
+            if interpolado is not None and not np.isnan(interpolado):
+                valor = ("≈ " if consulta['aproximado'] else "") + formato.format(float(interpolado))
+            else:
+                valor = "Fuera del área"
+            detalle = None
+            if muestra is not None:
+                detalle = f"Muestra: {formato.format(float(muestra['valor']))} a {float(muestra['distancia_m']):,.0f} m"
+            st.metric(etiqueta, valor, detalle, delta_color="off")
+    st.caption(f"📍 {clic['lat']:.5f}, {clic['lng']:.5f} · consulta en {duracion_ms:.2f} ms")
+    if consulta['aproximado']:
+        st.caption("≈ En modo 'heatmap' el mapa difumina la malla de puntos en el navegador: el valor "
+                   "mostrado es el de la celda más cercana de esa malla, aproximado respecto al color en pantalla.")
+
 def mostrar_mapas_calor():
     """Muestra todos los mapas de calor disponibles con interpolación KNN y aspecto continuo"""
     st.header("🗺️ Mapas de Calor Continuos - Sin puntos de muestreo")
@@ -3014,6 +3875,32 @@ def mostrar_mapas_calor():
     
     mapa_base_disponible = st.session_state.get('mapa') is not None
     
+    col_modo, col_malla = st.columns([3, 1])
+    with col_modo:
+        modo_render = st.radio(
+            "Renderizado de las superficies",
+            ['imagen', 'teselas', 'heatmap'] if teselas_publicas() else ['imagen', 'heatmap'],
+            horizontal=True,
+            help="'imagen' dibuja la superficie interpolada como una sola imagen recortada al polígono (liviana en el navegador); 'teselas' (disponible si TESELAS_URL_PUBLICA apunta al servidor de teselas, que escucha en TESELAS_HOST:TESELAS_PUERTO) evalúa la superficie píxel a píxel solo en las teselas visibles, con más detalle al acercar (para concesiones de 100.000+ ha); 'heatmap' usa capas de calor por puntos."
+        )
+    with col_malla:
+        malla_adaptativa = st.checkbox(
+            "Malla adaptativa",
+            value=False,
+            help="Construye la superficie como quadtree: celdas finas solo en el contorno y donde los valores cambian rápido. Menos celdas interpoladas y bordes más nítidos (modo 'imagen' y leyendas del modo 'teselas')."
+        )
+    col_interpolacion, col_potencia = st.columns([3, 1])
+    with col_interpolacion:
+        interpolacion = st.radio(
+            "Interpolación",
+            ['knn', 'idw'],
+            horizontal=True,
+            help="'knn' pondera por 1/d los 8 vecinos más cercanos (KD-tree); 'idw' pondera todas las muestras por 1/d^potencia (más suave, más costoso con muchas muestras). Sin SciPy siempre se usa 'idw'."
+        )
+    with col_potencia:
+        potencia_idw = st.number_input("Potencia IDW", min_value=0.5, max_value=5.0, value=2.0, step=0.5,
+                                       disabled=interpolacion != 'idw')
+    
     tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
         "🌍 Área Base", 
         "🌳 Carbono", 
@@ -3026,7 +3913,7 @@ def mostrar_mapas_calor():
     with tab1:
         st.subheader("🌍 Mapa Base del Área de Estudio")
         if mapa_base_disponible:
-            folium_static(st.session_state.mapa, width=1000, height=650)
+            mostrar_html_mapa(st.session_state.mapa, width=1000, height=650)
             st.info("Mapa base con el polígono del área de estudio. El zoom se ajusta automáticamente al área cargada.")
         else:
             st.info("No hay mapa para mostrar")
@@ -3035,23 +3922,25 @@ def mostrar_mapas_calor():
         st.subheader("🌳 Mapa de Calor Continuo - Carbono (ton C/ha)")
         if resultados_disponibles and poligono_disponible:
             try:
-                sistema_mapas = SistemaMapas()
-                mapa_carbono = sistema_mapas.crear_mapa_calor_interpolado(
+                sistema_mapas = SistemaMapas(modo_render=modo_render, malla_adaptativa=malla_adaptativa,
+                                             interpolacion=interpolacion, potencia_idw=potencia_idw)
+                mapa_carbono = sistema_mapas.html_mapa_calor(
                     resultados=st.session_state.resultados,
                     variable='carbono',
                     gdf_area=poligono_data
                 )
                 
                 if mapa_carbono:
-                    folium_static(mapa_carbono, width=1000, height=650)
+                    mostrar_html_mapa(mapa_carbono, width=1000, height=650)
+                    malla_usada = sistema_mapas.resumen_malla(st.session_state.resultados, poligono_data, 'carbono')
                     
                     # Información adicional
                     col1, col2, col3, col4 = st.columns(4)
                     with col1:
-                        puntos_carbono = st.session_state.resultados.get('puntos_carbono', [])
-                        if puntos_carbono:
-                            carb_min = min(p['carbono_ton_ha'] for p in puntos_carbono)
-                            carb_max = max(p['carbono_ton_ha'] for p in puntos_carbono)
+                        carbono_vals = valores_puntos(st.session_state.resultados.get('puntos_carbono', []), 'carbono_ton_ha')
+                        if len(carbono_vals) > 0:
+                            carb_min = float(np.min(carbono_vals))
+                            carb_max = float(np.max(carbono_vals))
                         else:
                             carb_min = carb_max = 0
                         st.metric("Carbono promedio", f"{st.session_state.resultados.get('carbono_promedio_ha', 0):.1f} ton C/ha")
@@ -3060,13 +3949,14 @@ def mostrar_mapas_calor():
                     with col3:
                         st.metric("Carbono total", f"{st.session_state.resultados.get('carbono_total_ton', 0):,.0f} ton C")
                     with col4:
-                        st.metric("Puntos interpolados", "1200+", "Malla densa")
+                        st.metric(f"{malla_usada['unidad'].capitalize()} interpolados", f"{malla_usada['celdas']:,}",
+                                  malla_usada['descripcion'])
                     
-                    st.info("""
+                    st.info(f"""
                     **Características del mapa continuo:**
                     - 🎯 **Cobertura completa**: Interpolación KNN para cubrir toda el área
                     - 🌡️ **Gradiente suave**: Transiciones de color continuas
-                    - 📊 **Alta densidad**: Más de 1200 puntos interpolados
+                    - 📊 **Resolución**: {malla_usada['descripcion']}, {malla_usada['celdas']:,} {malla_usada['unidad']} interpolados
                     - 🔍 **Sin puntos de muestreo visibles**
                     """)
                 else:
@@ -3080,24 +3970,26 @@ def mostrar_mapas_calor():
         st.subheader("📈 Mapa de Calor Continuo - NDVI (Índice de Vegetación)")
         if resultados_disponibles and poligono_disponible:
             try:
-                sistema_mapas = SistemaMapas()
-                mapa_ndvi = sistema_mapas.crear_mapa_calor_interpolado(
+                sistema_mapas = SistemaMapas(modo_render=modo_render, malla_adaptativa=malla_adaptativa,
+                                             interpolacion=interpolacion, potencia_idw=potencia_idw)
+                mapa_ndvi = sistema_mapas.html_mapa_calor(
                     resultados=st.session_state.resultados,
                     variable='ndvi',
                     gdf_area=poligono_data
                 )
                 
                 if mapa_ndvi:
-                    folium_static(mapa_ndvi, width=1000, height=650)
+                    mostrar_html_mapa(mapa_ndvi, width=1000, height=650)
+                    malla_usada = sistema_mapas.resumen_malla(st.session_state.resultados, poligono_data, 'ndvi')
                     
                     # Información adicional
                     col1, col2, col3, col4 = st.columns(4)
                     with col1:
                         st.metric("NDVI promedio", f"{st.session_state.resultados.get('ndvi_promedio', 0):.3f}")
                     with col2:
-                        ndvi_vals = st.session_state.resultados.get('puntos_ndvi', [])
-                        if ndvi_vals:
-                            st.metric("Rango NDVI", f"{min(p['ndvi'] for p in ndvi_vals):.2f} - {max(p['ndvi'] for p in ndvi_vals):.2f}")
+                        ndvi_vals = valores_puntos(st.session_state.resultados.get('puntos_ndvi', []), 'ndvi')
+                        if len(ndvi_vals) > 0:
+                            st.metric("Rango NDVI", f"{np.min(ndvi_vals):.2f} - {np.max(ndvi_vals):.2f}")
                         else:
                             st.metric("Rango NDVI", "N/A")
                     with col3:
@@ -3110,7 +4002,8 @@ def mostrar_mapas_calor():
                             interpretacion = "🍂 Vegetación escasa"
                         st.metric("Interpretación", interpretacion)
                     with col4:
-                        st.metric("Puntos interpolados", "1200+", "Malla densa")
+                        st.metric(f"{malla_usada['unidad'].capitalize()} interpolados", f"{malla_usada['celdas']:,}",
+                                  malla_usada['descripcion'])
                     
                     st.info("""
                     **Interpretación del NDVI:**
@@ -3130,24 +4023,26 @@ def mostrar_mapas_calor():
         st.subheader("💧 Mapa de Calor Continuo - NDWI (Índice de Agua)")
         if resultados_disponibles and poligono_disponible:
             try:
-                sistema_mapas = SistemaMapas()
-                mapa_ndwi = sistema_mapas.crear_mapa_calor_interpolado(
+                sistema_mapas = SistemaMapas(modo_render=modo_render, malla_adaptativa=malla_adaptativa,
+                                             interpolacion=interpolacion, potencia_idw=potencia_idw)
+                mapa_ndwi = sistema_mapas.html_mapa_calor(
                     resultados=st.session_state.resultados,
                     variable='ndwi',
                     gdf_area=poligono_data
                 )
                 
                 if mapa_ndwi:
-                    folium_static(mapa_ndwi, width=1000, height=650)
+                    mostrar_html_mapa(mapa_ndwi, width=1000, height=650)
+                    malla_usada = sistema_mapas.resumen_malla(st.session_state.resultados, poligono_data, 'ndwi')
                     
                     # Información adicional
                     col1, col2, col3, col4 = st.columns(4)
                     with col1:
                         st.metric("NDWI promedio", f"{st.session_state.resultados.get('ndwi_promedio', 0):.3f}")
                     with col2:
-                        ndwi_vals = st.session_state.resultados.get('puntos_ndwi', [])
-                        if ndwi_vals:
-                            st.metric("Rango NDWI", f"{min(p['ndwi'] for p in ndwi_vals):.2f} - {max(p['ndwi'] for p in ndwi_vals):.2f}")
+                        ndwi_vals = valores_puntos(st.session_state.resultados.get('puntos_ndwi', []), 'ndwi')
+                        if len(ndwi_vals) > 0:
+                            st.metric("Rango NDWI", f"{np.min(ndwi_vals):.2f} - {np.max(ndwi_vals):.2f}")
                         else:
                             st.metric("Rango NDWI", "N/A")
                     with col3:
@@ -3160,7 +4055,8 @@ def mostrar_mapas_calor():
                             interpretacion = "🏜️ Seco"
                         st.metric("Humedad", interpretacion)
                     with col4:
-                        st.metric("Puntos interpolados", "1200+", "Malla densa")
+                        st.metric(f"{malla_usada['unidad'].capitalize()} interpolados", f"{malla_usada['celdas']:,}",
+                                  malla_usada['descripcion'])
                     
                     st.info("""
                     **Interpretación del NDWI:**
@@ -3180,24 +4076,26 @@ def mostrar_mapas_calor():
         st.subheader("🦋 Mapa de Calor Continuo - Biodiversidad (Índice de Shannon)")
         if resultados_disponibles and poligono_disponible:
             try:
-                sistema_mapas = SistemaMapas()
-                mapa_biodiv = sistema_mapas.crear_mapa_calor_interpolado(
+                sistema_mapas = SistemaMapas(modo_render=modo_render, malla_adaptativa=malla_adaptativa,
+                                             interpolacion=interpolacion, potencia_idw=potencia_idw)
+                mapa_biodiv = sistema_mapas.html_mapa_calor(
                     resultados=st.session_state.resultados,
                     variable='biodiversidad',
                     gdf_area=poligono_data
                 )
                 
                 if mapa_biodiv:
-                    folium_static(mapa_biodiv, width=1000, height=650)
+                    mostrar_html_mapa(mapa_biodiv, width=1000, height=650)
+                    malla_usada = sistema_mapas.resumen_malla(st.session_state.resultados, poligono_data, 'biodiversidad')
                     
                     # Información adicional
                     col1, col2, col3, col4 = st.columns(4)
                     with col1:
                         st.metric("Shannon promedio", f"{st.session_state.resultados.get('shannon_promedio', 0):.3f}")
                     with col2:
-                        shannon_vals = st.session_state.resultados.get('puntos_biodiversidad', [])
-                        if shannon_vals:
-                            st.metric("Rango Shannon", f"{min(p['indice_shannon'] for p in shannon_vals):.2f} - {max(p['indice_shannon'] for p in shannon_vals):.2f}")
+                        shannon_vals = valores_puntos(st.session_state.resultados.get('puntos_biodiversidad', []), 'indice_shannon')
+                        if len(shannon_vals) > 0:
+                            st.metric("Rango Shannon", f"{np.min(shannon_vals):.2f} - {np.max(shannon_vals):.2f}")
                         else:
                             st.metric("Rango Shannon", "N/A")
                     with col3:
@@ -3208,7 +4106,8 @@ def mostrar_mapas_calor():
                         else:
                             st.metric("Categoría", "N/A")
                     with col4:
-                        st.metric("Puntos interpolados", "1200+", "Malla densa")
+                        st.metric(f"{malla_usada['unidad'].capitalize()} interpolados", f"{malla_usada['celdas']:,}",
+                                  malla_usada['descripcion'])
                     
                     st.info("""
                     **Escala del Índice de Shannon:**
@@ -3229,16 +4128,18 @@ def mostrar_mapas_calor():
         st.subheader("🎭 Mapa Combinado Continuo - Todas las Capas")
         if resultados_disponibles and poligono_disponible:
             try:
-                sistema_mapas = SistemaMapas()
-                mapa_combinado = sistema_mapas.crear_mapa_combinado_interpolado(
+                sistema_mapas = SistemaMapas(modo_render=modo_render, malla_adaptativa=malla_adaptativa,
+                                             interpolacion=interpolacion, potencia_idw=potencia_idw)
+                mapa_combinado = sistema_mapas.html_mapa_combinado(
                     resultados=st.session_state.resultados,
                     gdf_area=poligono_data
                 )
                 
                 if mapa_combinado:
-                    folium_static(mapa_combinado, width=1000, height=650)
+                    mostrar_html_mapa(mapa_combinado, width=1000, height=650)
+                    malla_usada = sistema_mapas.resumen_malla(st.session_state.resultados, poligono_data)
                     
-                    st.info("""
+                    st.info(f"""
                     **📌 Instrucciones para el mapa combinado:**
                     
                     1. **🎮 Control de capas**: Use el panel en la esquina superior derecha para activar/desactivar capas
@@ -3254,9 +4155,11 @@ def mostrar_mapas_calor():
                     
                     **🧠 Método de interpolación:**
                     - **K-Nearest Neighbors (KNN)**: Interpolación basada en vecinos cercanos
-                    - **Cobertura completa**: Malla densa de 1200+ puntos que cubre todo el polígono
+                    - **Cobertura completa**: {malla_usada['descripcion']} de {malla_usada['celdas']:,} {malla_usada['unidad']} que cubre todo el polígono
                     - **Gradientes suaves**: Sin espacios vacíos ni puntos visibles
                     """)
+                    
+                    mostrar_consulta_por_clic(sistema_mapas, st.session_state.resultados, poligono_data)
                 else:
                     st.warning("No se pudo generar el mapa combinado.")
             except Exception as e:
@@ -3280,6 +4183,18 @@ def mostrar_dashboard():
         )
         st.markdown(html_kpi, unsafe_allow_html=True)
         
+        if res.get('analisis_parcial'):
+            st.warning(f"⏹️ Análisis cancelado: resultados parciales con {res.get('num_puntos', 0)} puntos procesados")
+        
+        intervalo = res.get('intervalo_confianza', {}).get('carbono_total_ton')
+        if intervalo:
+            texto_ic = (f"Carbono total: {intervalo['inferior']:,.0f} – {intervalo['superior']:,.0f} ton C "
+                        f"(IC {intervalo['nivel_confianza']:.0%}, ±{intervalo['semiamplitud_pct']:.1f}%)")
+            if res.get('precision_objetivo') is not None:
+                texto_ic += (f" · muestreo adaptativo: {res.get('puntos_usados', 0)} puntos en "
+                             f"{res.get('rondas_muestreo', 1)} rondas (objetivo ±{res['precision_objetivo']:.1f}%)")
+            st.caption(texto_ic)
+        
         # Métricas adicionales
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -3307,7 +4222,7 @@ def mostrar_dashboard():
         with col2:
             st.subheader("Perfil de Biodiversidad")
             if res.get('puntos_biodiversidad') and len(res['puntos_biodiversidad']) > 0:
-                fig_radar = Visualizaciones.crear_grafico_radar_biodiversidad(res['puntos_biodiversidad'][0])
+                fig_radar = Visualizaciones.crear_grafico_radar_biodiversidad(res['puntos_biodiversidad'][0], res.get('semilla'))
                 if fig_radar:
                     st.plotly_chart(fig_radar, use_container_width=True)
                 else:
@@ -3459,6 +4374,9 @@ def mostrar_biodiversidad():
                     "Individuos estimados"
                 )
             
+            if 'varianza_shannon' in biodiv:
+                st.caption(f"Estimador analítico: índice esperado ± {np.sqrt(biodiv['varianza_shannon']):.3f} (desvío estándar por punto)")
+            
             # Interpretación del índice
             st.subheader("Interpretación del Índice de Shannon")
             
@@ -3481,10 +4399,11 @@ def mostrar_biodiversidad():
             st.subheader("Distribución de Categorías en Puntos de Muestreo")
             
             if res.get('puntos_biodiversidad'):
-                categorias = {}
-                for p in res['puntos_biodiversidad']:
-                    cat = p.get('categoria', 'Desconocida')
-                    categorias[cat] = categorias.get(cat, 0) + 1
+                etiquetas, conteos = np.unique(
+                    valores_puntos(res['puntos_biodiversidad'], 'categoria', 'Desconocida').astype(str),
+                    return_counts=True
+                )
+                categorias = dict(zip(etiquetas.tolist(), conteos.tolist()))
                 
                 if categorias:
                     fig_cat = go.Figure(data=[go.Pie(
@@ -3507,7 +4426,7 @@ def mostrar_biodiversidad():
             st.subheader("Distribución del Índice entre Puntos de Muestreo")
             
             if res.get('puntos_biodiversidad'):
-                shannon_values = [p.get('indice_shannon', 0) for p in res['puntos_biodiversidad']]
+                shannon_values = valores_puntos(res['puntos_biodiversidad'], 'indice_shannon')
                 
                 fig = go.Figure(data=[go.Histogram(
                     x=shannon_values,
@@ -3593,10 +4512,10 @@ def mostrar_comparacion():
                 # Tomar hasta 100 puntos para no saturar
                 n = min(100, len(res['puntos_carbono']))
                 
-                carbono_vals = [p['carbono_ton_ha'] for p in res['puntos_carbono'][:n]]
-                ndvi_vals = [p['ndvi'] for p in res['puntos_ndvi'][:n]]
-                ndwi_vals = [p['ndwi'] for p in res['puntos_ndwi'][:n]]
-                shannon_vals = [p['indice_shannon'] for p in res['puntos_biodiversidad'][:n]]
+                carbono_vals = valores_puntos(res['puntos_carbono'], 'carbono_ton_ha')[:n]
+                ndvi_vals = valores_puntos(res['puntos_ndvi'], 'ndvi')[:n]
+                ndwi_vals = valores_puntos(res['puntos_ndwi'], 'ndwi')[:n]
+                shannon_vals = valores_puntos(res['puntos_biodiversidad'], 'indice_shannon')[:n]
                 
                 # Calcular coeficientes de correlación
                 corr_carbono_ndvi = np.corrcoef(carbono_vals, ndvi_vals)[0, 1] if len(carbono_vals) > 1 else 0
@@ -3713,6 +4632,9 @@ def mostrar_informe():
         - Conclusiones y valoración económica
         """)
         
+        # Renderizador de gráficos listo antes de que se pida el primer informe
+        exportador_graficos().precalentar()
+        
         # Sistema de mapas para el informe
         sistema_mapas = SistemaMapas()
         
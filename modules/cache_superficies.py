@@ -0,0 +1,154 @@
+# modules/cache_superficies.py
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+import numpy as np
+import shapely
+
+from modules.muestras import COLUMNAS_VARIABLE, valores_puntos
+
+
+def huella_geometria(geometria) -> str:
+    """Huella estable de una geometría (hash de su WKB)"""
+    return hashlib.blake2b(shapely.to_wkb(geometria), digest_size=16).hexdigest()
+
+
+def huella_resultados(resultados: Dict) -> str:
+    """Huella de los puntos de muestreo que alimentan los mapas.
+
+    Cubre coordenadas y valores de las cuatro variables interpoladas, de
+    modo que cualquier análisis distinto (otra semilla, otro polígono, un
+    resultado parcial) produce otra huella.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    muestras = resultados.get('muestras')
+    if muestras is not None:
+        columnas = [muestras.columna('lat'), muestras.columna('lon')]
+        columnas += [muestras.variable(variable) for variable in COLUMNAS_VARIABLE]
+    else:
+        # Resultados en el formato anterior (listas de diccionarios)
+        columnas = []
+        for variable, campo in COLUMNAS_VARIABLE.items():
+            puntos = resultados.get(f'puntos_{variable}') or []
+            columnas += [valores_puntos(puntos, 'lat'), valores_puntos(puntos, 'lon'),
+                         valores_puntos(puntos, campo)]
+    for columna in columnas:
+        arr = np.ascontiguousarray(columna, dtype=np.float64)
+        h.update(np.int64(arr.size).tobytes())
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+def _tamano_bytes(valor: Any) -> int:
+    """Bytes ocupados por los arrays NumPy de una entrada (anidados en dict/list)"""
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, dict):
+        return sum(_tamano_bytes(v) for v in valor.values())
+    if isinstance(valor, (list, tuple)):
+        return sum(_tamano_bytes(v) for v in valor)
+    return 0
+
+
+class CacheLRU:
+    """Caché LRU con límite de entradas y de memoria (bytes de arrays NumPy).
+
+    Al superar cualquiera de los dos límites se descartan las entradas usadas
+    hace más tiempo. Una entrada más grande que el límite de memoria no se
+    guarda. Es segura entre hilos (Streamlit atiende sesiones en paralelo).
+    """
+
+    def __init__(self, max_entradas: int = 64, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._entradas: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._bytes = 0
+        self._bloqueo = threading.RLock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def __contains__(self, clave: Hashable) -> bool:
+        return clave in self._entradas
+
+    @property
+    def bytes_usados(self) -> int:
+        return self._bytes
+
+    def obtener(self, clave: Hashable, defecto: Any = None) -> Any:
+        with self._bloqueo:
+            if clave not in self._entradas:
+                self.fallos += 1
+                return defecto
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return self._entradas[clave][0]
+
+    def guardar(self, clave: Hashable, valor: Any, tamano: Optional[int] = None) -> None:
+        tamano = _tamano_bytes(valor) if tamano is None else int(tamano)
+        with self._bloqueo:
+            if clave in self._entradas:
+                self._bytes -= self._entradas.pop(clave)[1]
+            if tamano > self.max_bytes:
+                return
+            self._entradas[clave] = (valor, tamano)
+            self._bytes += tamano
+            while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+                _, (_, tamano_viejo) = self._entradas.popitem(last=False)
+                self._bytes -= tamano_viejo
+
+    def obtener_o_calcular(self, clave: Hashable, calcular: Callable[[], Any]) -> Any:
+        """Devuelve la entrada o la calcula y guarda (None no se guarda)"""
+        valor = self.obtener(clave)
+        if valor is None:
+            valor = calcular()
+            if valor is not None:
+                self.guardar(clave, valor)
+        return valor
+
+    def limpiar(self) -> None:
+        with self._bloqueo:
+            self._entradas.clear()
+            self._bytes = 0
+
+
+class CacheSuperficies(CacheLRU):
+    """Superficies interpoladas por (polígono, resultados, variable, resolución).
+
+    Cada entrada es el diccionario de la malla (`xs`, `ys`, `mascara`, `lats`,
+    `lons`) más los `valores` interpolados de la variable. Las variables
+    guardadas juntas comparten los arrays de la malla, así que su tamaño se
+    reparte entre ellas en lugar de contarse una vez por variable.
+    """
+
+    @staticmethod
+    def clave(huella_poligono: str, huella_datos: str, variable: str, resolucion: Hashable) -> tuple:
+        return (huella_poligono, huella_datos, variable, resolucion)
+
+    def guardar_superficies(self, huella_poligono: str, huella_datos: str, resolucion: Hashable,
+                            malla: Dict, valores: Dict[str, np.ndarray]) -> None:
+        if not valores:
+            return
+        parte_malla = _tamano_bytes(malla) // len(valores)
+        for variable, valores_variable in valores.items():
+            self.guardar(self.clave(huella_poligono, huella_datos, variable, resolucion),
+                         dict(malla, valores=valores_variable), valores_variable.nbytes + parte_malla)
+
+    def obtener_superficies(self, huella_poligono: str, huella_datos: str, resolucion: Hashable,
+                            variables: Iterable[str]) -> Dict[str, Dict]:
+        """Superficies ya calculadas de las variables pedidas (omite las faltantes)"""
+        superficies = {}
+        for variable in variables:
+            superficie = self.obtener(self.clave(huella_poligono, huella_datos, variable, resolucion))
+            if superficie is not None:
+                superficies[variable] = superficie
+        return superficies
+
+
+# Caché compartida por todas las sesiones del proceso (los módulos importados
+# sobreviven a las re-ejecuciones del script de Streamlit)
+CACHE_SUPERFICIES = CacheSuperficies()
@@ -0,0 +1,185 @@
+# modules/consulta_espacial.py
+import numpy as np
+import shapely
+from typing import Dict, Tuple
+
+from modules.cache_superficies import CacheLRU
+from modules.raster_superficies import grilla_superficie, limites_superficie
+
+try:
+    from scipy.spatial import cKDTree
+    KDTREE_DISPONIBLE = True
+except ImportError:
+    KDTREE_DISPONIBLE = False
+
+RADIO_TIERRA_M = 6_371_008.8
+
+# Índices de consulta por (huella del polígono, huella de resultados, resolución)
+CACHE_INDICES_CONSULTA = CacheLRU(max_entradas=16, max_bytes=128 * 1024 * 1024)
+
+
+class _ArbolMuestras:
+    """Vecino más cercano sobre un conjunto de coordenadas de muestra.
+
+    Las longitudes se escalan por cos(latitud media) para que la distancia
+    en el plano se parezca a la real. Usa un KD-tree de SciPy o, sin SciPy,
+    un `shapely.STRtree` de puntos.
+    """
+
+    def __init__(self, lats, lons):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.escala_lon = float(np.cos(np.radians(np.mean(self.lats)))) if len(self.lats) else 1.0
+        coordenadas = np.column_stack([self.lons * self.escala_lon, self.lats])
+        if KDTREE_DISPONIBLE:
+            self.arbol = cKDTree(coordenadas)
+        else:
+            self.arbol = shapely.STRtree(shapely.points(coordenadas))
+
+    def cercana(self, lats, lons) -> np.ndarray:
+        """Índice de la muestra más cercana a cada punto"""
+        coordenadas = np.column_stack([lons * self.escala_lon, lats])
+        if KDTREE_DISPONIBLE:
+            return self.arbol.query(coordenadas)[1].astype(np.intp)
+        indices = self.arbol.query_nearest(shapely.points(coordenadas), all_matches=False)
+        cercanas = np.empty(len(coordenadas), dtype=np.intp)
+        cercanas[indices[0]] = indices[1]
+        return cercanas
+
+    def en_rectangulo(self, sur: float, oeste: float, norte: float, este: float) -> np.ndarray:
+        """Índices (ordenados) de las muestras dentro del rectángulo"""
+        if KDTREE_DISPONIBLE:
+            # Bola que circunscribe el rectángulo, luego filtro exacto
+            centro = [(oeste + este) / 2 * self.escala_lon, (sur + norte) / 2]
+            radio = np.hypot((este - oeste) / 2 * self.escala_lon, (norte - sur) / 2)
+            candidatos = np.asarray(self.arbol.query_ball_point(centro, radio), dtype=np.intp)
+        else:
+            rectangulo = shapely.box(oeste * self.escala_lon, sur, este * self.escala_lon, norte)
+            candidatos = self.arbol.query(rectangulo).astype(np.intp)
+        dentro = ((self.lats[candidatos] >= sur) & (self.lats[candidatos] <= norte) &
+                  (self.lons[candidatos] >= oeste) & (self.lons[candidatos] <= este))
+        return np.sort(candidatos[dentro])
+
+
+def distancia_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Distancia de gran círculo (haversine) en metros"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class IndiceConsulta:
+    """Consulta de valores por coordenada sobre muestras y superficies interpoladas.
+
+    `muestras` es {variable: (lats, lons, valores)} y `superficies` es
+    {variable: malla} tal como la devuelve `SistemaMapas.obtener_superficies`.
+    Las superficies son grillas regulares, así que el valor interpolado de
+    una coordenada es aritmética de índices (sin árbol); las muestras se
+    indexan con un árbol por conjunto de coordenadas (normalmente uno,
+    compartido por las cuatro variables). Todo se construye una vez y las
+    consultas son vectorizadas.
+    """
+
+    def __init__(self, muestras: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]], superficies: Dict[str, Dict]):
+        self.variables = list(muestras)
+        self.muestras = {}
+        arboles = {}
+        for variable, (lats, lons, valores) in muestras.items():
+            lats = np.asarray(lats, dtype=float)
+            lons = np.asarray(lons, dtype=float)
+            clave = (lats.tobytes(), lons.tobytes())
+            if clave not in arboles:
+                arboles[clave] = _ArbolMuestras(lats, lons)
+            self.muestras[variable] = (arboles[clave], np.asarray(valores, dtype=float))
+
+        self.grillas = {}
+        for variable, superficie in superficies.items():
+            if superficie is None:
+                continue
+            (sur, oeste), (norte, este) = limites_superficie(superficie)
+            self.grillas[variable] = {
+                'grilla': grilla_superficie(superficie),
+                'sur': sur, 'oeste': oeste,
+                'dy': (norte - sur) / len(superficie['ys']),
+                'dx': (este - oeste) / len(superficie['xs'])
+            }
+
+    @property
+    def nbytes(self) -> int:
+        return sum(datos['grilla'].nbytes for datos in self.grillas.values())
+
+    def _celdas(self, variable: str, lats: np.ndarray, lons: np.ndarray):
+        datos = self.grillas[variable]
+        grilla = datos['grilla']
+        filas = np.floor((lats - datos['sur']) / datos['dy']).astype(np.intp)
+        columnas = np.floor((lons - datos['oeste']) / datos['dx']).astype(np.intp)
+        validas = (filas >= 0) & (filas < grilla.shape[0]) & (columnas >= 0) & (columnas < grilla.shape[1])
+        return filas, columnas, validas
+
+    def consultar(self, lat, lon) -> Dict:
+        """Valores en uno o varios puntos (escalares o arrays de igual forma).
+
+        Devuelve {'lat', 'lon', 'interpolado': {variable: valor},
+        'muestra': {variable: {'valor', 'indice', 'lat', 'lon', 'distancia_m'}}}.
+        El valor interpolado es NaN fuera del polígono.
+        """
+        lats, lons = np.broadcast_arrays(np.asarray(lat, dtype=float), np.asarray(lon, dtype=float))
+        forma = lats.shape
+        lats, lons = lats.ravel(), lons.ravel()
+
+        interpolado = {}
+        for variable in self.grillas:
+            filas, columnas, validas = self._celdas(variable, lats, lons)
+            valores = np.full(len(lats), np.nan)
+            valores[validas] = self.grillas[variable]['grilla'][filas[validas], columnas[validas]]
+            interpolado[variable] = valores.reshape(forma)
+
+        muestra = {}
+        cercanas_por_arbol = {}
+        for variable, (arbol, valores) in self.muestras.items():
+            if len(valores) == 0:
+                continue
+            if id(arbol) not in cercanas_por_arbol:
+                cercanas_por_arbol[id(arbol)] = arbol.cercana(lats, lons)
+            cercanas = cercanas_por_arbol[id(arbol)]
+            muestra[variable] = {
+                'valor': valores[cercanas].reshape(forma),
+                'indice': cercanas.reshape(forma),
+                'lat': arbol.lats[cercanas].reshape(forma),
+                'lon': arbol.lons[cercanas].reshape(forma),
+                'distancia_m': distancia_m(lats, lons, arbol.lats[cercanas], arbol.lons[cercanas]).reshape(forma)
+            }
+        return {'lat': lats.reshape(forma), 'lon': lons.reshape(forma), 'interpolado': interpolado, 'muestra': muestra}
+
+    def consultar_rectangulo(self, sur: float, oeste: float, norte: float, este: float) -> Dict:
+        """Muestras y resumen de la superficie dentro del rectángulo.
+
+        Devuelve {'muestras': {variable: {'indices', 'lats', 'lons', 'valores'}},
+        'superficie': {variable: {'media', 'minimo', 'maximo', 'celdas'}}}.
+        """
+        sur, norte = min(sur, norte), max(sur, norte)
+        oeste, este = min(oeste, este), max(oeste, este)
+
+        muestras = {}
+        for variable, (arbol, valores) in self.muestras.items():
+            indices = arbol.en_rectangulo(sur, oeste, norte, este)
+            muestras[variable] = {'indices': indices, 'lats': arbol.lats[indices],
+                                  'lons': arbol.lons[indices], 'valores': valores[indices]}
+
+        superficie = {}
+        for variable, datos in self.grillas.items():
+            grilla = datos['grilla']
+            # Celdas cuyo centro cae en el rectángulo
+            f0 = max(int(np.ceil((sur - datos['sur']) / datos['dy'] - 0.5)), 0)
+            f1 = min(int(np.floor((norte - datos['sur']) / datos['dy'] - 0.5)), grilla.shape[0] - 1)
+            c0 = max(int(np.ceil((oeste - datos['oeste']) / datos['dx'] - 0.5)), 0)
+            c1 = min(int(np.floor((este - datos['oeste']) / datos['dx'] - 0.5)), grilla.shape[1] - 1)
+            bloque = grilla[f0:f1 + 1, c0:c1 + 1] if f1 >= f0 and c1 >= c0 else grilla[:0, :0]
+            bloque = bloque[~np.isnan(bloque)]
+            superficie[variable] = {
+                'media': float(bloque.mean()) if bloque.size else float('nan'),
+                'minimo': float(bloque.min()) if bloque.size else float('nan'),
+                'maximo': float(bloque.max()) if bloque.size else float('nan'),
+                'celdas': int(bloque.size)
+            }
+        return {'muestras': muestras, 'superficie': superficie}
@@ -0,0 +1,78 @@
+# modules/estadistica.py
+import math
+import numpy as np
+from statistics import NormalDist
+from typing import Dict, Sequence
+
+
+class EstadisticaAcumulada:
+    """Media y varianza que se actualizan por lotes sin guardar los valores.
+
+    Combina cada lote con lo acumulado mediante la fórmula de Chan et al.
+    (generalización de Welford), numéricamente estable para muchos lotes.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+
+    def agregar(self, valores) -> None:
+        valores = np.asarray(valores, dtype=float)
+        n_lote = valores.size
+        if n_lote == 0:
+            return
+        media_lote = float(valores.mean())
+        m2_lote = float(((valores - media_lote) ** 2).sum())
+        n_total = self.n + n_lote
+        delta = media_lote - self.media
+        self.media += delta * n_lote / n_total
+        self.m2 += m2_lote + delta ** 2 * self.n * n_lote / n_total
+        self.n = n_total
+
+    @property
+    def varianza(self) -> float:
+        """Varianza muestral (n - 1)"""
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def desvio(self) -> float:
+        return math.sqrt(self.varianza)
+
+
+def valor_z(nivel_confianza: float) -> float:
+    """Cuantil normal bilateral para el nivel de confianza (p. ej. 0.95 → 1.96)"""
+    return NormalDist().inv_cdf(0.5 + nivel_confianza / 2.0)
+
+
+def intervalo_estratificado(pesos: Sequence[float], estadisticas: Sequence[EstadisticaAcumulada],
+                            nivel_confianza: float = 0.95, reescalar: bool = False) -> Dict[str, float]:
+    """Intervalo de confianza de Σ peso_z · media_z con estratos independientes.
+
+    Con pesos = superficie de cada zona (ha) estima un total; con pesos que
+    suman 1, una media ponderada. La varianza es Σ peso_z² · s_z² / n_z.
+    Los estratos sin puntos no aportan, salvo que `reescalar` sea True: en
+    ese caso los pesos de los estratos con puntos se amplían para cubrir el
+    peso total (estimación provisional con estratos aún sin muestrear).
+    """
+    factor = 1.0
+    if reescalar:
+        peso_muestreado = sum(float(peso) for peso, est in zip(pesos, estadisticas) if est.n > 0)
+        if peso_muestreado > 0:
+            factor = sum(float(peso) for peso in pesos) / peso_muestreado
+    estimacion = 0.0
+    varianza = 0.0
+    for peso, est in zip(pesos, estadisticas):
+        if est.n == 0:
+            continue
+        estimacion += float(peso) * factor * est.media
+        varianza += (float(peso) * factor) ** 2 * est.varianza / est.n
+    semiamplitud = valor_z(nivel_confianza) * math.sqrt(varianza)
+    return {
+        'estimacion': estimacion,
+        'inferior': estimacion - semiamplitud,
+        'superior': estimacion + semiamplitud,
+        'semiamplitud': semiamplitud,
+        'semiamplitud_pct': semiamplitud / abs(estimacion) * 100 if estimacion else float('inf'),
+        'nivel_confianza': nivel_confianza
+    }
@@ -0,0 +1,204 @@
+# modules/exportacion_graficos.py
+import atexit
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import plotly.io as pio
+
+from modules.cache_superficies import CacheLRU
+
+try:
+    import kaleido
+    KALEIDO_DISPONIBLE = True
+except ImportError:
+    kaleido = None
+    KALEIDO_DISPONIBLE = False
+
+# Kaleido >= 1.0 renderiza con un Chrome propio; `start_sync_server` lo deja
+# abierto y `to_image` lo reutiliza en lugar de lanzar uno por exportación.
+# Kaleido 0.x ya mantiene su subproceso vivo dentro de plotly.
+SERVIDOR_PERSISTENTE = KALEIDO_DISPONIBLE and hasattr(kaleido, 'start_sync_server')
+
+# Plotly >= 6.1 con Kaleido >= 1.0: `pio.write_images` entrega todas las figuras
+# al renderizador en una sola llamada en lugar de una por figura
+LOTE_DISPONIBLE = SERVIDOR_PERSISTENTE and hasattr(pio, 'write_images')
+
+
+def huella_figura(fig, ancho: int, alto: int, escala: float) -> str:
+    """Huella del JSON de la figura y del tamaño de salida"""
+    h = hashlib.blake2b(fig.to_json().encode('utf-8'), digest_size=16)
+    h.update(f"|{ancho}|{alto}|{escala}".encode('ascii'))
+    return h.hexdigest()
+
+
+class ExportadorGraficos:
+    """Exportación de figuras Plotly a PNG con un renderizador Kaleido caliente.
+
+    El renderizador se inicia una sola vez (al precalentar o en el primer
+    lote) y queda abierto para las siguientes exportaciones del proceso. Las
+    figuras de un lote se rasterizan con `pio.write_images` si está
+    disponible, o una a una con `to_image`. Los PNG se cachean por huella de
+    la figura, así que el mismo gráfico en el PDF, el DOCX y el informe con IA
+    se rasteriza una sola vez. `metricas` acumula tiempos de arranque, lotes y
+    figuras.
+
+    `_bloqueo` protege solo el estado compartido de Kaleido (arranque,
+    parada y rasterizado); huellas, caché y métricas no lo toman, y los
+    errores se devuelven por lote en lugar de guardarse en el exportador.
+    """
+
+    def __init__(self, max_bytes_cache: int = 64 * 1024 * 1024):
+        self.cache = CacheLRU(max_entradas=64, max_bytes=max_bytes_cache)
+        self._bloqueo = threading.Lock()
+        self._iniciado = False
+        self._precalentado = False
+        self._bloqueo_precalentar = threading.Lock()
+        self._bloqueo_metricas = threading.Lock()
+        self.metricas = {
+            'segundos_arranque': 0.0,
+            'lotes': 0,
+            'figuras_renderizadas': 0,
+            'figuras_cacheadas': 0,
+            'errores': 0,
+            'segundos_ultimo_lote': 0.0,
+            'segundos_por_figura': 0.0,
+            'segundos_renderizado': 0.0
+        }
+
+    def _iniciar(self) -> None:
+        """Arranca el renderizador persistente (llamar con el bloqueo tomado)"""
+        if self._iniciado:
+            return
+        self._iniciado = True
+        if not SERVIDOR_PERSISTENTE:
+            return
+        inicio = time.perf_counter()
+        try:
+            kaleido.start_sync_server(silence_warnings=True)
+            atexit.register(self.detener)
+        except Exception:
+            # Sin servidor persistente cada exportación abre su propio renderizador
+            pass
+        self.metricas['segundos_arranque'] = time.perf_counter() - inicio
+
+    def precalentar(self) -> None:
+        """Inicia el renderizador en segundo plano para que el primer lote no espere.
+
+        Solo la primera llamada del proceso lanza el hilo; las siguientes (cada
+        re-ejecución de la pestaña) no hacen nada.
+        """
+        with self._bloqueo_precalentar:
+            if self._precalentado or not SERVIDOR_PERSISTENTE:
+                return
+            self._precalentado = True
+
+        def iniciar():
+            with self._bloqueo:
+                self._iniciar()
+
+        threading.Thread(target=iniciar, name='precalentar-kaleido', daemon=True).start()
+
+    def detener(self) -> None:
+        with self._bloqueo:
+            if self._iniciado and SERVIDOR_PERSISTENTE:
+                try:
+                    kaleido.stop_sync_server(silence_warnings=True)
+                except Exception:
+                    pass
+            self._iniciado = False
+
+    def _rasterizar(self, figuras: Dict[str, Tuple], escala: float) -> Tuple[Dict[str, bytes], Dict[str, str]]:
+        """({nombre: PNG}, {nombre: error}) de {nombre: (fig, ancho, alto)}, sin caché"""
+        with self._bloqueo:
+            self._iniciar()
+            if LOTE_DISPONIBLE and len(figuras) > 1:
+                try:
+                    with tempfile.TemporaryDirectory(prefix='graficos_') as directorio:
+                        nombres = list(figuras)
+                        rutas = [os.path.join(directorio, f"{i}.png") for i in range(len(nombres))]
+                        pio.write_images([figuras[n][0] for n in nombres], rutas, format='png', scale=escala,
+                                         width=[figuras[n][1] for n in nombres],
+                                         height=[figuras[n][2] for n in nombres])
+                        pngs = {}
+                        for nombre, ruta in zip(nombres, rutas):
+                            with open(ruta, 'rb') as f:
+                                pngs[nombre] = f.read()
+                        return pngs, {}
+                except Exception:
+                    # Se reintenta figura por figura para aislar la que falla
+                    pass
+
+            pngs, errores = {}, {}
+            for nombre, (fig, ancho, alto) in figuras.items():
+                try:
+                    pngs[nombre] = fig.to_image(format='png', width=ancho, height=alto, scale=escala)
+                except Exception as e:
+                    errores[nombre] = str(e)
+            return pngs, errores
+
+    def exportar_lote(self, figuras: Dict[str, Tuple],
+                      escala: float = 2) -> Tuple[Dict[str, Optional[bytes]], Dict[str, str]]:
+        """PNG de varias figuras en una llamada.
+
+        `figuras` es {nombre: (fig, ancho, alto)}; devuelve ({nombre: bytes},
+        {nombre: mensaje}), con None en el primero para las figuras vacías o
+        que no se pudieron convertir y el error de cada una de estas últimas
+        en el segundo (solo las de este lote).
+        """
+        inicio = time.perf_counter()
+        pngs = {}
+        pendientes = {}
+        claves = {}
+        for nombre, (fig, ancho, alto) in figuras.items():
+            if fig is None:
+                pngs[nombre] = None
+                continue
+            claves[nombre] = huella_figura(fig, ancho, alto, escala)
+            png = self.cache.obtener(claves[nombre])
+            if png is not None:
+                pngs[nombre] = png
+            else:
+                pendientes[nombre] = (fig, ancho, alto)
+
+        errores = {}
+        segundos_render = 0.0
+        if pendientes:
+            inicio_render = time.perf_counter()
+            renderizados, errores = self._rasterizar(pendientes, escala)
+            segundos_render = time.perf_counter() - inicio_render
+            for nombre, png in renderizados.items():
+                pngs[nombre] = png
+                self.cache.guardar(claves[nombre], png, len(png))
+
+        with self._bloqueo_metricas:
+            self.metricas['lotes'] += 1
+            self.metricas['figuras_cacheadas'] += len(claves) - len(pendientes)
+            self.metricas['figuras_renderizadas'] += len(pendientes) - len(errores)
+            self.metricas['errores'] += len(errores)
+            self.metricas['segundos_renderizado'] += segundos_render
+            self.metricas['segundos_ultimo_lote'] = time.perf_counter() - inicio
+            if self.metricas['figuras_renderizadas']:
+                self.metricas['segundos_por_figura'] = (self.metricas['segundos_renderizado'] /
+                                                        self.metricas['figuras_renderizadas'])
+        return {nombre: pngs.get(nombre) for nombre in figuras}, errores
+
+    def exportar(self, fig, ancho: int = 800, alto: int = 500, escala: float = 2) -> Optional[bytes]:
+        pngs, _ = self.exportar_lote({'figura': (fig, ancho, alto)}, escala)
+        return pngs['figura']
+
+
+_exportador: Optional[ExportadorGraficos] = None
+_bloqueo_exportador = threading.Lock()
+
+
+def exportador_graficos() -> ExportadorGraficos:
+    """Exportador del proceso, compartido entre sesiones y re-ejecuciones"""
+    global _exportador
+    with _bloqueo_exportador:
+        if _exportador is None:
+            _exportador = ExportadorGraficos()
+        return _exportador
@@ -0,0 +1,74 @@
+# modules/geometria_web.py
+import math
+import numpy as np
+import shapely
+from typing import Dict, Sequence
+
+from modules.cache_superficies import CacheLRU, huella_geometria
+
+TAMANO_TESELA = 256
+
+# Niveles de zoom por encima del encuadre inicial que se dibujan sin error visible
+ZOOM_DETALLE_EXTRA = 3
+ZOOM_MAXIMO = 20
+
+# GeoJSON ya simplificado y cuantizado por (huella del polígono, zoom de detalle)
+_CACHE_GEOMETRIAS = CacheLRU(max_entradas=64, max_bytes=64 * 1024 * 1024)
+
+
+def zoom_ajuste(limites: Sequence[float], ancho_px: int = 800, alto_px: int = 600) -> int:
+    """Zoom al que `fit_bounds` encuadra los límites (minx, miny, maxx, maxy) en el mapa"""
+    minx, miny, maxx, maxy = limites
+
+    def y_mercator(lat):
+        lat = max(min(lat, 85.0511), -85.0511)
+        return math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+
+    fraccion_x = max((maxx - minx) / 360.0, 1e-12)
+    fraccion_y = max((y_mercator(maxy) - y_mercator(miny)) / (2 * math.pi), 1e-12)
+    zoom_x = math.log2(ancho_px / TAMANO_TESELA / fraccion_x)
+    zoom_y = math.log2(alto_px / TAMANO_TESELA / fraccion_y)
+    return int(np.clip(math.floor(min(zoom_x, zoom_y)), 0, ZOOM_MAXIMO))
+
+
+def tolerancia_zoom(zoom: int, lat: float = 0.0) -> float:
+    """Medio píxel en grados al zoom dado (Web Mercator, a la latitud del polígono)"""
+    grados_pixel = 360.0 / (TAMANO_TESELA * 2 ** zoom)
+    return 0.5 * grados_pixel * max(math.cos(math.radians(lat)), 0.01)
+
+
+def geometria_zoom(geometria, zoom: int) -> Dict:
+    """GeoJSON (dict) de la geometría con detalle justo para verse bien hasta `zoom`.
+
+    Se simplifica con Douglas-Peucker preservando la topología (sin anillos
+    que se crucen ni huecos que escapen) a medio píxel de ese zoom, y las
+    coordenadas se cuantizan a una grilla diez veces más fina con los
+    decimales mínimos, lo que reduce el JSON incrustado en el HTML. El
+    resultado se cachea por huella del polígono y zoom.
+    """
+    zoom = int(np.clip(zoom, 0, ZOOM_MAXIMO))
+    clave = (huella_geometria(geometria), zoom)
+    geojson = _CACHE_GEOMETRIAS.obtener(clave)
+    if geojson is not None:
+        return geojson
+
+    minx, miny, maxx, maxy = geometria.bounds
+    tolerancia = tolerancia_zoom(zoom, (miny + maxy) / 2)
+    simplificada = shapely.simplify(geometria, tolerancia, preserve_topology=True)
+    decimales = int(np.clip(math.ceil(-math.log10(tolerancia / 10)), 0, 9))
+    # La grilla de precisión garantiza una geometría válida; el redondeo solo
+    # normaliza la representación de los flotantes (mismos puntos de la grilla)
+    cuantizada = shapely.set_precision(simplificada, 10.0 ** -decimales)
+    cuantizada = shapely.transform(cuantizada, lambda coords: np.round(coords, decimales))
+    if cuantizada.is_empty:
+        cuantizada = simplificada
+
+    geojson = shapely.geometry.mapping(cuantizada)
+    _CACHE_GEOMETRIAS.guardar(clave, geojson, 48 * int(shapely.get_num_coordinates(cuantizada)))
+    return geojson
+
+
+def geometria_mapa(geometria, ancho_px: int = 800, alto_px: int = 600) -> Dict:
+    """GeoJSON de la geometría para un mapa que la encuadra con `fit_bounds`"""
+    zoom = zoom_ajuste(geometria.bounds, ancho_px, alto_px) + ZOOM_DETALLE_EXTRA
+    return geometria_zoom(geometria, zoom)
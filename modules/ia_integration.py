@@ -43,6 +43,13 @@ def llamar_gemini(prompt: str, system_prompt: str = None, temperature: float = 0
 
 def preparar_resumen(resultados: Dict) -> tuple:
     """Prepara un DataFrame resumen y estadísticas a partir de los resultados del análisis."""
+    # Resultados columnares: el DataFrame se arma directamente de las columnas
+    muestras = resultados.get('muestras')
+    if muestras is not None:
+        df = muestras.a_dataframe(['carbono_ton_ha', 'indice_shannon', 'ndvi', 'ndwi', 'precipitacion'])
+        df['tipo_vegetacion'] = resultados.get('tipo_ecosistema', 'N/A')
+        return df, _estadisticas_resumen(resultados)
+    
     # Extraer puntos de muestreo
     puntos_carbono = resultados.get('puntos_carbono', [])
     puntos_biodiversidad = resultados.get('puntos_biodiversidad', [])
@@ -61,8 +68,10 @@ def preparar_resumen(resultados: Dict) -> tuple:
             'tipo_vegetacion': resultados.get('tipo_ecosistema', 'N/A')
         })
     df = pd.DataFrame(data)
-    
-    stats = {
+    return df, _estadisticas_resumen(resultados)
+
+def _estadisticas_resumen(resultados: Dict) -> Dict:
+    return {
         'area_total_ha': resultados.get('area_total_ha', 0),
         'carbono_total_ton': resultados.get('carbono_total_ton', 0),
         'co2_total_ton': resultados.get('co2_total_ton', 0),
@@ -74,7 +83,6 @@ def preparar_resumen(resultados: Dict) -> tuple:
         'tipo_ecosistema': resultados.get('tipo_ecosistema', 'N/A'),
         'es_cultivo': resultados.get('es_cultivo', False)
     }
-    return df, stats
 
 def generar_analisis_carbono(df: pd.DataFrame, stats: Dict) -> str:
     system = "Eres un especialista en carbono forestal y metodologías Verra VCS. Proporciona un análisis técnico detallado."
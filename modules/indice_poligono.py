@@ -0,0 +1,129 @@
+# modules/indice_poligono.py
+import math
+import numpy as np
+import shapely
+from scipy import ndimage
+from typing import Optional
+
+from modules.cache_superficies import CacheLRU, huella_geometria
+
+EXTERIOR = 0
+INTERIOR = 1
+BORDE = 2
+
+
+class IndicePoligono:
+    """Índice raster de punto-en-polígono.
+
+    El rectángulo envolvente se divide una sola vez en celdas que se
+    clasifican como interiores, exteriores o de borde. Las celdas de borde
+    son las que toca el contorno (muestreado cada media celda) más un anillo
+    de celdas vecinas, así que una celda interior o exterior nunca corta el
+    contorno: su respuesta es una búsqueda en el array. Solo los puntos que
+    caen en celdas de borde se resuelven con `shapely.contains_xy`, de modo
+    que el resultado es idéntico al de la prueba exacta.
+
+    La resolución se adapta al número de vértices: más vértices, más celdas
+    (y celdas de borde más finas).
+    """
+
+    def __init__(self, poligono, celdas: Optional[int] = None):
+        self.poligono = poligono
+        shapely.prepare(self.poligono)
+        self.minx, self.miny, self.maxx, self.maxy = poligono.bounds
+        ancho = max(self.maxx - self.minx, 1e-12)
+        alto = max(self.maxy - self.miny, 1e-12)
+        if celdas is None:
+            vertices = int(shapely.get_num_coordinates(poligono))
+            celdas = int(np.clip(64 * vertices, 16_384, 1_048_576))
+
+        # Celdas aproximadamente cuadradas
+        lado_celda = math.sqrt(ancho * alto / celdas)
+        self.nx = int(np.clip(round(ancho / lado_celda), 1, 4096))
+        self.ny = int(np.clip(round(alto / lado_celda), 1, 4096))
+        self.dx = ancho / self.nx
+        self.dy = alto / self.ny
+        self.estado = self._clasificar()
+
+    def _indices(self, xs: np.ndarray, ys: np.ndarray):
+        columnas = np.floor((xs - self.minx) / self.dx).astype(np.intp)
+        filas = np.floor((ys - self.miny) / self.dy).astype(np.intp)
+        return filas, columnas
+
+    def _clasificar(self) -> np.ndarray:
+        borde = np.zeros((self.ny, self.nx), dtype=bool)
+        paso = 0.5 * min(self.dx, self.dy)
+        for anillo in shapely.get_parts(shapely.boundary(self.poligono)):
+            coords = shapely.get_coordinates(anillo)
+            if len(coords) == 0:
+                continue
+            inicio, fin = coords[:-1], coords[1:]
+            longitudes = np.hypot(*(fin - inicio).T)
+            pasos = np.maximum(np.ceil(longitudes / paso).astype(np.intp), 1)
+            segmento = np.repeat(np.arange(len(inicio)), pasos)
+            t = (np.arange(pasos.sum()) - np.repeat(np.cumsum(pasos) - pasos, pasos)) / np.repeat(pasos, pasos)
+            puntos = inicio[segmento] + t[:, None] * (fin - inicio)[segmento]
+            puntos = np.vstack([puntos, coords[-1:]])
+            filas, columnas = self._indices(puntos[:, 0], puntos[:, 1])
+            borde[np.clip(filas, 0, self.ny - 1), np.clip(columnas, 0, self.nx - 1)] = True
+        # Margen de una celda: el contorno entre dos muestras nunca escapa del borde marcado
+        borde = ndimage.binary_dilation(borde, structure=np.ones((3, 3), dtype=bool))
+
+        # Cada región conexa sin borde está entera dentro o entera fuera:
+        # basta probar un centro de celda por región
+        estado = np.full((self.ny, self.nx), BORDE, dtype=np.uint8)
+        regiones, n_regiones = ndimage.label(~borde)
+        if n_regiones > 0:
+            planos = np.flatnonzero(regiones.ravel())
+            etiquetas = regiones.ravel()[planos]
+            _, primeros = np.unique(etiquetas, return_index=True)
+            filas, columnas = np.divmod(planos[primeros], self.nx)
+            dentro = shapely.contains_xy(self.poligono, self.minx + (columnas + 0.5) * self.dx,
+                                         self.miny + (filas + 0.5) * self.dy)
+            por_region = np.concatenate([[BORDE], np.where(dentro, INTERIOR, EXTERIOR)]).astype(np.uint8)
+            estado = por_region[regiones]
+        return estado
+
+    @property
+    def fraccion_borde(self) -> float:
+        return float((self.estado == BORDE).mean())
+
+    def contiene(self, xs, ys) -> np.ndarray:
+        """Equivalente a `shapely.contains_xy(poligono, xs, ys)` (x = lon, y = lat)"""
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        forma = np.broadcast(xs, ys).shape
+        xs = np.broadcast_to(xs, forma).ravel()
+        ys = np.broadcast_to(ys, forma).ravel()
+
+        resultado = np.zeros(xs.size, dtype=bool)
+        filas, columnas = self._indices(xs, ys)
+        en_rectangulo = (xs >= self.minx) & (xs <= self.maxx) & (ys >= self.miny) & (ys <= self.maxy)
+        # Sobre el lado superior/derecho del rectángulo no hay celda: prueba exacta
+        estado = np.where(en_rectangulo, BORDE, EXTERIOR).astype(np.uint8)
+        en_celda = en_rectangulo & (filas < self.ny) & (columnas < self.nx)
+        estado[en_celda] = self.estado[filas[en_celda], columnas[en_celda]]
+
+        resultado[estado == INTERIOR] = True
+        exactos = np.flatnonzero(estado == BORDE)
+        if len(exactos):
+            resultado[exactos] = shapely.contains_xy(self.poligono, xs[exactos], ys[exactos])
+        return resultado.reshape(forma)
+
+
+_CACHE_INDICES = CacheLRU(max_entradas=16, max_bytes=64 * 1024 * 1024)
+
+
+def indice_poligono(poligono) -> IndicePoligono:
+    """Índice del polígono, reutilizado mientras la geometría no cambie (por huella)"""
+    clave = huella_geometria(poligono)
+    indice = _CACHE_INDICES.obtener(clave)
+    if indice is None:
+        indice = IndicePoligono(poligono)
+        _CACHE_INDICES.guardar(clave, indice, indice.estado.nbytes)
+    return indice
+
+
+def contiene_xy(poligono, xs, ys) -> np.ndarray:
+    """`shapely.contains_xy` acelerado con el índice raster cacheado del polígono"""
+    return indice_poligono(poligono).contiene(xs, ys)
@@ -0,0 +1,94 @@
+# modules/interpolacion.py
+import numpy as np
+from typing import Optional
+
+try:
+    from scipy import sparse
+    from scipy.spatial import cKDTree
+    KDTREE_DISPONIBLE = True
+except ImportError:
+    KDTREE_DISPONIBLE = False
+
+
+class InterpoladorKNN:
+    """Interpolación KNN ponderada por distancia con un solo KD-tree.
+
+    El árbol se construye una vez sobre las coordenadas de las muestras y los
+    vecinos y pesos de cada celda se calculan una sola vez por malla, como
+    una matriz dispersa (celdas × muestras). Interpolar varias variables que
+    comparten coordenadas es entonces un único producto matricial. Los pesos
+    son 1/d normalizados (igual que `weights='distance'` de sklearn): si una
+    celda coincide con muestras, solo esas muestras cuentan.
+    """
+
+    def __init__(self, lats, lons, k: int = 8):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.n = len(self.lats)
+        self.k = max(1, min(int(k), self.n))
+        self.arbol = cKDTree(np.column_stack([self.lats, self.lons]))
+
+    def matriz_pesos(self, lats, lons):
+        """Matriz dispersa de pesos (una fila por punto consultado, suma 1)"""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        m = len(lats)
+        distancias, indices = self.arbol.query(np.column_stack([lats, lons]), k=self.k)
+        distancias = distancias.reshape(m, self.k)
+        indices = indices.reshape(m, self.k)
+
+        exactos = distancias == 0
+        con_exacto = exactos.any(axis=1)
+        with np.errstate(divide='ignore'):
+            pesos = 1.0 / distancias
+        pesos[con_exacto] = exactos[con_exacto].astype(float)
+        pesos /= pesos.sum(axis=1, keepdims=True)
+
+        filas = np.repeat(np.arange(m), self.k)
+        return sparse.csr_matrix((pesos.ravel(), (filas, indices.ravel())), shape=(m, self.n))
+
+    def interpolar(self, pesos, valores) -> np.ndarray:
+        """Aplica la matriz de pesos a un vector (n) o a varias variables (n × v)"""
+        return pesos @ np.asarray(valores, dtype=float)
+
+
+def interpolar_idw(lats_muestra, lons_muestra, valores, lats, lons, potencia: float = 2.0,
+                   k: Optional[int] = None, max_elementos: int = 2_000_000) -> np.ndarray:
+    """Ponderación por distancia inversa (IDW) vectorizada, sin KD-tree.
+
+    Cada punto consultado recibe Σ w·v / Σ w con w = 1/d^potencia sobre todas
+    las muestras, o solo sobre las `k` más cercanas si se indica. Una muestra
+    en la misma posición pesa 1 (como la interpolación simple original). La
+    malla se procesa por bloques de a lo sumo `max_elementos` pares
+    punto-muestra para acotar la memoria. `valores` puede ser un vector (n)
+    o una matriz (n × v) con varias variables.
+    """
+    lats_muestra = np.asarray(lats_muestra, dtype=float)
+    lons_muestra = np.asarray(lons_muestra, dtype=float)
+    valores = np.asarray(valores, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    n = len(lats_muestra)
+    m = len(lats)
+    matriz = valores.reshape(n, -1)
+    k = n if k is None else max(1, min(int(k), n))
+    bloque = max(1, max_elementos // max(n, 1))
+
+    resultado = np.empty((m, matriz.shape[1]))
+    for inicio in range(0, m, bloque):
+        fin = min(inicio + bloque, m)
+        # Distancias euclidianas del bloque a todas las muestras (bloque × n)
+        dist = np.hypot(lats[inicio:fin, None] - lats_muestra[None, :],
+                        lons[inicio:fin, None] - lons_muestra[None, :])
+        if k < n:
+            indices = np.argpartition(dist, k - 1, axis=1)[:, :k]
+            dist = np.take_along_axis(dist, indices, axis=1)
+        with np.errstate(divide='ignore'):
+            pesos = np.where(dist > 0, 1.0 / dist ** potencia, 1.0)
+        if k < n:
+            suma = np.einsum('ij,ijv->iv', pesos, matriz[indices])
+        else:
+            suma = pesos @ matriz
+        resultado[inicio:fin] = suma / pesos.sum(axis=1, keepdims=True)
+
+    return resultado.reshape((m,) + valores.shape[1:])
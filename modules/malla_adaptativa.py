@@ -0,0 +1,131 @@
+# modules/malla_adaptativa.py
+import numpy as np
+import shapely
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from modules.indice_poligono import indice_poligono
+
+
+def malla_quadtree(poligono, evaluar: Callable[[np.ndarray, np.ndarray], np.ndarray], escalas: Sequence[float],
+                   nivel_min: int = 4, nivel_max: int = 8, umbral: float = 0.1,
+                   puntos_refinar: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Dict:
+    """Malla adaptativa (quadtree) sobre el rectángulo envolvente del polígono.
+
+    Parte de 2^nivel_min × 2^nivel_min celdas y subdivide solo las que cortan
+    el contorno del polígono o en las que los valores de sus cuatro vértices
+    difieren más de `umbral` (relativo a `escalas`, una por variable) en
+    alguna variable (también su centro, para no perder picos interiores).
+    Las celdas enteramente fuera del polígono se descartan. Las celdas que
+    contienen alguno de `puntos_refinar` (lats, lons; p. ej. las muestras,
+    donde la ponderación por distancia concentra los picos) se refinan
+    siempre hasta el nivel más fino.
+
+    `evaluar(lats, lons)` devuelve la matriz (puntos × variables) de valores
+    interpolados; solo se llama sobre los vértices de las celdas visitadas,
+    y cada vértice se evalúa una sola vez. El resultado se expande a la
+    grilla regular más fina (2^nivel_max por lado) con interpolación bilineal
+    dentro de cada hoja, de modo que sirve igual que una malla uniforme:
+
+        {'xs', 'ys', 'mascara', 'lats', 'lons', 'valores' (celdas × variables),
+         'vertices_evaluados', 'hojas'}
+    """
+    minx, miny, maxx, maxy = poligono.bounds
+    n = 2 ** nivel_max
+    ancho = (maxx - minx) / n
+    alto = (maxy - miny) / n
+    escalas = np.where(np.asarray(escalas, dtype=float) > 0, np.asarray(escalas, dtype=float), 1.0)
+    indice = indice_poligono(poligono)
+    contorno = shapely.boundary(poligono)
+    shapely.prepare(contorno)
+
+    valores_vertices = None
+    evaluado = np.zeros((n + 1, n + 1), dtype=bool)
+
+    def valores_en(vi, vj):
+        """Valores en los vértices (vi = columna, vj = fila de la retícula fina)"""
+        nonlocal valores_vertices
+        faltan = ~evaluado[vj, vi]
+        if faltan.any():
+            claves = np.unique(vj[faltan] * (n + 1) + vi[faltan])
+            fj, fi = np.divmod(claves, n + 1)
+            nuevos = np.asarray(evaluar(miny + fj * alto, minx + fi * ancho), dtype=float).reshape(len(claves), -1)
+            if valores_vertices is None:
+                valores_vertices = np.full((n + 1, n + 1, nuevos.shape[1]), np.nan)
+            valores_vertices[fj, fi] = nuevos
+            evaluado[fj, fi] = True
+        return valores_vertices[vj, vi]
+
+    # Celda fina de cada punto a refinar
+    if puntos_refinar is not None:
+        fi = np.floor((np.asarray(puntos_refinar[1]) - minx) / ancho).astype(np.intp)
+        fj = np.floor((np.asarray(puntos_refinar[0]) - miny) / alto).astype(np.intp)
+        validos = (fi >= 0) & (fi < n) & (fj >= 0) & (fj < n)
+        fi, fj = fi[validos], fj[validos]
+
+    hojas = []  # (tamaño en celdas finas, columnas, filas, corta_contorno)
+    cx, cy = np.meshgrid(np.arange(2 ** nivel_min), np.arange(2 ** nivel_min))
+    cx, cy = cx.ravel(), cy.ravel()
+    for nivel in range(nivel_min, nivel_max + 1):
+        if len(cx) == 0:
+            break
+        s = 2 ** (nivel_max - nivel)
+        x0, y0 = cx * s, cy * s
+        corta = shapely.intersects(contorno, shapely.box(minx + x0 * ancho, miny + y0 * alto,
+                                                         minx + (x0 + s) * ancho, miny + (y0 + s) * alto))
+        # Celdas que no cortan el contorno: enteras dentro o fuera (basta su centro)
+        dentro = corta | indice.contiene(minx + (x0 + s / 2) * ancho, miny + (y0 + s / 2) * alto)
+        cx, cy, x0, y0, corta = cx[dentro], cy[dentro], x0[dentro], y0[dentro], corta[dentro]
+
+        # Vértices y centro de todas las celdas del nivel, evaluados en una sola llamada
+        # (el centro es un vértice de las hijas: no se desperdicia si la celda se divide)
+        m = s // 2 if s > 1 else 0
+        puntos = valores_en(np.concatenate([x0, x0 + s, x0, x0 + s, x0 + m]),
+                            np.concatenate([y0, y0, y0 + s, y0 + s, y0 + m])).reshape(5, len(x0), -1)
+        variacion = (puntos.max(axis=0) - puntos.min(axis=0)) / escalas
+        if nivel < nivel_max:
+            dividir = corta | (variacion > umbral).any(axis=1)
+            if puntos_refinar is not None and len(fi):
+                dividir |= np.isin(cy * n + cx, np.unique((fj // s) * n + fi // s))
+        else:
+            dividir = np.zeros(len(cx), dtype=bool)
+
+        hojas.append((s, x0[~dividir], y0[~dividir], corta[~dividir]))
+        cx = np.concatenate([2 * cx[dividir] + di for dj in (0, 1) for di in (0, 1)])
+        cy = np.concatenate([2 * cy[dividir] + dj for dj in (0, 1) for di in (0, 1)])
+
+    # Expandir las hojas a la grilla fina con interpolación bilineal de sus vértices
+    n_variables = valores_vertices.shape[2] if valores_vertices is not None else 0
+    grilla = np.full((n, n, n_variables), np.nan)
+    mascara = np.zeros((n, n), dtype=bool)
+    for s, x0, y0, corta in hojas:
+        if len(x0) == 0:
+            continue
+        t = (np.arange(s) + 0.5) / s
+        v00, v10 = valores_en(x0, y0), valores_en(x0 + s, y0)
+        v01, v11 = valores_en(x0, y0 + s), valores_en(x0 + s, y0 + s)
+        ty, tx = t[None, :, None, None], t[None, None, :, None]
+        bloque = ((v00[:, None, None] * (1 - tx) + v10[:, None, None] * tx) * (1 - ty) +
+                  (v01[:, None, None] * (1 - tx) + v11[:, None, None] * tx) * ty)
+        filas = y0[:, None, None] + np.arange(s)[None, :, None]
+        columnas = x0[:, None, None] + np.arange(s)[None, None, :]
+        filas, columnas = np.broadcast_arrays(filas, columnas)
+        grilla[filas, columnas] = bloque
+        mascara[filas[~corta], columnas[~corta]] = True
+        if corta.any():
+            # Hojas de contorno (del nivel más fino): prueba exacta en el centro
+            fc, cc = filas[corta].ravel(), columnas[corta].ravel()
+            mascara[fc, cc] = indice.contiene(minx + (cc + 0.5) * ancho, miny + (fc + 0.5) * alto)
+
+    xs = minx + (np.arange(n) + 0.5) * ancho
+    ys = miny + (np.arange(n) + 0.5) * alto
+    filas, columnas = np.nonzero(mascara)
+    return {
+        'xs': xs,
+        'ys': ys,
+        'mascara': mascara,
+        'lats': ys[filas],
+        'lons': xs[columnas],
+        'valores': grilla[mascara],
+        'vertices_evaluados': int(evaluado.sum()),
+        'hojas': int(sum(len(x0) for _, x0, _, _ in hojas))
+    }
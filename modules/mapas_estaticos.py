@@ -0,0 +1,58 @@
+# modules/mapas_estaticos.py
+import io
+import numpy as np
+import shapely
+from typing import List, Sequence, Tuple
+
+import matplotlib.pyplot as plt
+from matplotlib.colors import ListedColormap
+
+from modules.cache_superficies import CacheLRU
+
+# PNG ya renderizados por (huella del polígono, huella de resultados, huella de
+# estilo, variable, dpi)
+CACHE_MAPAS_ESTATICOS = CacheLRU(max_entradas=32, max_bytes=64 * 1024 * 1024)
+
+# Figuras pendientes a partir de las cuales vale la pena repartirlas en procesos
+MIN_MAPAS_PROCESOS = 3
+
+
+def contornos_poligono(geometria) -> List[np.ndarray]:
+    """Coordenadas (n × 2) de cada anillo del polígono, listas para `ax.plot`"""
+    return [shapely.get_coordinates(parte) for parte in shapely.get_parts(shapely.boundary(geometria))]
+
+
+def renderizar_mapa_estatico(grilla: np.ndarray, limites: Sequence[float], tabla: np.ndarray,
+                             vmin: float, vmax: float, titulo: str, contornos: Sequence[np.ndarray],
+                             dpi: int = 150) -> bytes:
+    """PNG del mapa de calor de una grilla regular (filas = latitud, NaN = fuera).
+
+    `limites` es (oeste, este, sur, norte). La grilla se dibuja tal cual con
+    `imshow`, sin re-interpolar, y el contorno del polígono con `ax.plot`.
+    Es una función pura de sus argumentos para poder ejecutarse en procesos.
+    """
+    colormap = ListedColormap(tabla[:, :3] / 255.0)
+    colormap.set_bad(alpha=0.0)
+    fig, ax = plt.subplots(1, 1, figsize=(10, 8))
+    try:
+        im = ax.imshow(np.ma.masked_invalid(grilla), extent=limites, origin='lower',
+                       cmap=colormap, vmin=vmin, vmax=vmax, aspect='auto', interpolation='nearest')
+        plt.colorbar(im, ax=ax, label=titulo)
+        ax.set_title(f'Mapa de {titulo}')
+        ax.set_xlabel('Longitud')
+        ax.set_ylabel('Latitud')
+        ax.grid(True, linestyle='--', alpha=0.5)
+        for anillo in contornos:
+            ax.plot(anillo[:, 0], anillo[:, 1], color='black', linewidth=1.5)
+
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
+        return buf.getvalue()
+    finally:
+        plt.close(fig)
+
+
+def limites_extent(limites_superficie: Sequence[Sequence[float]]) -> Tuple[float, float, float, float]:
+    """[[sur, oeste], [norte, este]] → (oeste, este, sur, norte) para `imshow`"""
+    (sur, oeste), (norte, este) = limites_superficie
+    return oeste, este, sur, norte
@@ -0,0 +1,30 @@
+# modules/mapas_html.py
+import hashlib
+import json
+
+import folium
+
+from modules.cache_superficies import CacheLRU
+
+# HTML final de los mapas folium por (tipo, variable, huella del polígono,
+# huella de resultados, huella de estilo); se incrusta tal cual en las pestañas
+CACHE_MAPAS_HTML = CacheLRU(max_entradas=48, max_bytes=128 * 1024 * 1024)
+
+
+def huella_estilo(*partes) -> str:
+    """Huella de los parámetros que cambian el aspecto de un mapa (dicts incluidos)"""
+    texto = json.dumps(partes, sort_keys=True, default=str)
+    return hashlib.blake2b(texto.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def html_mapa(mapa: folium.Map) -> str:
+    """Documento HTML completo del mapa.
+
+    Se renderiza la figura a la que ya pertenece el mapa: las leyendas se
+    agregan a `mapa.get_root().html` y envolverlo en una figura nueva (como
+    hace `folium_static`) las descartaría.
+    """
+    raiz = mapa.get_root()
+    if not isinstance(raiz, folium.Figure):
+        raiz = folium.Figure().add_child(mapa)
+    return raiz.render()
@@ -0,0 +1,152 @@
+# modules/muestras.py
+import numpy as np
+import pandas as pd
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, Optional
+
+# Campos que exponía cada lista de diccionarios del formato anterior de `resultados`
+CAMPOS_PUNTOS = {
+    'puntos_carbono': ('lat', 'lon', 'carbono_ton_ha', 'biomasa_aerea_ton_ha', 'ndvi',
+                       'precipitacion', 'tipo_vegetacion'),
+    'puntos_biodiversidad': ('indice_shannon', 'varianza_shannon', 'categoria', 'color', 'riqueza_especies',
+                             'abundancia_total', 'especies_muestra', 'es_cultivo',
+                             'lat', 'lon', 'tipo_vegetacion'),
+    'puntos_ndvi': ('lat', 'lon', 'ndvi', 'tipo_vegetacion'),
+    'puntos_ndwi': ('lat', 'lon', 'ndwi', 'tipo_vegetacion'),
+}
+
+# Columna que alimenta cada variable de los mapas
+COLUMNAS_VARIABLE = {
+    'carbono': 'carbono_ton_ha',
+    'ndvi': 'ndvi',
+    'ndwi': 'ndwi',
+    'biodiversidad': 'indice_shannon',
+}
+
+TIPOS_COLUMNA = {
+    'riqueza_especies': np.int32,
+    'abundancia_total': np.int64,
+    'categoria': object,
+    'color': object,
+    'especies_muestra': object,
+}
+
+
+class MuestrasAnalisis:
+    """Puntos de muestreo en formato columnar (un array NumPy por variable).
+
+    Los valores constantes para todo el análisis (tipo de vegetación, si es
+    cultivo) se guardan una sola vez. Las columnas se exponen como arrays de
+    solo lectura, por lo que min/max/mean y las entradas de interpolación no
+    copian datos.
+    """
+
+    def __init__(self, columnas: Dict[str, Iterable], constantes: Optional[Dict[str, Any]] = None):
+        self._columnas = {}
+        for nombre, valores in columnas.items():
+            tipo = TIPOS_COLUMNA.get(nombre, np.float64)
+            if tipo is object and not isinstance(valores, np.ndarray):
+                # Elemento a elemento: evita que listas anidadas se conviertan en una matriz
+                valores = list(valores)
+                arr = np.empty(len(valores), dtype=object)
+                for i, valor in enumerate(valores):
+                    arr[i] = valor
+            else:
+                arr = np.asarray(valores, dtype=tipo)
+            arr.flags.writeable = False
+            self._columnas[nombre] = arr
+        self.constantes = dict(constantes or {})
+        self._n = len(next(iter(self._columnas.values()))) if self._columnas else 0
+
+    def __len__(self):
+        return self._n
+
+    def __contains__(self, nombre):
+        return nombre in self._columnas or nombre in self.constantes
+
+    @property
+    def nombres_columnas(self):
+        return list(self._columnas.keys())
+
+    def columna(self, nombre: str) -> np.ndarray:
+        """Devuelve la columna sin copiarla"""
+        if nombre in self._columnas:
+            return self._columnas[nombre]
+        if nombre in self.constantes:
+            return np.full(self._n, self.constantes[nombre], dtype=object)
+        raise KeyError(nombre)
+
+    def variable(self, variable: str) -> np.ndarray:
+        """Columna asociada a una variable de mapa ('carbono', 'ndvi', 'ndwi', 'biodiversidad')"""
+        return self.columna(COLUMNAS_VARIABLE.get(variable, variable))
+
+    def fila(self, i: int, campos: Optional[Iterable[str]] = None) -> Dict:
+        """Reconstruye el diccionario de un punto (compatibilidad con el formato anterior)"""
+        if campos is None:
+            campos = list(self._columnas.keys()) + list(self.constantes.keys())
+        punto = {}
+        for campo in campos:
+            if campo in self._columnas:
+                valor = self._columnas[campo][i]
+                punto[campo] = valor.item() if isinstance(valor, np.generic) else valor
+            elif campo in self.constantes:
+                punto[campo] = self.constantes[campo]
+        return punto
+
+    def vista(self, clave: str) -> 'VistaPuntos':
+        """Vista de compatibilidad equivalente a resultados['puntos_*']"""
+        return VistaPuntos(self, CAMPOS_PUNTOS[clave])
+
+    def a_dataframe(self, columnas: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        columnas = list(columnas) if columnas is not None else self.nombres_columnas
+        return pd.DataFrame({c: self.columna(c) for c in columnas if c in self})
+
+    def nbytes(self) -> int:
+        return sum(arr.nbytes for arr in self._columnas.values())
+
+
+class VistaPuntos(Sequence):
+    """Secuencia perezosa de diccionarios por punto sobre un `MuestrasAnalisis`.
+
+    Permite que el código que indexa `resultados['puntos_carbono'][i]` siga
+    funcionando sin mantener una lista de diccionarios en memoria.
+    """
+
+    def __init__(self, muestras: MuestrasAnalisis, campos: Iterable[str]):
+        self.muestras = muestras
+        self.campos = tuple(campos)
+
+    def __len__(self):
+        return len(self.muestras)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self.muestras.fila(i, self.campos) for i in range(*indice.indices(len(self)))]
+        if indice < 0:
+            indice += len(self)
+        if not 0 <= indice < len(self):
+            raise IndexError(indice)
+        return self.muestras.fila(indice, self.campos)
+
+    def columna(self, campo: str) -> np.ndarray:
+        return self.muestras.columna(campo)
+
+    def tiene_campo(self, campo: str) -> bool:
+        """True si los diccionarios de la vista incluyen `campo`"""
+        return campo in self.campos and campo in self.muestras
+
+
+def valores_puntos(puntos, campo: str, defecto: float = 0.0) -> np.ndarray:
+    """Valores de un campo para una colección de puntos.
+
+    Con una `VistaPuntos` devuelve la columna subyacente sin copiarla; con la
+    lista de diccionarios del formato anterior construye el array. En ambos
+    casos un campo ausente vale `defecto` en cada punto.
+    """
+    if isinstance(puntos, VistaPuntos):
+        if puntos.tiene_campo(campo):
+            return puntos.columna(campo)
+        return np.full(len(puntos), defecto)
+    if not puntos:
+        return np.empty(0, dtype=float)
+    return np.asarray([p.get(campo, defecto) for p in puntos])
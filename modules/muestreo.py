@@ -0,0 +1,167 @@
+# modules/muestreo.py
+import math
+import numpy as np
+import shapely
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from modules.indice_poligono import indice_poligono
+
+# Por debajo de esta fracción área/rectángulo el rechazo desperdicia demasiados candidatos
+UMBRAL_ACEPTACION_RECHAZO = 0.25
+
+
+def _generador(rng: Optional[np.random.Generator]) -> np.random.Generator:
+    return rng if rng is not None else np.random.default_rng()
+
+
+def _vacio() -> Tuple[np.ndarray, np.ndarray]:
+    return np.empty(0, dtype=float), np.empty(0, dtype=float)
+
+
+def muestrear_puntos_rechazo(poligono, num_puntos: int, rng: Optional[np.random.Generator] = None,
+                             max_intentos: Optional[int] = None,
+                             tam_lote_max: int = 1_000_000) -> Tuple[np.ndarray, np.ndarray]:
+    """Muestrea puntos uniformes dentro del polígono por rechazo vectorizado.
+
+    Los candidatos se generan por lotes dentro del rectángulo envolvente y se
+    filtran con el índice raster del polígono (búsqueda en array para las
+    celdas interiores/exteriores, prueba exacta solo cerca del contorno). El
+    tamaño de cada lote se ajusta a la tasa de aceptación esperada (área del
+    polígono / área del rectángulo).
+
+    Devuelve dos arrays (lats, lons) con a lo sumo `num_puntos` elementos.
+    """
+    if poligono is None or poligono.is_empty or num_puntos <= 0:
+        return _vacio()
+
+    rng = _generador(rng)
+    minx, miny, maxx, maxy = poligono.bounds
+    area_caja = (maxx - minx) * (maxy - miny)
+    if area_caja <= 0:
+        return _vacio()
+
+    if max_intentos is None:
+        max_intentos = max(num_puntos * 100, 2_000_000)
+
+    # Tasa de aceptación esperada para dimensionar los lotes
+    aceptacion = max(poligono.area / area_caja, 1e-6)
+    indice = indice_poligono(poligono)
+
+    lats, lons = [], []
+    aceptados = 0
+    intentos = 0
+    while aceptados < num_puntos and intentos < max_intentos:
+        restantes = num_puntos - aceptados
+        lote = int(math.ceil(restantes / aceptacion * 1.1)) + 16
+        lote = min(lote, tam_lote_max, max_intentos - intentos)
+
+        xs = minx + rng.random(lote) * (maxx - minx)
+        ys = miny + rng.random(lote) * (maxy - miny)
+        dentro = indice.contiene(xs, ys)
+
+        lons.append(xs[dentro])
+        lats.append(ys[dentro])
+        aceptados += int(dentro.sum())
+        intentos += lote
+
+    if not lats:
+        return _vacio()
+    return np.concatenate(lats)[:num_puntos], np.concatenate(lons)[:num_puntos]
+
+
+@lru_cache(maxsize=16)
+def _triangulos_desde_wkb(wkb: bytes) -> np.ndarray:
+    poligono = shapely.from_wkb(wkb)
+    partes = shapely.get_parts(shapely.constrained_delaunay_triangles(poligono))
+    partes = partes[shapely.get_type_id(partes) == 3]  # solo Polygon
+    if len(partes) == 0:
+        return np.empty((0, 3, 2), dtype=float)
+    # Cada triángulo es un anillo cerrado de 4 vértices; se descarta el de cierre
+    return shapely.get_coordinates(partes).reshape(-1, 4, 2)[:, :3, :]
+
+
+def triangular_poligono(poligono) -> Optional[np.ndarray]:
+    """Triangula el polígono (huecos y partes de multipolígonos incluidos).
+
+    Devuelve un array (n, 3, 2) con los vértices (lon, lat) de cada triángulo,
+    o None si la versión de shapely no ofrece triangulación restringida.
+    """
+    if not hasattr(shapely, 'constrained_delaunay_triangles'):
+        return None
+    return _triangulos_desde_wkb(shapely.to_wkb(poligono))
+
+
+def muestrear_puntos_triangulacion(poligono, num_puntos: int,
+                                   rng: Optional[np.random.Generator] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Muestrea puntos uniformes dentro del polígono sin rechazo.
+
+    El polígono se triangula una vez; luego cada punto elige un triángulo con
+    probabilidad proporcional a su área y se ubica uniformemente dentro de él.
+    El costo es O(num_puntos) sin importar lo delgada o cóncava que sea la
+    geometría. Si no hay triangulación disponible se recurre al rechazo.
+
+    Devuelve dos arrays (lats, lons) con `num_puntos` elementos.
+    """
+    if poligono is None or poligono.is_empty or num_puntos <= 0:
+        return _vacio()
+
+    triangulos = triangular_poligono(poligono)
+    if triangulos is None or len(triangulos) == 0:
+        return muestrear_puntos_rechazo(poligono, num_puntos, rng)
+
+    rng = _generador(rng)
+    a = triangulos[:, 0, :]
+    ab = triangulos[:, 1, :] - a
+    ac = triangulos[:, 2, :] - a
+    areas = 0.5 * np.abs(ab[:, 0] * ac[:, 1] - ab[:, 1] * ac[:, 0])
+    acumulada = np.cumsum(areas)
+    if acumulada[-1] <= 0:
+        return muestrear_puntos_rechazo(poligono, num_puntos, rng)
+
+    # Selección de triángulos ponderada por área
+    idx = np.searchsorted(acumulada, rng.random(num_puntos) * acumulada[-1], side='right')
+    idx = np.minimum(idx, len(areas) - 1)
+
+    # Coordenadas baricéntricas uniformes (reflejando el paralelogramo sobrante)
+    r1 = rng.random(num_puntos)
+    r2 = rng.random(num_puntos)
+    reflejar = r1 + r2 > 1.0
+    r1[reflejar] = 1.0 - r1[reflejar]
+    r2[reflejar] = 1.0 - r2[reflejar]
+
+    puntos = a[idx] + r1[:, None] * ab[idx] + r2[:, None] * ac[idx]
+    return puntos[:, 1], puntos[:, 0]
+
+
+def muestrear_puntos_poligono(poligono, num_puntos: int, metodo: str = 'auto',
+                              rng: Optional[np.random.Generator] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Muestrea puntos dentro del polígono con el método indicado.
+
+    - 'rechazo': candidatos en el rectángulo envolvente filtrados por contención.
+    - 'triangulacion': muestreo directo en triángulos ponderados por área.
+    - 'auto': rechazo para geometrías compactas y triangulación para franjas
+      delgadas (baja fracción área/rectángulo); si el rechazo no alcanza la
+      cuota, el faltante se completa por triangulación.
+    """
+    if poligono is None or poligono.is_empty or num_puntos <= 0:
+        return _vacio()
+
+    rng = _generador(rng)
+    if metodo == 'triangulacion':
+        return muestrear_puntos_triangulacion(poligono, num_puntos, rng)
+    if metodo == 'rechazo':
+        return muestrear_puntos_rechazo(poligono, num_puntos, rng)
+
+    minx, miny, maxx, maxy = poligono.bounds
+    area_caja = (maxx - minx) * (maxy - miny)
+    if area_caja <= 0 or poligono.area / area_caja < UMBRAL_ACEPTACION_RECHAZO:
+        return muestrear_puntos_triangulacion(poligono, num_puntos, rng)
+
+    lats, lons = muestrear_puntos_rechazo(poligono, num_puntos, rng)
+    faltantes = num_puntos - len(lats)
+    if faltantes > 0:
+        lats_extra, lons_extra = muestrear_puntos_triangulacion(poligono, faltantes, rng)
+        lats = np.concatenate([lats, lats_extra])
+        lons = np.concatenate([lons, lons_extra])
+    return lats, lons
@@ -0,0 +1,114 @@
+# modules/paralelo.py
+import multiprocessing
+import os
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterator, List, Optional, Sequence
+
+# Tarea que heredan los procesos hijos al bifurcarse. Las funciones definidas
+# en el script de Streamlit no se pueden serializar por referencia, así que
+# solo viajan los argumentos y el resultado. Cada sesión de Streamlit es un
+# hilo: el bloqueo se mantiene desde que se fija la tarea hasta que todos los
+# trabajadores se bifurcaron, para que nadie herede la tarea de otra sesión.
+_tarea_actual: Optional[Callable] = None
+_bloqueo_tarea = threading.Lock()
+
+
+def _ejecutar_tarea(argumentos: tuple):
+    return _tarea_actual(*argumentos)
+
+
+def procesos_disponibles() -> bool:
+    """True si la plataforma permite crear trabajadores por fork"""
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def iterar_en_procesos(tarea: Callable, lista_argumentos: Sequence[tuple],
+                       max_procesos: Optional[int] = None, paralelo: bool = True) -> Iterator:
+    """Ejecuta `tarea(*argumentos)` para cada elemento y entrega los resultados en orden.
+
+    Usa un `ProcessPoolExecutor` con contexto fork cuando hay más de una tarea
+    y la plataforma lo permite; en otro caso (o si el pool no puede crearse)
+    ejecuta en serie. Cada resultado se entrega apenas está listo (respetando
+    el orden), y si el consumidor deja de iterar las tareas pendientes se
+    cancelan. La tarea debe ser determinista respecto de sus argumentos para
+    que ambos caminos den el mismo resultado.
+    """
+    global _tarea_actual
+    lista_argumentos = list(lista_argumentos)
+    if not paralelo or len(lista_argumentos) <= 1 or not procesos_disponibles():
+        for argumentos in lista_argumentos:
+            yield tarea(*argumentos)
+        return
+
+    max_procesos = min(max_procesos or os.cpu_count() or 1, len(lista_argumentos))
+    ejecutor = None
+    with _bloqueo_tarea:
+        _tarea_actual = tarea
+        try:
+            ejecutor = ProcessPoolExecutor(max_workers=max_procesos,
+                                           mp_context=multiprocessing.get_context('fork'))
+            # Con fork el primer submit bifurca todos los trabajadores
+            futuros = [ejecutor.submit(_ejecutar_tarea, argumentos) for argumentos in lista_argumentos]
+        except OSError:
+            # No se pudo crear el pool (p. ej. sin recursos para bifurcar)
+            if ejecutor is not None:
+                ejecutor.shutdown(wait=False, cancel_futures=True)
+            ejecutor = None
+        finally:
+            _tarea_actual = None
+
+    if ejecutor is None:
+        for argumentos in lista_argumentos:
+            yield tarea(*argumentos)
+        return
+
+    entregados = 0
+    try:
+        for futuro in futuros:
+            try:
+                resultado = futuro.result()
+            except BrokenProcessPool:
+                break
+            entregados += 1
+            yield resultado
+        else:
+            return
+    finally:
+        ejecutor.shutdown(wait=True, cancel_futures=True)
+    # El pool se rompió (un trabajador murió): completa en serie lo que faltó.
+    # Las excepciones de la propia tarea se propagan sin reintentar.
+    for argumentos in lista_argumentos[entregados:]:
+        yield tarea(*argumentos)
+
+
+def mapear_en_procesos(tarea: Callable, lista_argumentos: Sequence[tuple],
+                       max_procesos: Optional[int] = None, paralelo: bool = True) -> List:
+    """Como `iterar_en_procesos`, pero devuelve la lista completa de resultados"""
+    return list(iterar_en_procesos(tarea, lista_argumentos, max_procesos, paralelo))
+
+
+def repartir_cuota(total: int, pesos: Sequence[float], minimo: int = 1) -> np.ndarray:
+    """Reparte `total` unidades enteras proporcionalmente a `pesos`.
+
+    Cada parte recibe al menos `minimo` (si alcanza) y el resto se asigna por
+    el método del mayor residuo, con desempates por orden de aparición.
+    """
+    pesos = np.asarray(pesos, dtype=float)
+    n = len(pesos)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    base = np.full(n, minimo if total >= minimo * n else 0, dtype=np.int64)
+    restante = total - int(base.sum())
+    suma = pesos.sum()
+    if restante <= 0 or suma <= 0:
+        return base
+    ideal = pesos / suma * restante
+    cuota = np.floor(ideal).astype(np.int64)
+    faltan = restante - int(cuota.sum())
+    if faltan > 0:
+        orden = np.argsort(-(ideal - cuota), kind='stable')
+        cuota[orden[:faltan]] += 1
+    return base + cuota
@@ -0,0 +1,138 @@
+# modules/raster_clima.py
+import json
+import os
+import numpy as np
+from functools import lru_cache
+from typing import Dict, Optional
+
+# Variable de entorno con la ruta del encabezado JSON del raster climático local
+VARIABLE_ENTORNO_RASTER = 'CLIMA_RASTER'
+
+
+class RasterClimatico:
+    """Grillas climáticas locales (precipitación, temperatura) leídas por mmap.
+
+    El raster se describe con un encabezado JSON pequeño:
+
+        {"lat_max": 13.0, "lon_min": -82.0, "resolucion": 0.05,
+         "filas": 1100, "columnas": 780, "nodata": -9999,
+         "variables": {"precipitacion": "precipitacion.npy",
+                       "temperatura": "temperatura.npy"}}
+
+    Cada variable es un `.npy` 2D (filas × columnas, fila 0 al norte) que se
+    abre con `np.load(mmap_mode='r')`: al muestrear solo se leen del disco las
+    páginas de las filas que tocan los puntos consultados, nunca el raster
+    completo. Las coordenadas se refieren a la esquina noroeste y los valores
+    a los centros de celda.
+    """
+
+    def __init__(self, ruta_encabezado: str):
+        with open(ruta_encabezado, 'r', encoding='utf-8') as f:
+            self.encabezado = json.load(f)
+        self.directorio = os.path.dirname(os.path.abspath(ruta_encabezado))
+        self.lat_max = float(self.encabezado['lat_max'])
+        self.lon_min = float(self.encabezado['lon_min'])
+        self.resolucion = float(self.encabezado['resolucion'])
+        self.filas = int(self.encabezado['filas'])
+        self.columnas = int(self.encabezado['columnas'])
+        self.nodata = self.encabezado.get('nodata')
+        self._grillas: Dict[str, np.ndarray] = {}
+        # Abrir (mmap, sin leer datos) y validar todas las grillas ahora: un
+        # archivo faltante o de otra forma falla al abrir el raster, no en
+        # medio de un análisis
+        for variable in self.variables:
+            self.grilla(variable)
+
+    @property
+    def variables(self):
+        return list(self.encabezado['variables'].keys())
+
+    def grilla(self, variable: str) -> np.ndarray:
+        """Array memory-mapped de la variable (se abre una sola vez)"""
+        if variable not in self._grillas:
+            ruta = os.path.join(self.directorio, self.encabezado['variables'][variable])
+            grilla = np.load(ruta, mmap_mode='r')
+            if grilla.shape != (self.filas, self.columnas):
+                raise ValueError(f"La grilla '{variable}' tiene forma {grilla.shape}, "
+                                 f"se esperaba {(self.filas, self.columnas)}")
+            self._grillas[variable] = grilla
+        return self._grillas[variable]
+
+    def muestrear(self, variable: str, lats, lons) -> np.ndarray:
+        """Interpolación bilineal vectorizada en los puntos dados.
+
+        Devuelve NaN fuera del raster o donde alguna celda vecina es nodata.
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+        grilla = self.grilla(variable)
+
+        # Posición fraccional respecto de los centros de celda
+        fila = (self.lat_max - lats) / self.resolucion - 0.5
+        columna = (lons - self.lon_min) / self.resolucion - 0.5
+        fuera = (fila < -0.5) | (fila > self.filas - 0.5) | (columna < -0.5) | (columna > self.columnas - 0.5)
+
+        fila = np.clip(fila, 0.0, self.filas - 1.0)
+        columna = np.clip(columna, 0.0, self.columnas - 1.0)
+        f0 = np.minimum(np.floor(fila).astype(np.intp), max(self.filas - 2, 0))
+        c0 = np.minimum(np.floor(columna).astype(np.intp), max(self.columnas - 2, 0))
+        f1 = np.minimum(f0 + 1, self.filas - 1)
+        c1 = np.minimum(c0 + 1, self.columnas - 1)
+        df = fila - f0
+        dc = columna - c0
+
+        # Lectura indexada: solo toca las páginas de las celdas vecinas
+        v00 = np.asarray(grilla[f0, c0], dtype=float)
+        v01 = np.asarray(grilla[f0, c1], dtype=float)
+        v10 = np.asarray(grilla[f1, c0], dtype=float)
+        v11 = np.asarray(grilla[f1, c1], dtype=float)
+        valores = ((v00 * (1 - dc) + v01 * dc) * (1 - df) +
+                   (v10 * (1 - dc) + v11 * dc) * df)
+
+        if self.nodata is not None:
+            invalido = (v00 == self.nodata) | (v01 == self.nodata) | (v10 == self.nodata) | (v11 == self.nodata)
+            valores[invalido] = np.nan
+        valores[fuera] = np.nan
+        return valores
+
+
+def escribir_raster_climatico(ruta_encabezado: str, grillas: Dict[str, np.ndarray], lat_max: float,
+                              lon_min: float, resolucion: float, nodata: Optional[float] = -9999.0) -> None:
+    """Guarda grillas 2D (fila 0 al norte) en el formato que lee `RasterClimatico`"""
+    formas = {np.shape(grilla) for grilla in grillas.values()}
+    if len(formas) != 1:
+        raise ValueError("Todas las grillas deben tener la misma forma")
+    filas, columnas = formas.pop()
+    directorio = os.path.dirname(os.path.abspath(ruta_encabezado))
+    os.makedirs(directorio, exist_ok=True)
+    archivos = {}
+    for variable, grilla in grillas.items():
+        archivos[variable] = f"{variable}.npy"
+        np.save(os.path.join(directorio, archivos[variable]), np.asarray(grilla, dtype=np.float32))
+    with open(ruta_encabezado, 'w', encoding='utf-8') as f:
+        json.dump({
+            'lat_max': lat_max, 'lon_min': lon_min, 'resolucion': resolucion,
+            'filas': filas, 'columnas': columnas, 'nodata': nodata, 'variables': archivos
+        }, f, indent=2)
+
+
+@lru_cache(maxsize=4)
+def _raster_cacheado(ruta_encabezado: str, modificado: float) -> RasterClimatico:
+    return RasterClimatico(ruta_encabezado)
+
+
+def abrir_raster_climatico(ruta_encabezado: Optional[str] = None) -> Optional[RasterClimatico]:
+    """Abre el raster indicado o el de la variable de entorno; None si no hay o falla.
+
+    Falla (None) también si falta el `.npy` de alguna variable o su forma no
+    coincide con el encabezado. La instancia (y sus mmaps) se reutiliza
+    mientras el encabezado no cambie.
+    """
+    ruta_encabezado = ruta_encabezado or os.environ.get(VARIABLE_ENTORNO_RASTER)
+    if not ruta_encabezado or not os.path.exists(ruta_encabezado):
+        return None
+    try:
+        ruta_encabezado = os.path.abspath(ruta_encabezado)
+        return _raster_cacheado(ruta_encabezado, os.path.getmtime(ruta_encabezado))
+    except (OSError, ValueError, KeyError):
+        return None
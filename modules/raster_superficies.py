@@ -0,0 +1,94 @@
+# modules/raster_superficies.py
+import base64
+import io
+import numpy as np
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from matplotlib.colors import LinearSegmentedColormap
+from PIL import Image
+
+
+@lru_cache(maxsize=32)
+def _tabla_colores(paradas: Tuple[Tuple[float, str], ...], n: int) -> np.ndarray:
+    colormap = LinearSegmentedColormap.from_list('superficie', list(paradas), N=n)
+    tabla = (colormap(np.linspace(0.0, 1.0, n)) * 255).round().astype(np.uint8)
+    tabla.flags.writeable = False
+    return tabla
+
+
+def tabla_colores(gradiente: Dict[float, str], n: int = 256) -> np.ndarray:
+    """Tabla RGBA (n × 4, uint8) del gradiente {posición 0-1: color}, cacheada"""
+    paradas = tuple(sorted((float(posicion), color) for posicion, color in gradiente.items()))
+    return _tabla_colores(paradas, n)
+
+
+def limites_superficie(superficie: Dict) -> List[List[float]]:
+    """[[sur, oeste], [norte, este]] de la malla (bordes de celda, no centros)"""
+    xs, ys = superficie['xs'], superficie['ys']
+    dx = xs[1] - xs[0] if len(xs) > 1 else 0.0
+    dy = ys[1] - ys[0] if len(ys) > 1 else 0.0
+    return [[float(ys[0] - dy / 2), float(xs[0] - dx / 2)], [float(ys[-1] + dy / 2), float(xs[-1] + dx / 2)]]
+
+
+def rango_superficie(superficie: Dict) -> Tuple[float, float]:
+    valores = superficie['valores']
+    return float(np.nanmin(valores)), float(np.nanmax(valores))
+
+
+def indices_valores(valores, n_colores: int, vmin: float, vmax: float) -> np.ndarray:
+    """Índice de color (uint8) de cada valor; NaN recibe `n_colores` (transparente)"""
+    valores = np.asarray(valores, dtype=float)
+    escala = (n_colores - 1) / (vmax - vmin) if vmax > vmin else 0.0
+    indices = np.clip(np.round(np.nan_to_num((valores - vmin) * escala)), 0, n_colores - 1).astype(np.uint8)
+    indices[np.isnan(valores)] = n_colores
+    return indices
+
+
+def indices_superficie(superficie: Dict, n_colores: int = 255, vmin: Optional[float] = None,
+                       vmax: Optional[float] = None) -> np.ndarray:
+    """Índice de color (uint8) de cada celda, filas de norte a sur.
+
+    Las celdas fuera del polígono (o sin valor) reciben el índice
+    `n_colores`, reservado como transparente; así la imagen queda recortada
+    al contorno de la parcela.
+    """
+    mascara = superficie['mascara']
+    if vmin is None or vmax is None:
+        minimo, maximo = rango_superficie(superficie)
+        vmin = minimo if vmin is None else vmin
+        vmax = maximo if vmax is None else vmax
+
+    indices = np.full(mascara.shape, n_colores, dtype=np.uint8)
+    indices[mascara] = indices_valores(superficie['valores'], n_colores, vmin, vmax)
+    # Fila 0 de la malla es el sur; las imágenes van de norte a sur
+    return indices[::-1]
+
+
+def grilla_superficie(superficie: Dict) -> np.ndarray:
+    """Valores de la superficie como array 2D (filas = latitud), NaN fuera del polígono"""
+    grilla = np.full(superficie['mascara'].shape, np.nan)
+    grilla[superficie['mascara']] = superficie['valores']
+    return grilla
+
+
+def imagen_png(indices: np.ndarray, tabla: np.ndarray, opacidad: float = 0.75) -> bytes:
+    """PNG con paleta (un byte por píxel) a partir de `indices_superficie`.
+
+    El último índice de la paleta es transparente y el resto lleva la
+    opacidad pedida; una paleta comprime mucho mejor que RGBA completo.
+    """
+    n_colores = len(tabla)
+    imagen = Image.fromarray(np.ascontiguousarray(indices), 'P')
+    paleta = np.zeros((256, 3), dtype=np.uint8)
+    paleta[:n_colores] = tabla[:, :3]
+    imagen.putpalette(paleta.ravel().tolist())
+    alfa = bytes([int(round(opacidad * 255))] * n_colores + [0])
+    buf = io.BytesIO()
+    imagen.save(buf, format='PNG', optimize=True, transparency=alfa)
+    return buf.getvalue()
+
+
+def url_png(indices: np.ndarray, tabla: np.ndarray, opacidad: float = 0.75) -> str:
+    """Data URL (PNG en base64) lista para un `ImageOverlay`"""
+    return 'data:image/png;base64,' + base64.b64encode(imagen_png(indices, tabla, opacidad)).decode('ascii')
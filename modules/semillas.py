@@ -0,0 +1,42 @@
+# modules/semillas.py
+import numpy as np
+from typing import Dict, Optional
+
+# Etapas del análisis con flujo aleatorio propio. El orden fija la clave de
+# derivación de cada una: agregar etapas solo al final para no alterar las
+# semillas de las existentes.
+ETAPAS_ANALISIS = ('muestreo', 'clima', 'ndvi', 'ndwi', 'biodiversidad', 'visualizacion')
+
+
+def nueva_semilla() -> int:
+    """Semilla de 32 bits tomada de la entropía del sistema operativo"""
+    return int(np.random.SeedSequence().generate_state(1)[0])
+
+
+class FlujosAleatorios:
+    """Flujos aleatorios independientes derivados de una sola semilla.
+
+    Cada etapa obtiene su propia `SeedSequence` con clave de derivación fija
+    (equivalente a `SeedSequence(semilla).spawn(...)`), de modo que el
+    resultado no depende del orden en que se piden los generadores y dos
+    etapas nunca comparten ni correlacionan estado. Una subclave (p. ej. la
+    zona y el bloque de puntos) deriva secuencias propias de cada tarea, que
+    pueden enviarse a otros procesos.
+    """
+
+    def __init__(self, semilla: Optional[int] = None):
+        self.semilla = nueva_semilla() if semilla is None else int(semilla)
+
+    def secuencia(self, etapa: str, *subclave: int) -> np.random.SeedSequence:
+        if etapa not in ETAPAS_ANALISIS:
+            raise ValueError(f"Etapa de análisis desconocida: {etapa}")
+        clave = (ETAPAS_ANALISIS.index(etapa),) + tuple(int(k) for k in subclave)
+        return np.random.SeedSequence(self.semilla, spawn_key=clave)
+
+    def generador(self, etapa: str, *subclave: int) -> np.random.Generator:
+        """Generator de NumPy propio de la etapa (y subclave opcional)"""
+        return np.random.Generator(np.random.PCG64(self.secuencia(etapa, *subclave)))
+
+    def secuencias_etapas(self, *subclave: int) -> Dict[str, np.random.SeedSequence]:
+        """Secuencia de cada etapa para una subdivisión del análisis (p. ej. una zona)"""
+        return {etapa: self.secuencia(etapa, *subclave) for etapa in ETAPAS_ANALISIS}
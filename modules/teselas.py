@@ -0,0 +1,303 @@
+# modules/teselas.py
+import atexit
+import hashlib
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from modules.cache_superficies import CacheLRU
+from modules.indice_poligono import indice_poligono
+from modules.raster_superficies import imagen_png, indices_valores
+
+TAMANO_TESELA = 256
+
+# URL base pública del servidor de teselas (p. ej. detrás de un proxy inverso).
+# Sin ella el servidor solo es accesible en http://127.0.0.1:<puerto>, que un
+# navegador remoto no alcanza: la app ofrece el modo de teselas solo si está.
+VARIABLE_ENTORNO_URL = 'TESELAS_URL_PUBLICA'
+# Dirección y puerto en los que escucha el servidor, para que el proxy detrás de
+# TESELAS_URL_PUBLICA apunte siempre al mismo sitio (p. ej. TESELAS_HOST=0.0.0.0
+# en un contenedor, TESELAS_PUERTO=8765). Por defecto: 127.0.0.1 y un puerto
+# libre elegido por el sistema, distinto en cada arranque.
+VARIABLE_ENTORNO_HOST = 'TESELAS_HOST'
+VARIABLE_ENTORNO_PUERTO = 'TESELAS_PUERTO'
+
+
+def teselas_publicas() -> bool:
+    """True si hay una URL pública configurada para el servidor de teselas"""
+    return bool(os.environ.get(VARIABLE_ENTORNO_URL))
+
+
+def id_capa_teselas(*partes) -> str:
+    """Identificador hexadecimal de una capa (huellas, variable, estilo)"""
+    return hashlib.blake2b('|'.join(str(parte) for parte in partes).encode('utf-8'), digest_size=12).hexdigest()
+
+
+def limites_tesela(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(oeste, sur, este, norte) en grados de la tesela XYZ (Web Mercator)"""
+    n = 2 ** z
+    oeste = x / n * 360.0 - 180.0
+    este = (x + 1) / n * 360.0 - 180.0
+    norte = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    sur = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return oeste, sur, este, norte
+
+
+def _coordenadas_pixeles(z: int, x: int, y: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Longitud (por columna) y latitud (por fila) de los centros de píxel"""
+    n = 2 ** z
+    posiciones = (np.arange(TAMANO_TESELA) + 0.5) / TAMANO_TESELA
+    lons = (x + posiciones) / n * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + posiciones) / n))))
+    return lons, lats
+
+
+class CapaTeselas:
+    """Superficie interpolada que se evalúa tesela por tesela, a resolución de píxel.
+
+    `evaluar(lats, lons)` devuelve los valores interpolados en cualquier
+    punto (el mismo interpolador que genera las superficies), de modo que
+    acercar el zoom gana detalle en lugar de ampliar las celdas de una malla
+    fija. Solo se evalúan los píxeles dentro del polígono, recortados al
+    contorno exacto con su índice raster.
+    """
+
+    def __init__(self, evaluar: Callable[[np.ndarray, np.ndarray], np.ndarray], poligono, tabla: np.ndarray,
+                 vmin: float, vmax: float, opacidad: float = 0.75):
+        self.evaluar = evaluar
+        self.oeste, self.sur, self.este, self.norte = poligono.bounds
+        self.indice = indice_poligono(poligono)
+        self.tabla = tabla
+        self.vmin = vmin
+        self.vmax = vmax
+        self.opacidad = opacidad
+        self._vacia = None
+
+    def tesela_vacia(self) -> bytes:
+        if self._vacia is None:
+            indices = np.full((TAMANO_TESELA, TAMANO_TESELA), len(self.tabla), dtype=np.uint8)
+            self._vacia = imagen_png(indices, self.tabla, self.opacidad)
+        return self._vacia
+
+    def renderizar(self, z: int, x: int, y: int) -> bytes:
+        """PNG de la tesela: valor interpolado en el centro de cada píxel dentro del polígono"""
+        oeste, sur, este, norte = limites_tesela(z, x, y)
+        if este <= self.oeste or oeste >= self.este or norte <= self.sur or sur >= self.norte:
+            return self.tesela_vacia()
+
+        lons, lats = _coordenadas_pixeles(z, x, y)
+        lon_px, lat_px = np.meshgrid(lons, lats)
+        dentro = self.indice.contiene(lon_px, lat_px)
+        if not dentro.any():
+            return self.tesela_vacia()
+
+        valores = np.full((TAMANO_TESELA, TAMANO_TESELA), np.nan)
+        valores[dentro] = self.evaluar(lat_px[dentro], lon_px[dentro])
+        indices = indices_valores(valores, len(self.tabla), self.vmin, self.vmax)
+        return imagen_png(indices, self.tabla, self.opacidad)
+
+
+class CacheTeselasDisco:
+    """Caché de teselas PNG en disco con desalojo LRU por bytes totales"""
+
+    def __init__(self, directorio: str, max_bytes: int = 256 * 1024 * 1024):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self._archivos: 'OrderedDict[str, int]' = OrderedDict()
+        self._bytes = 0
+        self._bloqueo = threading.Lock()
+        os.makedirs(directorio, exist_ok=True)
+        # Teselas de ejecuciones anteriores, de la más antigua a la más reciente
+        existentes = []
+        for raiz, _, nombres in os.walk(directorio):
+            for nombre in nombres:
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    existentes.append((os.path.getmtime(ruta), ruta, os.path.getsize(ruta)))
+                except OSError:
+                    pass
+        for _, ruta, tamano in sorted(existentes):
+            self._archivos[ruta] = tamano
+            self._bytes += tamano
+        self._desalojar()
+
+    def ruta(self, capa: str, z: int, x: int, y: int) -> str:
+        return os.path.join(self.directorio, capa, str(z), str(x), f"{y}.png")
+
+    def leer(self, ruta: str) -> Optional[bytes]:
+        with self._bloqueo:
+            if ruta not in self._archivos:
+                return None
+            self._archivos.move_to_end(ruta)
+        try:
+            with open(ruta, 'rb') as f:
+                return f.read()
+        except OSError:
+            with self._bloqueo:
+                self._bytes -= self._archivos.pop(ruta, 0)
+            return None
+
+    def escribir(self, ruta: str, datos: bytes) -> None:
+        try:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            temporal = f"{ruta}.{threading.get_ident()}.tmp"
+            with open(temporal, 'wb') as f:
+                f.write(datos)
+            os.replace(temporal, ruta)
+        except OSError:
+            return
+        with self._bloqueo:
+            self._bytes -= self._archivos.pop(ruta, 0)
+            self._archivos[ruta] = len(datos)
+            self._bytes += len(datos)
+            self._desalojar()
+
+    def _desalojar(self) -> None:
+        while self._bytes > self.max_bytes and self._archivos:
+            ruta, tamano = self._archivos.popitem(last=False)
+            self._bytes -= tamano
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+
+class PiramideTeselas:
+    """Pirámide XYZ perezosa: cada tesela se genera la primera vez que se pide.
+
+    Las capas registradas viven en memoria (LRU acotada) y las teselas ya
+    generadas se sirven desde la caché en disco.
+    """
+
+    def __init__(self, directorio: Optional[str] = None, max_bytes_disco: int = 256 * 1024 * 1024,
+                 max_capas: int = 32):
+        if directorio is None:
+            # Directorio propio de esta instancia: otras instancias de la app en la
+            # misma máquina no ven (ni desalojan) estas teselas
+            directorio = tempfile.mkdtemp(prefix='biodiversidad_teselas_')
+            atexit.register(shutil.rmtree, directorio, True)
+        self.disco = CacheTeselasDisco(directorio, max_bytes_disco)
+        # Cada capa guarda solo el interpolador (las muestras) y el índice del
+        # polígono, ya cacheado aparte: se acotan por cantidad
+        self.capas = CacheLRU(max_entradas=max_capas)
+
+    def registrar(self, id_capa: str, capa: CapaTeselas) -> None:
+        if id_capa not in self.capas:
+            self.capas.guardar(id_capa, capa, 0)
+
+    def tesela(self, id_capa: str, z: int, x: int, y: int) -> Optional[bytes]:
+        """PNG de la tesela, o None si la capa no está registrada"""
+        ruta = self.disco.ruta(id_capa, z, x, y)
+        datos = self.disco.leer(ruta)
+        if datos is not None:
+            return datos
+        capa = self.capas.obtener(id_capa)
+        if capa is None:
+            return None
+        datos = capa.renderizar(z, x, y)
+        self.disco.escribir(ruta, datos)
+        return datos
+
+
+class _ManejadorTeselas(BaseHTTPRequestHandler):
+    patron = re.compile(r'^/teselas/([0-9a-f]+)/(\d+)/(\d+)/(\d+)\.png$')
+    piramide: PiramideTeselas = None
+
+    def do_GET(self):
+        coincidencia = self.patron.match(self.path.split('?')[0])
+        if not coincidencia:
+            self.send_error(404)
+            return
+        id_capa = coincidencia.group(1)
+        z, x, y = (int(v) for v in coincidencia.groups()[1:])
+        if z > 24 or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            self.send_error(404)
+            return
+        try:
+            datos = self.piramide.tesela(id_capa, z, x, y)
+        except Exception:
+            self.send_error(500)
+            return
+        if datos is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(datos)))
+        self.send_header('Cache-Control', 'public, max-age=86400')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+class ServidorTeselas:
+    """Servidor HTTP local (hilo en segundo plano) de una `PiramideTeselas`"""
+
+    def __init__(self, piramide: PiramideTeselas, host: str = '127.0.0.1', puerto: int = 0):
+        self.piramide = piramide
+        manejador = type('ManejadorTeselas', (_ManejadorTeselas,), {'piramide': piramide})
+        self.servidor = ThreadingHTTPServer((host, puerto), manejador)
+        self.servidor.daemon_threads = True
+        self.host, self.puerto = self.servidor.server_address[:2]
+        self.hilo = threading.Thread(target=self.servidor.serve_forever, name='servidor-teselas', daemon=True)
+        self.hilo.start()
+
+    @property
+    def url_base(self) -> str:
+        return os.environ.get(VARIABLE_ENTORNO_URL) or f"http://{self.host}:{self.puerto}"
+
+    def url_plantilla(self, id_capa: str) -> str:
+        """Plantilla {z}/{x}/{y} para `folium.TileLayer`"""
+        return f"{self.url_base.rstrip('/')}/teselas/{id_capa}/{{z}}/{{x}}/{{y}}.png"
+
+    def detener(self) -> None:
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+_servidor: Optional[ServidorTeselas] = None
+_bloqueo_servidor = threading.Lock()
+
+
+def direccion_servidor() -> Tuple[str, int]:
+    """(host, puerto) del servidor según TESELAS_HOST / TESELAS_PUERTO"""
+    host = os.environ.get(VARIABLE_ENTORNO_HOST) or '127.0.0.1'
+    try:
+        puerto = int(os.environ.get(VARIABLE_ENTORNO_PUERTO) or 0)
+    except ValueError:
+        puerto = 0
+    return host, puerto
+
+
+def servidor_teselas() -> Optional[ServidorTeselas]:
+    """Servidor de teselas del proceso (se inicia la primera vez); None si no puede abrirse"""
+    global _servidor
+    with _bloqueo_servidor:
+        if _servidor is None:
+            host, puerto = direccion_servidor()
+            try:
+                _servidor = ServidorTeselas(PiramideTeselas(), host=host, puerto=puerto)
+            except OSError:
+                return None
+        return _servidor
+
+
+def capas_registradas(ids_capas) -> bool:
+    """True si el servidor sigue sirviendo todas las capas (p. ej. las de un HTML cacheado)"""
+    ids_capas = list(ids_capas)
+    if not ids_capas:
+        return True
+    if _servidor is None:
+        return False
+    return all(id_capa in _servidor.piramide.capas for id_capa in ids_capas)
@@ -0,0 +1,17 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+from streamlit import config
+
+# Los módulos se importan desde la raíz del repositorio (como lo hace `streamlit run app.py`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.py lee st.secrets al importarse: las pruebas usan un secrets.toml vacío
+# en lugar del de la instalación
+_directorio_secretos = tempfile.mkdtemp(prefix='secretos_pruebas_')
+_ruta_secretos = os.path.join(_directorio_secretos, 'secrets.toml')
+with open(_ruta_secretos, 'w') as f:
+    f.write('')
+config.set_option('secrets.files', [_ruta_secretos])
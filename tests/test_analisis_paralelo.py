@@ -0,0 +1,30 @@
+# tests/test_analisis_paralelo.py
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Polygon
+
+from app import ejecutar_analisis_completo
+
+POLIGONO = gpd.GeoDataFrame(
+    {'geometry': [Polygon([(-60.0, -3.0), (-59.9, -3.0), (-59.9, -2.9), (-60.0, -2.9)])]}, crs='EPSG:4326'
+)
+
+
+@pytest.mark.parametrize('n_zonas', [2, 4])
+def test_analisis_por_zonas_en_procesos_igual_al_serial(n_zonas):
+    """Misma semilla: el análisis por zonas en procesos reproduce exactamente el serial"""
+    serial = ejecutar_analisis_completo(POLIGONO, 'amazonia', 120, semilla=5, n_zonas=n_zonas, paralelo=False)
+    paralelo = ejecutar_analisis_completo(POLIGONO, 'amazonia', 120, semilla=5, n_zonas=n_zonas, paralelo=True)
+
+    muestras_serial, muestras_paralelo = serial['muestras'], paralelo['muestras']
+    assert len(muestras_serial) == len(muestras_paralelo) == 120
+    assert muestras_serial.nombres_columnas == muestras_paralelo.nombres_columnas
+    for nombre in muestras_serial.nombres_columnas:
+        columna_serial = muestras_serial.columna(nombre)
+        columna_paralelo = muestras_paralelo.columna(nombre)
+        if columna_serial.dtype == object:
+            assert list(columna_serial) == list(columna_paralelo), nombre
+        else:
+            np.testing.assert_array_equal(columna_serial, columna_paralelo, err_msg=nombre)
+    assert serial['carbono_total_ton'] == paralelo['carbono_total_ton']
@@ -0,0 +1,107 @@
+# tests/test_carbono_lote.py
+import numpy as np
+import pytest
+
+from app import MetodologiaVerra
+
+VERRA = MetodologiaVerra()
+CULTIVOS = ['vid', 'cultivo', 'agricola']
+TIPOS = sorted(VERRA.factores_vegetacion) + ['desconocido']
+
+
+def carbono_por_punto(ndvi, tipo_bosque, precipitacion, redondear=True):
+    """Cálculo escalar por punto anterior a la API por lotes (referencia)"""
+    factores = VERRA.factores
+    factores_veg = VERRA.factores_vegetacion.get(tipo_bosque,
+        {'factor_biomasa': 1.0, 'factor_suelo': 1.0, 'factor_madera': 1.0})
+    es_cultivo = tipo_bosque in CULTIVOS
+    if es_cultivo:
+        factor_precip = min(1.3, max(0.7, precipitacion / 1500))
+        if ndvi > 0.7:
+            agb = (30 + (ndvi - 0.7) * 50) * factor_precip
+        elif ndvi > 0.5:
+            agb = (20 + (ndvi - 0.5) * 60) * factor_precip
+        elif ndvi > 0.3:
+            agb = (10 + (ndvi - 0.3) * 50) * factor_precip
+        else:
+            agb = (5 + ndvi * 30) * factor_precip
+    else:
+        factor_precip = min(2.0, max(0.5, precipitacion / 1500))
+        if ndvi > 0.7:
+            agb = (150 + (ndvi - 0.7) * 300) * factor_precip
+        elif ndvi > 0.5:
+            agb = (80 + (ndvi - 0.5) * 350) * factor_precip
+        elif ndvi > 0.3:
+            agb = (30 + (ndvi - 0.3) * 250) * factor_precip
+        else:
+            agb = (5 + ndvi * 100) * factor_precip
+    agb *= factores_veg['factor_biomasa']
+    if tipo_bosque == 'vid':
+        agb *= 0.9
+    elif tipo_bosque == 'cultivo':
+        agb *= 0.8
+
+    agb_c = agb * factores['conversion_carbono']
+    bgb = agb_c * (factores['ratio_raiz'] * 0.7 if es_cultivo else factores['ratio_raiz'])
+    dw = agb_c * factores['proporcion_madera_muerta'] * factores_veg['factor_madera']
+    li = factores['acumulacion_hojarasca'] * (0.3 if es_cultivo else 1.0) * factores['conversion_carbono']
+    soc = factores['carbono_suelo'] * factores_veg['factor_suelo']
+    total = agb_c + bgb + dw + li + soc
+    valores = {'carbono_total_ton_ha': total, 'co2_equivalente_ton_ha': total * factores['ratio_co2'],
+               'biomasa_aerea_ton_ha': agb, 'AGB': agb_c, 'BGB': bgb, 'DW': dw, 'LI': li, 'SOC': soc}
+    if redondear:
+        valores = {campo: round(valor, 2) for campo, valor in valores.items()}
+    return valores
+
+
+def entradas(n=2_000, semilla=11):
+    rng = np.random.default_rng(semilla)
+    ndvi = rng.uniform(-0.2, 1.0, n)
+    # Umbrales exactos de los tramos y sus vecinos inmediatos
+    ndvi[:9] = [0.3, 0.5, 0.7, np.nextafter(0.3, 1), np.nextafter(0.5, 1), np.nextafter(0.7, 1), 0.0, -0.1, 1.0]
+    precipitacion = rng.uniform(0.0, 5_000.0, n)
+    precipitacion[:4] = [750.0, 1_050.0, 1_950.0, 3_000.0]
+    return ndvi, precipitacion
+
+
+def columnas_lote(lote):
+    columnas = {campo: lote[campo] for campo in ('carbono_total_ton_ha', 'co2_equivalente_ton_ha', 'biomasa_aerea_ton_ha')}
+    columnas.update(lote['desglose'])
+    return columnas
+
+
+@pytest.mark.parametrize('tipo_bosque', TIPOS)
+def test_lote_redondeado_igual_al_calculo_por_punto(tipo_bosque):
+    ndvi, precipitacion = entradas()
+    lote = columnas_lote(VERRA.calcular_carbono_lote(ndvi, tipo_bosque, precipitacion))
+    for i in range(len(ndvi)):
+        esperado = carbono_por_punto(float(ndvi[i]), tipo_bosque, float(precipitacion[i]))
+        for campo, valor in esperado.items():
+            assert lote[campo][i] == valor, (campo, ndvi[i], precipitacion[i])
+
+
+@pytest.mark.parametrize('tipo_bosque', TIPOS)
+def test_lote_sin_redondear(tipo_bosque):
+    ndvi, precipitacion = entradas(500)
+    lote = columnas_lote(VERRA.calcular_carbono_lote(ndvi, tipo_bosque, precipitacion, redondear=False))
+    for i in range(len(ndvi)):
+        esperado = carbono_por_punto(float(ndvi[i]), tipo_bosque, float(precipitacion[i]), redondear=False)
+        for campo, valor in esperado.items():
+            assert lote[campo][i] == pytest.approx(valor, rel=1e-12, abs=1e-12), campo
+
+
+def test_calculo_escalar_usa_el_lote():
+    escalar = VERRA.calcular_carbono_hectarea(0.62, 'amazonia', 1_800.0)
+    esperado = carbono_por_punto(0.62, 'amazonia', 1_800.0)
+    assert escalar['carbono_total_ton_ha'] == esperado['carbono_total_ton_ha']
+    assert escalar['desglose'] == {pool: esperado[pool] for pool in ('AGB', 'BGB', 'DW', 'LI', 'SOC')}
+
+
+def test_redondeo_igual_a_round_de_python():
+    """Valores en (o a un ulp de) los empates x.xx5, donde np.round y round() pueden diferir"""
+    rng = np.random.default_rng(3)
+    empates = np.arange(0, 2_000) * 0.01 + 0.005
+    valores = np.concatenate([empates, np.nextafter(empates, 0), np.nextafter(empates, 10),
+                              empates * 37.3, rng.uniform(0, 500, 2_000)])
+    redondeados = MetodologiaVerra._redondear(valores, 2)
+    assert [float(v) for v in redondeados] == [round(float(v), 2) for v in valores]
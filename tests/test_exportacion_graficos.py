@@ -0,0 +1,58 @@
+# tests/test_exportacion_graficos.py
+import threading
+
+from modules.exportacion_graficos import ExportadorGraficos
+
+
+class FiguraPrueba:
+    """Figura mínima con la interfaz que usa el exportador (to_json / to_image)"""
+
+    def __init__(self, nombre, falla=False):
+        self.nombre = nombre
+        self.falla = falla
+        self.renderizados = 0
+
+    def to_json(self):
+        return f'{{"nombre": "{self.nombre}"}}'
+
+    def to_image(self, format, width, height, scale):
+        self.renderizados += 1
+        if self.falla:
+            raise RuntimeError(f"fallo {self.nombre}")
+        return f"{self.nombre}-{width}x{height}@{scale}".encode()
+
+
+def test_errores_por_lote_y_cache():
+    exportador = ExportadorGraficos()
+    buena, mala = FiguraPrueba('buena'), FiguraPrueba('mala', falla=True)
+    pngs, errores = exportador.exportar_lote({'a': (buena, 400, 300), 'b': (mala, 400, 300), 'c': (None, 1, 1)})
+    assert pngs == {'a': b'buena-400x300@2', 'b': None, 'c': None}
+    assert errores == {'b': 'fallo mala'}
+
+    # Un lote posterior sin fallas no arrastra el error anterior y reutiliza la caché
+    pngs, errores = exportador.exportar_lote({'a': (buena, 400, 300)})
+    assert pngs == {'a': b'buena-400x300@2'} and errores == {}
+    assert buena.renderizados == 1
+    assert exportador.metricas['errores'] == 1
+    assert exportador.metricas['figuras_cacheadas'] == 1
+
+
+def test_sesiones_concurrentes_solo_ven_sus_errores():
+    exportador = ExportadorGraficos()
+    resultados = {}
+
+    def exportar(nombre, falla):
+        errores_vistos = []
+        for i in range(20):
+            _, errores = exportador.exportar_lote({nombre: (FiguraPrueba(f"{nombre}{i}", falla), 100, 100)})
+            errores_vistos.append(errores)
+        resultados[nombre] = errores_vistos
+
+    hilos = [threading.Thread(target=exportar, args=('ok', False)),
+             threading.Thread(target=exportar, args=('mal', True))]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert all(errores == {} for errores in resultados['ok'])
+    assert all(list(errores) == ['mal'] for errores in resultados['mal'])
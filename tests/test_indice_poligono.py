@@ -0,0 +1,65 @@
+# tests/test_indice_poligono.py
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import MultiPolygon, Polygon, box
+
+from modules.indice_poligono import IndicePoligono
+
+
+def estrella(puntas=7, radio=1.0, interior=0.4):
+    angulos = np.linspace(0, 2 * np.pi, 2 * puntas, endpoint=False)
+    radios = np.where(np.arange(2 * puntas) % 2 == 0, radio, interior)
+    return Polygon(np.column_stack([radios * np.cos(angulos), radios * np.sin(angulos)]))
+
+
+POLIGONOS = {
+    'estrella': estrella(),
+    'multipoligono_con_hueco': MultiPolygon([
+        Polygon([(0, 0), (4, 0), (4, 4), (0, 4)], [[(1, 1), (3, 1), (3, 3), (1, 3)]]),
+        Polygon([(5, 0), (7, 1), (6, 3)])
+    ]),
+    'astilla': Polygon([(0, 0), (10, 0.001), (10, 0.0015), (0, 0.0002)]),
+    'rectangulo': box(-60.0, -3.0, -59.9, -2.9),
+}
+
+
+def puntos_prueba(poligono, n=20_000, semilla=0):
+    """Puntos al azar en (y algo fuera de) el rectángulo, más vértices y puntos sobre el contorno"""
+    rng = np.random.default_rng(semilla)
+    minx, miny, maxx, maxy = poligono.bounds
+    margen_x, margen_y = 0.05 * (maxx - minx), 0.05 * (maxy - miny)
+    xs = rng.uniform(minx - margen_x, maxx + margen_x, n)
+    ys = rng.uniform(miny - margen_y, maxy + margen_y, n)
+
+    contorno = shapely.boundary(poligono)
+    vertices = shapely.get_coordinates(contorno)
+    sobre_contorno = shapely.get_coordinates(shapely.line_interpolate_point(
+        contorno, rng.uniform(0, 1, 2_000), normalized=True))
+    esquinas = np.array([[minx, miny], [maxx, maxy], [minx, maxy], [maxx, miny]])
+    extra = np.vstack([vertices, sobre_contorno, esquinas])
+    return np.concatenate([xs, extra[:, 0]]), np.concatenate([ys, extra[:, 1]])
+
+
+@pytest.mark.parametrize('nombre', sorted(POLIGONOS))
+def test_contiene_igual_a_shapely(nombre):
+    poligono = POLIGONOS[nombre]
+    xs, ys = puntos_prueba(poligono)
+    indice = IndicePoligono(poligono)
+    np.testing.assert_array_equal(indice.contiene(xs, ys), shapely.contains_xy(poligono, xs, ys))
+
+
+@pytest.mark.parametrize('celdas', [1, 64, 4_096])
+def test_contiene_con_pocas_y_muchas_celdas(celdas):
+    poligono = POLIGONOS['multipoligono_con_hueco']
+    xs, ys = puntos_prueba(poligono, semilla=celdas)
+    np.testing.assert_array_equal(IndicePoligono(poligono, celdas=celdas).contiene(xs, ys),
+                                  shapely.contains_xy(poligono, xs, ys))
+
+
+def test_conserva_la_forma_de_la_entrada():
+    poligono = POLIGONOS['estrella']
+    xs, ys = np.meshgrid(np.linspace(-1, 1, 30), np.linspace(-1, 1, 20))
+    resultado = IndicePoligono(poligono).contiene(xs, ys)
+    assert resultado.shape == (20, 30)
+    np.testing.assert_array_equal(resultado, shapely.contains_xy(poligono, xs, ys))
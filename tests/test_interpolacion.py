@@ -0,0 +1,58 @@
+# tests/test_interpolacion.py
+import numpy as np
+import pytest
+
+from modules.interpolacion import interpolar_idw
+
+
+def idw_por_punto(lats_muestra, lons_muestra, valores, lats, lons):
+    """Bucle por celda que `interpolar_idw` reemplazó (potencia 2, todas las muestras)"""
+    predicciones = np.empty(len(lats))
+    for i, (lat, lon) in enumerate(zip(lats, lons)):
+        dist = np.sqrt((lat - lats_muestra)**2 + (lon - lons_muestra)**2)
+        pesos = np.where(dist > 0, 1.0 / np.where(dist > 0, dist, 1.0) ** 2, 1.0)
+        total_pesos = pesos.sum()
+        if total_pesos > 0:
+            predicciones[i] = np.dot(pesos, valores) / total_pesos
+        else:
+            predicciones[i] = np.mean(valores)
+    return predicciones
+
+
+@pytest.fixture
+def datos():
+    rng = np.random.default_rng(7)
+    lats_muestra = rng.uniform(-3.0, -2.9, 150)
+    lons_muestra = rng.uniform(-60.0, -59.9, 150)
+    valores = rng.gamma(4.0, 30.0, 150)
+    lats = np.concatenate([rng.uniform(-3.0, -2.9, 400), lats_muestra[:5]])
+    lons = np.concatenate([rng.uniform(-60.0, -59.9, 400), lons_muestra[:5]])
+    return lats_muestra, lons_muestra, valores, lats, lons
+
+
+def test_coincide_con_bucle_por_punto(datos):
+    lats_muestra, lons_muestra, valores, lats, lons = datos
+    esperado = idw_por_punto(lats_muestra, lons_muestra, valores, lats, lons)
+    # Bloques pequeños para recorrer también el caso de varios bloques
+    obtenido = interpolar_idw(lats_muestra, lons_muestra, valores, lats, lons, potencia=2.0, max_elementos=10_000)
+    np.testing.assert_allclose(obtenido, esperado, rtol=1e-12)
+
+
+def test_varias_variables_en_una_llamada(datos):
+    lats_muestra, lons_muestra, valores, lats, lons = datos
+    matriz = np.column_stack([valores, np.sqrt(valores)])
+    obtenido = interpolar_idw(lats_muestra, lons_muestra, matriz, lats, lons)
+    for j in range(matriz.shape[1]):
+        np.testing.assert_allclose(obtenido[:, j], idw_por_punto(lats_muestra, lons_muestra, matriz[:, j], lats, lons),
+                                   rtol=1e-12)
+
+
+def test_vecinos_y_potencia(datos):
+    lats_muestra, lons_muestra, valores, lats, lons = datos
+    k, potencia = 6, 3.0
+    obtenido = interpolar_idw(lats_muestra, lons_muestra, valores, lats, lons, potencia=potencia, k=k)
+    for i in range(0, len(lats), 37):
+        dist = np.hypot(lats[i] - lats_muestra, lons[i] - lons_muestra)
+        cercanas = np.argsort(dist)[:k]
+        pesos = np.where(dist[cercanas] > 0, 1.0 / dist[cercanas] ** potencia, 1.0)
+        assert obtenido[i] == pytest.approx(np.dot(pesos, valores[cercanas]) / pesos.sum(), rel=1e-12)
@@ -0,0 +1,33 @@
+# tests/test_muestras.py
+import numpy as np
+
+from modules.muestras import MuestrasAnalisis, valores_puntos
+
+MUESTRAS = MuestrasAnalisis(
+    {'lat': [-3.0, -2.9, -2.8], 'lon': [-60.0, -59.9, -59.8], 'ndvi': [0.2, 0.5, 0.8],
+     'carbono_ton_ha': [10.0, 50.0, 120.0], 'indice_shannon': [1.5, 2.5, 3.5],
+     'categoria': ['Baja', 'Moderada', 'Alta']},
+    constantes={'tipo_vegetacion': 'amazonia'}
+)
+
+
+def test_vista_igual_a_lista_de_diccionarios():
+    for clave in ('puntos_carbono', 'puntos_ndvi', 'puntos_biodiversidad'):
+        vista = MUESTRAS.vista(clave)
+        lista = [dict(punto) for punto in vista]
+        # Campos presentes, campos de la vista que faltan en las muestras y campos ajenos a la vista
+        for campo in vista.campos + ('no_existe', 'ndwi'):
+            esperado = valores_puntos(lista, campo, defecto=-1.0)
+            obtenido = valores_puntos(vista, campo, defecto=-1.0)
+            assert list(obtenido) == list(esperado), (clave, campo)
+
+
+def test_campo_ausente_en_vista_devuelve_defecto():
+    vista = MUESTRAS.vista('puntos_biodiversidad')
+    np.testing.assert_array_equal(valores_puntos(vista, 'varianza_shannon'), np.zeros(3))
+    assert list(valores_puntos(vista, 'categoria', 'Desconocida')) == ['Baja', 'Moderada', 'Alta']
+
+
+def test_columna_presente_sin_copia():
+    vista = MUESTRAS.vista('puntos_carbono')
+    assert valores_puntos(vista, 'carbono_ton_ha') is MUESTRAS.columna('carbono_ton_ha')
@@ -0,0 +1,38 @@
+# tests/test_muestreo.py
+import numpy as np
+import shapely
+from shapely.geometry import MultiPolygon, Polygon
+
+from modules.muestreo import muestrear_puntos_triangulacion, triangular_poligono
+
+CON_HUECO = Polygon([(0, 0), (4, 0), (4, 4), (0, 4)], [[(1, 1), (3, 1), (3, 3), (1, 3)]])
+SEGUNDA_PARTE = Polygon([(5, 0), (8, 0.5), (6.5, 2.8)])
+MULTIPOLIGONO = MultiPolygon([CON_HUECO, SEGUNDA_PARTE])
+NUM_PUNTOS = 50_000
+
+
+def test_puntos_dentro_y_fuera_del_hueco():
+    # La triangulación existe: se prueba ese camino, no el respaldo por rechazo
+    assert triangular_poligono(MULTIPOLIGONO) is not None
+    lats, lons = muestrear_puntos_triangulacion(MULTIPOLIGONO, NUM_PUNTOS, rng=np.random.default_rng(1))
+    assert len(lats) == len(lons) == NUM_PUNTOS
+    # `covers`: un punto sobre una arista compartida de la triangulación sigue siendo válido
+    assert shapely.covers(MULTIPOLIGONO, shapely.points(lons, lats)).all()
+    hueco = Polygon(CON_HUECO.interiors[0])
+    assert not shapely.contains_xy(hueco, lons, lats).any()
+
+
+def test_reparto_proporcional_al_area_de_cada_parte():
+    lats, lons = muestrear_puntos_triangulacion(MULTIPOLIGONO, NUM_PUNTOS, rng=np.random.default_rng(2))
+    fraccion = shapely.covers(SEGUNDA_PARTE, shapely.points(lons, lats)).mean()
+    esperada = SEGUNDA_PARTE.area / MULTIPOLIGONO.area
+    # Cuatro errores estándar binomiales
+    assert abs(fraccion - esperada) < 4 * np.sqrt(esperada * (1 - esperada) / NUM_PUNTOS)
+
+
+def test_uniforme_dentro_de_una_parte():
+    """Cada cuadrante del anillo (misma área) recibe la misma proporción de puntos"""
+    lats, lons = muestrear_puntos_triangulacion(CON_HUECO, NUM_PUNTOS, rng=np.random.default_rng(3))
+    cuadrantes = (lons >= 2).astype(int) * 2 + (lats >= 2).astype(int)
+    fracciones = np.bincount(cuadrantes, minlength=4) / NUM_PUNTOS
+    assert np.all(np.abs(fracciones - 0.25) < 4 * np.sqrt(0.25 * 0.75 / NUM_PUNTOS))
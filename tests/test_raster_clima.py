@@ -0,0 +1,35 @@
+# tests/test_raster_clima.py
+import os
+
+import numpy as np
+
+from modules.raster_clima import abrir_raster_climatico, escribir_raster_climatico
+
+
+def raster_prueba(directorio):
+    ruta = os.path.join(directorio, 'clima.json')
+    precipitacion = np.arange(12, dtype=float).reshape(3, 4) * 100
+    escribir_raster_climatico(ruta, {'precipitacion': precipitacion, 'temperatura': precipitacion / 100 + 20},
+                              lat_max=0.0, lon_min=-60.0, resolucion=1.0)
+    return ruta
+
+
+def test_abre_y_muestrea(tmp_path):
+    raster = abrir_raster_climatico(raster_prueba(str(tmp_path)))
+    assert raster is not None
+    # Centro de la celda (fila 1, columna 2) y un punto fuera del raster
+    valores = raster.muestrear('precipitacion', [-1.5, 5.0], [-57.5, -57.5])
+    assert valores[0] == 600.0
+    assert np.isnan(valores[1])
+
+
+def test_grilla_faltante_falla_al_abrir(tmp_path):
+    ruta = raster_prueba(str(tmp_path))
+    os.remove(os.path.join(str(tmp_path), 'temperatura.npy'))
+    assert abrir_raster_climatico(ruta) is None
+
+
+def test_grilla_con_otra_forma_falla_al_abrir(tmp_path):
+    ruta = raster_prueba(str(tmp_path))
+    np.save(os.path.join(str(tmp_path), 'temperatura.npy'), np.zeros((4, 3), dtype=np.float32))
+    assert abrir_raster_climatico(ruta) is None
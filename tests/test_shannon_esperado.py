@@ -0,0 +1,34 @@
+# tests/test_shannon_esperado.py
+import numpy as np
+import pytest
+
+from app import AnalisisBiodiversidad
+
+ANALISIS = AnalisisBiodiversidad()
+REPLICAS = 400
+TOLERANCIA = 0.05
+
+# Puntos que cubren NDVI bajo/medio/alto, parcelas chicas y grandes y climas secos y húmedos
+NDVI = np.array([0.15, 0.45, 0.8, 0.3, 0.65, 0.9])
+AREA_HA = np.array([0.5, 10.0, 250.0, 2_000.0, 40.0, 5.0])
+PRECIPITACION = np.array([400.0, 1_200.0, 2_500.0, 3_500.0, 800.0, 1_800.0])
+
+
+@pytest.mark.parametrize('tipo_ecosistema', sorted(ANALISIS.parametros))
+def test_estimador_esperado_coincide_con_monte_carlo(tipo_ecosistema):
+    """Media y desvío de H' analíticos dentro de la tolerancia más tres errores estándar de Monte Carlo"""
+    esperado = ANALISIS.calcular_shannon_esperado_lote(NDVI, tipo_ecosistema, AREA_HA, PRECIPITACION)
+    simulado = ANALISIS.calcular_shannon_lote(
+        np.repeat(NDVI, REPLICAS), tipo_ecosistema, np.repeat(AREA_HA, REPLICAS),
+        np.repeat(PRECIPITACION, REPLICAS), rng=np.random.default_rng(12345)
+    )['indice_shannon'].reshape(len(NDVI), REPLICAS)
+
+    media_mc = simulado.mean(axis=1)
+    desvio_mc = simulado.std(axis=1, ddof=1)
+    limite_media = TOLERANCIA + 3 * desvio_mc / np.sqrt(REPLICAS)
+    limite_desvio = TOLERANCIA + 3 * desvio_mc / np.sqrt(2 * (REPLICAS - 1))
+
+    error_media = np.abs(esperado['indice_shannon'] - media_mc)
+    error_desvio = np.abs(np.sqrt(esperado['varianza_shannon']) - desvio_mc)
+    assert np.all(error_media <= limite_media), error_media
+    assert np.all(error_desvio <= limite_desvio), error_desvio